@@ -0,0 +1,66 @@
+PRACTICE_COMPLETED = 'practice_completed'
+WORD_LEARNED = 'word_learned'
+LANGUAGE_STARTED = 'language_started'
+
+# Achievement badges. A badge is earned the first time the named statistic of
+# its trigger event reaches ``min``:
+#   practice_completed - sessions, score (of that session), streak
+#   word_learned       - learned_words
+#   language_started   - languages
+ACHIEVEMENTS = [
+    {"id": "first_practice", "name": "First Steps", "description": "Complete your first practice session", "icon": "🎯",
+     "trigger": {"event": PRACTICE_COMPLETED, "stat": "sessions", "min": 1}},
+    {"id": "five_practices", "name": "Getting Fluent", "description": "Complete 5 practice sessions", "icon": "🔥",
+     "trigger": {"event": PRACTICE_COMPLETED, "stat": "sessions", "min": 5}},
+    {"id": "perfect_score", "name": "Perfect Pronunciation", "description": "Get a perfect score on a practice", "icon": "🌟",
+     "trigger": {"event": PRACTICE_COMPLETED, "stat": "score", "min": 9.5}},
+    {"id": "three_day_streak", "name": "Consistency is Key", "description": "Practice for 3 days in a row", "icon": "📆",
+     "trigger": {"event": PRACTICE_COMPLETED, "stat": "streak", "min": 3}},
+    {"id": "vocabulary_master", "name": "Word Wizard", "description": "Learn 10 new vocabulary words", "icon": "📚",
+     "trigger": {"event": WORD_LEARNED, "stat": "learned_words", "min": 10}},
+    {"id": "multilingual", "name": "Global Citizen", "description": "Practice in at least 2 different languages", "icon": "🌍",
+     "trigger": {"event": LANGUAGE_STARTED, "stat": "languages", "min": 2}}
+]
+
+
+class AchievementEngine:
+    """
+    Evaluates achievement triggers. Rules are indexed by event type, so an event
+    only costs the rules listening for it and a new badge adds nothing to
+    unrelated events.
+    """
+
+    def __init__(self, achievements=ACHIEVEMENTS):
+        self.achievements = achievements
+        self._rules = {}
+        for achievement in achievements:
+            trigger = achievement['trigger']
+            self._rules.setdefault(trigger['event'], []).append(
+                (achievement['id'], trigger['stat'], trigger['min'])
+            )
+
+    def has_rules(self, event):
+        return event in self._rules
+
+    def evaluate(self, event, stats, earned=()):
+        """Ids of the achievements ``event`` newly earns, given its stats and the ``earned`` set"""
+        return [
+            achievement_id
+            for achievement_id, stat, minimum in self._rules.get(event, ())
+            if achievement_id not in earned and stats.get(stat, 0) >= minimum
+        ]
+
+    def evaluate_all(self, stats, earned=()):
+        """
+        Check every rule against a user's all-time stats (best score, longest
+        streak and so on), for backfilling badges over stored history
+        """
+        return [
+            achievement_id
+            for rules in self._rules.values()
+            for achievement_id, stat, minimum in rules
+            if achievement_id not in earned and stats.get(stat, 0) >= minimum
+        ]
+
+
+achievement_engine = AchievementEngine()
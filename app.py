@@ -1,12 +1,40 @@
-from flask import Flask, render_template, request, jsonify, session
-import os
+from flask import Flask, g, make_response, render_template, request, jsonify, session, Response, stream_with_context
+from werkzeug.middleware.proxy_fix import ProxyFix
+import atexit
+import click
+import functools
+import gc
+import hmac
 import json
-import random
-from datetime import datetime, date
+import os
+import sys
+import time
 import uuid
-import google.generativeai as genai
+from datetime import date, datetime, timedelta, timezone
 from dotenv import load_dotenv
 import logging
+from feedback_cache import build_feedback_cache
+from feedback_jobs import FeedbackDispatcher, QueueFullError
+from feedback_stream import IncrementalJSONParser, sse_event
+from storage import build_user_repository
+from progress import ACHIEVEMENT_XP
+from achievements import ACHIEVEMENTS, LANGUAGE_STARTED, WORD_LEARNED, achievement_engine
+from model_clients import ModelClientManager
+from batching import RETRY, MicroBatcher
+from resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+from response_parser import (SCORE_FIELDS, ResponseParseError, coerce_field, overall_score,
+                             parse_analysis, parse_analysis_list, validate_analysis)
+from local_analysis import LocalAnalyzer
+from leaderboards import LONGEST_STREAK, WEEKLY_SCORE, XP, Leaderboards, player_name
+from content import CONTENT_DIR, PROMPT_BANK, VOCABULARY_BANK, ContentLibrary, SeenBitmap
+from prompts import PromptBuilder, TokenUsage
+from metrics import CONTENT_TYPE, Registry, SamplingProfiler
+from sessions import SQLiteSessionInterface, load_secret_key
+from batch_grading import BatchGrader, BatchStats, completed_ids
+from http_cache import (ResponseCache, fingerprint, json_representation, not_modified,
+                        not_modified_response, validated)
+from ratelimit import build_rate_limiter
+from snapshot import SnapshotStore
 
 # Load environment variables
 load_dotenv()
@@ -15,14 +43,12 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure Google Gemini AI
+# Google Gemini AI; the SDK is imported and configured when the first model is built.
+# Without an API key, or with OFFLINE_MODE set, all feedback comes from the local analysis.
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+OFFLINE_MODE = os.getenv("OFFLINE_MODE", "false").lower() in ("1", "true", "yes") or not GEMINI_API_KEY
 if not GEMINI_API_KEY:
-    logger.warning("GEMINI_API_KEY not found in environment variables")
-    raise ValueError("GEMINI_API_KEY environment variable is not set")
-logger.info("Gemini API configured successfully")
-
-genai.configure(api_key=GEMINI_API_KEY)
+    logger.warning("GEMINI_API_KEY not found in environment variables, running in offline mode")
 
 # Configure default safety settings
 generation_config = {
@@ -51,267 +77,466 @@ safety_settings = [
     },
 ]
 
-app = Flask(__name__)
-app.secret_key = os.urandom(24)
-
-# Mock database - in a real app, you would use a proper database
-USERS_DB = {}
-PROMPTS = {
-    "english": [
-        "Tell me about your favorite hobby.",
-        "Describe your ideal vacation.",
-        "What did you do last weekend?",
-        "Talk about your favorite movie or TV show.",
-        "Describe your morning routine."
-    ],
-    "spanish": [
-        "Háblame de tu pasatiempo favorito.",
-        "Describe tus vacaciones ideales.",
-        "¿Qué hiciste el fin de semana pasado?",
-        "Habla sobre tu película o programa de televisión favorito.",
-        "Describe tu rutina matutina."
-    ],
-    "french": [
-        "Parle-moi de ton passe-temps préféré.",
-        "Décris tes vacances idéales.",
-        "Qu'as-tu fait le week-end dernier ?",
-        "Parle de ton film ou émission de télévision préféré.",
-        "Décris ta routine matinale."
-    ],
-    "german": [
-        "Erzähl mir von deinem Lieblingshobby.",
-        "Beschreibe deinen idealen Urlaub.",
-        "Was hast du letztes Wochenende gemacht?",
-        "Sprich über deinen Lieblingsfilm oder deine Lieblingssendung.",
-        "Beschreibe deine Morgenroutine."
-    ]
-}
+# Deterministic local scoring for provisional results and the offline fallback
+local_analyzer = LocalAnalyzer()
+
+# Configured model instances are built once and shared across threads
+model_clients = ModelClientManager(generation_config, safety_settings, api_key=GEMINI_API_KEY)
+
+# Analysis prompts from per-language templates, with transcripts trimmed to a token budget
+prompt_builder = PromptBuilder(max_transcript_tokens=int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "800")))
+token_usage = TokenUsage()
+
+# Deadlines, backoff, circuit breaking and hedging around every model call
+model_resilience = ResilientCaller(
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+        reset_timeout=float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+    ),
+    attempt_timeout=float(os.getenv("MODEL_ATTEMPT_TIMEOUT", "15")),
+    max_attempts=int(os.getenv("MODEL_MAX_ATTEMPTS", "3")),
+    backoff_base=float(os.getenv("MODEL_BACKOFF_BASE", "0.25")),
+    backoff_max=float(os.getenv("MODEL_BACKOFF_MAX", "4")),
+    budget=float(os.getenv("MODEL_CALL_BUDGET", "25")),
+    hedge=os.getenv("MODEL_HEDGING", "false").lower() in ("1", "true", "yes")
+)
+
+# Optional micro-batching of concurrent requests for the same prompt
+feedback_batcher = None
+if os.getenv("FEEDBACK_BATCHING", "false").lower() in ("1", "true", "yes"):
+    feedback_batcher = MicroBatcher(
+        lambda key, transcripts: run_feedback_batch(key, transcripts),
+        # Items the batch could not analyze are retried by their own requests, concurrently
+        run_one=lambda key, transcript: request_model_analysis(transcript, key[1], key[0]),
+        max_wait=float(os.getenv("FEEDBACK_BATCH_MAX_WAIT_MS", "20")) / 1000,
+        max_batch=int(os.getenv("FEEDBACK_BATCH_MAX_SIZE", "8"))
+    )
+
+# Routes are collected here and registered on the app built by create_app
+ROUTES = []
+
+def route(rule, **options):
+    def register(view):
+        ROUTES.append((rule, view, options))
+        return view
+    return register
+
+# Cache of model analyses keyed by normalized (language, prompt, transcript)
+feedback_cache = build_feedback_cache(
+    backend=os.getenv("FEEDBACK_CACHE_BACKEND", "memory"),
+    max_entries=int(os.getenv("FEEDBACK_CACHE_MAX_ENTRIES", "4096")),
+    ttl=int(os.getenv("FEEDBACK_CACHE_TTL", "86400")),
+    path=os.getenv("FEEDBACK_CACHE_PATH", "feedback_cache.sqlite3")
+)
+
+# Bounded pool for model calls: excess requests get a 429 instead of a blocked worker
+feedback_dispatcher = FeedbackDispatcher(
+    max_workers=int(os.getenv("FEEDBACK_WORKERS", "8")),
+    max_queue=int(os.getenv("FEEDBACK_QUEUE_LIMIT", "32")),
+    timeout=float(os.getenv("FEEDBACK_TIMEOUT", "30"))
+)
+
+# User profiles, practice sessions, achievements and learned words
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+DATABASE_PATH = os.getenv("DATABASE_PATH", "speakeasy.sqlite3")
+user_store = build_user_repository(
+    backend=STORAGE_BACKEND,
+    path=DATABASE_PATH,
+    pool_size=int(os.getenv("DATABASE_POOL_SIZE", "5")),
+    history_limit=int(os.getenv("HISTORY_LIMIT", "200"))
+)
+
+# Cross-user rankings, updated as users earn XP and rebuilt from the shared
+# database periodically so every worker process sees the others' updates
+leaderboards = Leaderboards(
+    loader=user_store.leaderboard_rows,
+    refresh_interval=0 if STORAGE_BACKEND == 'memory' else float(os.getenv("LEADERBOARD_REFRESH", "60"))
+)
 
-# Daily vocabulary words
-VOCABULARY = {
-    "english": [
-        {"word": "Serendipity", "definition": "The occurrence of events by chance in a happy or beneficial way", "example": "Finding a perfect book while looking for something else was pure serendipity."},
-        {"word": "Eloquent", "definition": "Fluent or persuasive in speaking or writing", "example": "Her eloquent speech moved the entire audience."},
-        {"word": "Resilience", "definition": "The capacity to recover quickly from difficulties", "example": "His resilience helped him overcome many challenges in life."},
-        {"word": "Meticulous", "definition": "Showing great attention to detail", "example": "She is meticulous about keeping records of all transactions."},
-        {"word": "Pragmatic", "definition": "Dealing with things sensibly and realistically", "example": "We need a pragmatic approach to solve this problem."},
-        {"word": "Ephemeral", "definition": "Lasting for a very short time", "example": "The beauty of cherry blossoms is ephemeral, lasting only a few days."},
-        {"word": "Ambivalent", "definition": "Having mixed feelings or contradictory ideas", "example": "She felt ambivalent about moving to a new city."},
-        {"word": "Ubiquitous", "definition": "Present, appearing, or found everywhere", "example": "Smartphones have become ubiquitous in modern society."},
-        {"word": "Paradigm", "definition": "A typical example or pattern of something", "example": "This discovery represents a paradigm shift in our understanding."},
-        {"word": "Juxtapose", "definition": "Place or deal with close together for contrasting effect", "example": "The article juxtaposes the lives of the rich and the poor."}
-    ],
-    "spanish": [
-        {"word": "Efímero", "definition": "Que dura poco tiempo o es pasajero", "example": "La belleza de las flores es efímera."},
-        {"word": "Serendipia", "definition": "Hallazgo valioso que se produce de manera accidental", "example": "Conocer a mi mejor amigo fue una serendipia."},
-        {"word": "Resiliencia", "definition": "Capacidad para adaptarse a situaciones adversas", "example": "Su resiliencia le permitió superar momentos difíciles."},
-        {"word": "Meticuloso", "definition": "Que muestra gran atención al detalle", "example": "Es un trabajador meticuloso que nunca comete errores."},
-        {"word": "Pragmático", "definition": "Que se basa en la práctica y utilidad", "example": "Necesitamos un enfoque pragmático para resolver este problema."},
-        {"word": "Elocuente", "definition": "Que habla o se expresa con facilidad y de modo persuasivo", "example": "Su discurso elocuente conmovió a todos."},
-        {"word": "Ambivalente", "definition": "Que presenta dos interpretaciones o valores diferentes", "example": "Tengo sentimientos ambivalentes sobre ese tema."},
-        {"word": "Ubicuo", "definition": "Que está presente en todas partes al mismo tiempo", "example": "La tecnología es ubicua en nuestra sociedad moderna."},
-        {"word": "Paradigma", "definition": "Ejemplo o modelo de algo", "example": "Este descubrimiento representa un cambio de paradigma."},
-        {"word": "Yuxtaponer", "definition": "Poner una cosa junto a otra", "example": "El artista yuxtapone colores brillantes y oscuros."}
-    ],
-    "french": [
-        {"word": "Sérendipité", "definition": "Découverte heureuse faite par hasard", "example": "Trouver ce livre rare était une sérendipité."},
-        {"word": "Éloquent", "definition": "Qui s'exprime avec aisance et de façon persuasive", "example": "Son discours éloquent a ému tout le public."},
-        {"word": "Résilience", "definition": "Capacité à surmonter les chocs et les traumatismes", "example": "Sa résilience lui a permis de surmonter cette épreuve."},
-        {"word": "Méticuleux", "definition": "Qui montre un grand souci du détail", "example": "Il est méticuleux dans son travail."},
-        {"word": "Pragmatique", "definition": "Qui est orienté vers l'action pratique", "example": "Nous avons besoin d'une approche pragmatique."},
-        {"word": "Éphémère", "definition": "Qui ne dure qu'un temps très court", "example": "La beauté des fleurs est éphémère."},
-        {"word": "Ambivalent", "definition": "Qui présente deux aspects ou valeurs contradictoires", "example": "J'ai des sentiments ambivalents à ce sujet."},
-        {"word": "Ubiquitaire", "definition": "Qui est présent partout", "example": "Les smartphones sont devenus ubiquitaires."},
-        {"word": "Paradigme", "definition": "Modèle de référence", "example": "Cette découverte représente un changement de paradigme."},
-        {"word": "Juxtaposer", "definition": "Placer des éléments côte à côte", "example": "L'artiste juxtapose des couleurs contrastées."}
-    ],
-    "german": [
-        {"word": "Serendipität", "definition": "Glücklicher Zufall, bei dem man etwas findet, was man nicht gesucht hat", "example": "Die Entdeckung war reine Serendipität."},
-        {"word": "Eloquent", "definition": "Redegewandt, ausdrucksstark", "example": "Seine eloquente Rede beeindruckte alle Anwesenden."},
-        {"word": "Resilienz", "definition": "Psychische Widerstandsfähigkeit", "example": "Ihre Resilienz half ihr, die schwierige Zeit zu überstehen."},
-        {"word": "Akribisch", "definition": "Sehr genau und sorgfältig", "example": "Er arbeitet akribisch an jedem Detail."},
-        {"word": "Pragmatisch", "definition": "Praktisch orientiert, sachbezogen", "example": "Wir brauchen einen pragmatischen Ansatz."},
-        {"word": "Ephemer", "definition": "Kurzlebig, flüchtig", "example": "Die Schönheit der Kirschblüten ist ephemer."},
-        {"word": "Ambivalent", "definition": "Zwiespältig, gegensätzliche Gefühle habend", "example": "Ich bin ambivalent, was dieses Thema betrifft."},
-        {"word": "Ubiquitär", "definition": "Allgegenwärtig, überall vorkommend", "example": "Smartphones sind heutzutage ubiquitär."},
-        {"word": "Paradigma", "definition": "Denkmuster, Beispiel", "example": "Diese Entdeckung stellt einen Paradigmenwechsel dar."},
-        {"word": "Juxtaponieren", "definition": "Nebeneinanderstellen zum Vergleich", "example": "Der Künstler juxtaponiert helle und dunkle Farben."}
+# Prompt and vocabulary banks, loaded from data files on first use
+content_library = ContentLibrary(os.getenv("CONTENT_DIR", CONTENT_DIR))
+
+# Languages feedback can be requested in. Client-supplied names outside this set are
+# rejected before they reach the prompt and table caches, which are keyed by language
+SUPPORTED_LANGUAGES = frozenset(content_library.languages()) | local_analyzer.languages
+
+# Bulk grading of JSONL transcript files, from the CLI or /api/feedback/batch
+batch_grader = BatchGrader(
+    lambda transcript, prompt, language: grade_transcript(transcript, prompt, language),
+    fallback=lambda transcript, prompt, language: local_analyze_speech(transcript, prompt, language),
+    workers=int(os.getenv("BATCH_WORKERS", "4")),
+    languages=SUPPORTED_LANGUAGES
+)
+
+# Columnar snapshots of user progress, for analytics and for warm restarts of the memory store
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR")
+snapshots = SnapshotStore(SNAPSHOT_DIR or "snapshots")
+
+# Per-user and per-IP token buckets in front of the model-backed endpoints, plus
+# daily model-call quotas. The SQLite store is shared by every worker process.
+RATE_LIMITING = os.getenv("RATE_LIMITING", "true").lower() in ("1", "true", "yes")
+rate_limiter = build_rate_limiter(
+    backend=os.getenv("RATE_LIMIT_BACKEND", "sqlite" if STORAGE_BACKEND == "sqlite" else "memory"),
+    limits={
+        'user': (float(os.getenv("RATE_LIMIT_PER_MINUTE", "10")), int(os.getenv("RATE_LIMIT_BURST", "5"))),
+        # A whole classroom can share one address
+        'ip': (float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "120")), int(os.getenv("RATE_LIMIT_IP_BURST", "60")))
+    } if RATE_LIMITING else {},
+    daily_quota=int(os.getenv("DAILY_MODEL_QUOTA", "200")) if RATE_LIMITING else 0,
+    path=os.getenv("RATE_LIMIT_DATABASE_PATH", DATABASE_PATH)
+)
+
+# Response bodies that are the same for every user (achievement catalog, daily
+# vocabulary), kept serialized and compressed. Pages get validators built from
+# their inputs, so an unchanged page is answered 304 without rendering; the start
+# time is part of them so a deploy with new templates invalidates every page.
+response_cache = ResponseCache()
+STARTED_AT = datetime.now(timezone.utc).replace(microsecond=0)
+PAGE_CACHE_CONTROL = 'private, no-cache'
+
+# Stage timings, fallback and error counters and latency histograms, served at /metrics.
+# With METRICS_DIR set, every worker process writes its values there and /metrics adds them up
+metrics = Registry(
+    directory=os.getenv("METRICS_DIR") or None,
+    write_interval=float(os.getenv("METRICS_WRITE_INTERVAL", "5"))
+)
+STAGE_SECONDS = metrics.histogram(
+    'feedback_stage_seconds', 'Time spent in each stage of producing feedback', ('stage',)
+)
+FEEDBACK_SECONDS = metrics.histogram(
+    'feedback_seconds', 'Time to produce one feedback analysis', ('language', 'source')
+)
+INVALID_RESPONSES = metrics.counter(
+    'model_invalid_responses_total', 'Model responses that could not be parsed into an analysis'
+)
+LOCAL_FALLBACKS = metrics.counter(
+    'local_fallbacks_total', 'Feedback served by the local analysis instead of the model', ('reason',)
+)
+ERRORS = metrics.counter('errors_total', 'Errors on the feedback path', ('stage',))
+PAGES_NOT_MODIFIED = metrics.counter(
+    'pages_not_modified_total', 'Page views answered 304 without rendering', ('page',)
+)
+# Languages outside the content banks share one label so clients cannot create new series
+METRIC_LANGUAGES = frozenset(content_library.languages())
+
+# Started and stopped at runtime through /debug/profiler when enabled
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+# Callers must send it as a bearer token; without one the profiler stays off
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+if PROFILER_ENABLED and not PROFILER_TOKEN:
+    logger.warning("PROFILER_ENABLED is set without PROFILER_TOKEN; the profiler stays off")
+profiler = SamplingProfiler()
+
+@metrics.collector
+def component_metrics():
+    """Counters and gauges the model caller, cache, dispatcher and token tracker already keep"""
+    resilience = model_resilience.stats()
+    cache = feedback_cache.stats()
+    responses = response_cache.stats()
+    limiting = rate_limiter.stats()
+    tokens = token_usage.stats()
+    families = [
+        ('model_calls_total', 'counter', 'Model calls started', [({}, resilience['calls'])]),
+        ('model_retries_total', 'counter', 'Model call attempts retried after a transient failure',
+         [({}, resilience['retries'])]),
+        ('model_timeouts_total', 'counter', 'Model call attempts abandoned at their deadline',
+         [({}, resilience['timeouts'])]),
+        ('model_hedges_total', 'counter', 'Hedged second requests sent', [({}, resilience['hedges'])]),
+        ('model_short_circuited_total', 'counter', 'Model calls refused while the circuit was open',
+         [({}, resilience['short_circuited'])]),
+        ('circuit_state', 'gauge', 'Model circuit breaker state',
+         [({'state': state}, int(resilience['circuit'] == state))
+          for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)]),
+        ('feedback_cache_requests_total', 'counter', 'Feedback cache lookups by result',
+         [({'result': 'hit'}, cache['hits']), ({'result': 'miss'}, cache['misses'])]),
+        ('feedback_cache_entries', 'gauge', 'Analyses in the feedback cache', [({}, cache['entries'])]),
+        ('rate_limited_total', 'counter', 'Model-backed requests refused with a 429, by limit',
+         [({'limit': 'rate'}, limiting['limited']), ({'limit': 'quota'}, limiting['quota_exceeded'])]),
+        ('response_cache_requests_total', 'counter', 'Shared response lookups by result',
+         [({'result': 'hit'}, responses['hits']), ({'result': 'miss'}, responses['misses']),
+          ({'result': 'not_modified'}, responses['not_modified'])]),
+        ('feedback_in_flight', 'gauge', 'Feedback analyses running or queued',
+         [({}, feedback_dispatcher.stats()['in_flight'])]),
+        ('model_tokens_total', 'counter', 'Model tokens by direction',
+         [({'direction': 'prompt'}, tokens['prompt_tokens']),
+          ({'direction': 'response'}, tokens['response_tokens'])]),
     ]
-}
+    if feedback_batcher is not None:
+        batching = feedback_batcher.stats()
+        families.append(('feedback_batches_total', 'counter', 'Batched model calls', [({}, batching['batches'])]))
+    return families
 
-# Achievement badges
-ACHIEVEMENTS = [
-    {"id": "first_practice", "name": "First Steps", "description": "Complete your first practice session", "icon": "🎯"},
-    {"id": "five_practices", "name": "Getting Fluent", "description": "Complete 5 practice sessions", "icon": "🔥"},
-    {"id": "perfect_score", "name": "Perfect Pronunciation", "description": "Get a perfect score on a practice", "icon": "🌟"},
-    {"id": "three_day_streak", "name": "Consistency is Key", "description": "Practice for 3 days in a row", "icon": "📆"},
-    {"id": "vocabulary_master", "name": "Word Wizard", "description": "Learn 10 new vocabulary words", "icon": "📚"},
-    {"id": "multilingual", "name": "Global Citizen", "description": "Practice in at least 2 different languages", "icon": "🌍"}
-]
+def render_page(page, inputs, template, **context):
+    """
+    Render ``template`` for the current user unless the copy the browser holds
+    was rendered from the same ``inputs``, in which case it is answered 304
+    """
+    etag = fingerprint([STARTED_AT.isoformat(), template, inputs])
+    if not_modified(request, etag):
+        PAGES_NOT_MODIFIED.inc(page)
+        return not_modified_response(etag, cache_control=PAGE_CACHE_CONTROL, vary=('Cookie',))
+    response = make_response(render_template(template, **context))
+    response.vary.add('Cookie')
+    return validated(response, etag, cache_control=PAGE_CACHE_CONTROL)
 
-@app.route('/')
+@route('/')
 def home():
     # Generate a user ID if not present
     if 'user_id' not in session:
         session['user_id'] = str(uuid.uuid4())
-        USERS_DB[session['user_id']] = {
-            'progress': [],
-            'sessions': 0,
-            'total_score': 0,
-            'achievements': [],
-            'learned_words': [],
-            'last_practice_date': None,
-            'streak': 0,
-            'xp': 0,
-            'level': 1,
-            'languages_practiced': set()
-        }
-    return render_template('index.html')
+        user_store.create_user(session['user_id'])
+        return render_template('index.html')
+    return render_page('home', None, 'index.html')
 
-@app.route('/practice')
+@route('/practice')
 def practice():
     language = request.args.get('language', 'english')
     
     # Update user data for streaks
     user_id = session.get('user_id')
-    if user_id and user_id in USERS_DB:
-        today = date.today().isoformat()
-        last_date = USERS_DB[user_id].get('last_practice_date')
-        
+    if user_id and user_store.user_exists(user_id):
         # Add language to practiced languages
-        if language not in USERS_DB[user_id]['languages_practiced']:
-            USERS_DB[user_id]['languages_practiced'].add(language)
-            
-            # Check for multilingual achievement
-            if len(USERS_DB[user_id]['languages_practiced']) >= 2:
-                add_achievement(user_id, "multilingual")
+        added, languages_count = user_store.add_language(user_id, language)
+        if added:
+            dispatch_achievement_event(user_id, LANGUAGE_STARTED, {'languages': languages_count})
     
     return render_template('practice.html', language=language)
 
-@app.route('/progress')
+@route('/progress')
 def progress():
     user_id = session.get('user_id')
-    if not user_id or user_id not in USERS_DB:
+    user = user_store.get_user(user_id) if user_id else None
+    if user is None:
         return render_template('progress.html', progress=None)
     
-    return render_template('progress.html', progress=USERS_DB[user_id], achievements=ACHIEVEMENTS)
+    return render_page('progress', user, 'progress.html', progress=user, achievements=ACHIEVEMENTS)
 
-@app.route('/vocabulary')
+@route('/api/progress/history', methods=['GET'])
+def progress_history():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'No user session'}), 404
+    
+    cursor = request.args.get('cursor', type=int)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    items, next_cursor = user_store.get_history(user_id, cursor=cursor, limit=limit)
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+@route('/api/progress/stats', methods=['GET'])
+def progress_stats():
+    user_id = session.get('user_id')
+    stats = user_store.get_history_stats(user_id, days=30) if user_id else None
+    if stats is None:
+        return jsonify({'error': 'No user session'}), 404
+    return jsonify(stats)
+
+@route('/vocabulary')
 def vocabulary():
     language = request.args.get('language', 'english')
     user_id = session.get('user_id')
     
     # Get user's learned words
     learned_words = []
-    if user_id and user_id in USERS_DB:
-        learned_words = USERS_DB[user_id]['learned_words']
+    if user_id:
+        learned_words = user_store.get_learned_words(user_id)
     
-    # Get today's words (limit to 5)
-    today_words = VOCABULARY.get(language, [])[:5]
+    # Today's words (limit to 5), the same for everyone and different each day
+    today = date.today()
+    today_words = content_library.daily(VOCABULARY_BANK, language, today, count=5)
     
-    return render_template('vocabulary.html', language=language, vocabulary=today_words, learned_words=learned_words)
+    return render_page(
+        'vocabulary', [language, today.isoformat(), learned_words], 'vocabulary.html',
+        language=language, vocabulary=today_words, learned_words=learned_words
+    )
+
+@route('/api/vocabulary/daily', methods=['GET'])
+def daily_vocabulary():
+    language = request.args.get('language', 'english')
+    if content_library.bank(VOCABULARY_BANK, language) is None:
+        language = 'english'
+    today = date.today()
+    midnight = datetime.combine(today, datetime.min.time()).astimezone()
+    # The list only changes at local midnight, so shared caches may keep it until then
+    max_age = max(int((midnight + timedelta(days=1) - datetime.now().astimezone()).total_seconds()), 0)
+    return response_cache.respond(
+        request,
+        (VOCABULARY_BANK, language, today),
+        lambda: json_representation({
+            'language': language,
+            'date': today.isoformat(),
+            'words': content_library.daily(VOCABULARY_BANK, language, today, count=5)
+        }, last_modified=midnight.astimezone(timezone.utc)),
+        cache_control=f'public, max-age={max_age}'
+    )
 
-@app.route('/api/prompt', methods=['GET'])
+@route('/api/achievements', methods=['GET'])
+def achievement_catalog():
+    # Fixed for the life of the process; clients revalidate hourly with the ETag
+    return response_cache.respond(
+        request,
+        ('achievements',),
+        lambda: json_representation({'achievements': ACHIEVEMENTS}, last_modified=STARTED_AT),
+        cache_control='public, max-age=3600'
+    )
+
+@route('/api/prompt', methods=['GET'])
 def get_prompt():
     language = request.args.get('language', 'english')
-    if language not in PROMPTS:
+    if content_library.bank(PROMPT_BANK, language) is None:
         language = 'english'
+    difficulty = request.args.get('difficulty') or None
+    topic = request.args.get('topic') or None
+    
+    # Each user works through the whole bank before any prompt comes round again
+    user_id = session.get('user_id')
+    seen_key = f"{PROMPT_BANK}:{language}"
+    # Each filter combination is its own walk through the bank, in an order fixed per user
+    cursor_key = f"{seen_key}:{difficulty or ''}:{topic or ''}"
+    if user_id:
+        seen = user_store.get_seen(user_id, seen_key)
+        seed, cursor = user_id, user_store.get_cursor(user_id, cursor_key)
+    else:
+        seen, seed, cursor = SeenBitmap(), uuid.uuid4().hex, 0
+    
+    index, entry, exhausted, cursor = content_library.pick(
+        PROMPT_BANK, language, seen, seed, difficulty, topic, cursor
+    )
+    if entry is None:
+        return jsonify({'error': 'No prompts match the requested difficulty and topic'}), 404
+    if user_id:
+        user_store.mark_seen(user_id, seen_key, index, reset=exhausted, cursor=(cursor_key, cursor))
+    
+    # Every call picks the next unseen prompt, so no cache may answer for it
+    response = jsonify({
+        'prompt': entry['text'],
+        'language': language,
+        'id': index,
+        'difficulty': entry.get('difficulty'),
+        'topic': entry.get('topic')
+    })
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def parse_feedback_request():
+    """Validate a feedback request body, returning (fields, error response)"""
+    data = request.get_json(silent=True)
+    if not data:
+        logger.error("No JSON data received in request")
+        return None, (jsonify({'error': 'No data provided'}), 400)
+        
+    transcript = data.get('transcript', '')
+    language = data.get('language', 'english')
+    prompt = data.get('prompt', '')
+    
+    if not transcript:
+        logger.error("No transcript provided in request")
+        return None, (jsonify({'error': 'No transcript provided'}), 400)
     
-    prompt = random.choice(PROMPTS[language])
-    return jsonify({'prompt': prompt, 'language': language})
+    if not isinstance(language, str) or language not in SUPPORTED_LANGUAGES:
+        logger.error(f"Unsupported language in request: {language!r}")
+        return None, (jsonify({'error': 'Unsupported language', 'supported': sorted(SUPPORTED_LANGUAGES)}), 400)
+    
+    return (transcript, language, prompt), None
+
+def queue_full_response(error):
+    """Tell the client to back off while every model worker is busy"""
+    response = jsonify({
+        'error': 'Too many feedback requests in progress',
+        'message': 'Please try again shortly',
+        'retry_after': error.retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
 
-@app.route('/api/feedback', methods=['POST'])
+def quota_subject(user_id):
+    return f"user:{user_id}" if user_id else f"ip:{request.remote_addr}"
+
+def limit_response(decision, error):
+    """Tell the client it hit a rate limit or quota and when to come back"""
+    response = jsonify({
+        'error': error,
+        'message': 'Please try again later',
+        'retry_after': decision.retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(decision.retry_after)
+    return response
+
+def rate_limited(view=None, quota=True):
+    """
+    Check the user's and the client IP's rate limits before a model-backed view
+    runs and, with ``quota``, count the request against the daily model quota
+    """
+    if view is None:
+        return functools.partial(rate_limited, quota=quota)
+    
+    @functools.wraps(view)
+    def limited(*args, **kwargs):
+        user_id = session.get('user_id')
+        decision = rate_limiter.check({'user': user_id, 'ip': request.remote_addr})
+        if decision is not None:
+            g.rate_limit = decision
+            if not decision.allowed:
+                logger.warning(f"Rate limit reached for {quota_subject(user_id)}")
+                return limit_response(decision, 'Too many feedback requests')
+        # Offline analyses cost nothing, so they are not counted
+        if quota and rate_limiter.daily_quota and not OFFLINE_MODE:
+            g.quota = rate_limiter.consume_quota(quota_subject(user_id))
+            if not g.quota.allowed:
+                return limit_response(g.quota, 'Daily feedback quota used up')
+        return view(*args, **kwargs)
+    return limited
+
+def add_limit_headers(response):
+    """Report the rate limit and quota that applied to this request"""
+    for name, key in (('RateLimit', 'rate_limit'), ('Quota', 'quota')):
+        decision = g.get(key)
+        if decision is not None:
+            response.headers[f'X-{name}-Limit'] = str(decision.limit)
+            response.headers[f'X-{name}-Remaining'] = str(decision.remaining)
+            response.headers[f'X-{name}-Reset'] = str(decision.reset)
+    return response
+
+def deadline_fallback(transcript, prompt, language):
+    LOCAL_FALLBACKS.inc('deadline')
+    return local_analyze_speech(transcript, prompt, language)
+
+def start_feedback_job(user_id, transcript, language, prompt, track=True):
+    """
+    Run the analysis on the bounded dispatcher and record progress when it finishes.
+    Only tracked jobs can be polled through /api/feedback/jobs.
+    """
+    logger.info(f"Analyzing speech in {language} for prompt: {prompt}")
+    logger.info(f"Transcript: {transcript}")
+    return feedback_dispatcher.submit(
+        analyze_speech_with_gemini,
+        (transcript, prompt, language),
+        # Past the per-call deadline the learner gets the local analysis instead
+        fallback=lambda: deadline_fallback(transcript, prompt, language),
+        on_complete=lambda feedback: update_user_progress(user_id, transcript, language, prompt, feedback),
+        owner=user_id,
+        track=track
+    )
+
+@route('/api/feedback', methods=['POST'])
+@rate_limited
 def get_feedback():
     try:
-        data = request.json
-        if not data:
-            logger.error("No JSON data received in request")
-            return jsonify({'error': 'No data provided'}), 400
-            
-        transcript = data.get('transcript', '')
-        language = data.get('language', 'english')
-        prompt = data.get('prompt', '')
-        
-        if not transcript:
-            logger.error("No transcript provided in request")
-            return jsonify({'error': 'No transcript provided'}), 400
-            
-        logger.info(f"Analyzing speech in {language} for prompt: {prompt}")
-        logger.info(f"Transcript: {transcript}")
+        fields, error = parse_feedback_request()
+        if error:
+            return error
+        transcript, language, prompt = fields
         
-        # Use Gemini to analyze speech
-        feedback = analyze_speech_with_gemini(transcript, prompt, language)
+        try:
+            job = start_feedback_job(session.get('user_id'), transcript, language, prompt, track=False)
+        except QueueFullError as e:
+            logger.warning("Feedback queue full, rejecting request")
+            return queue_full_response(e)
         
-        # Store progress data and update achievements
-        user_id = session.get('user_id')
-        if user_id and user_id in USERS_DB:
-            try:
-                # Update session count
-                USERS_DB[user_id]['sessions'] += 1
-                
-                # Check for first practice achievement
-                if USERS_DB[user_id]['sessions'] == 1:
-                    add_achievement(user_id, "first_practice")
-                
-                # Check for five practices achievement
-                if USERS_DB[user_id]['sessions'] == 5:
-                    add_achievement(user_id, "five_practices")
-                
-                # Update score and check for perfect score
-                USERS_DB[user_id]['total_score'] += feedback['score']
-                if feedback['score'] >= 9.5:
-                    add_achievement(user_id, "perfect_score")
-                
-                # Update XP and level
-                xp_gained = int(feedback['score'] * 10)
-                USERS_DB[user_id]['xp'] += xp_gained
-                
-                # Level up logic (100 XP per level)
-                new_level = (USERS_DB[user_id]['xp'] // 100) + 1
-                level_up = new_level > USERS_DB[user_id]['level']
-                USERS_DB[user_id]['level'] = new_level
-                
-                # Update streak
-                today = date.today().isoformat()
-                last_date = USERS_DB[user_id].get('last_practice_date')
-                
-                if last_date:
-                    yesterday = (datetime.strptime(today, '%Y-%m-%d') - datetime.timedelta(days=1)).strftime('%Y-%m-%d')
-                    if last_date == yesterday:
-                        USERS_DB[user_id]['streak'] += 1
-                        
-                        # Check for three-day streak achievement
-                        if USERS_DB[user_id]['streak'] == 3:
-                            add_achievement(user_id, "three_day_streak")
-                    elif last_date != today:
-                        # Reset streak if not consecutive days
-                        USERS_DB[user_id]['streak'] = 1
-                else:
-                    USERS_DB[user_id]['streak'] = 1
-                    
-                USERS_DB[user_id]['last_practice_date'] = today
-                
-                # Store the practice session
-                USERS_DB[user_id]['progress'].append({
-                    'date': datetime.now().strftime('%Y-%m-%d %H:%M'),
-                    'language': language,
-                    'prompt': prompt,
-                    'transcript': transcript,
-                    'score': feedback['score'],
-                    'feedback': feedback['message'],
-                    'xp_gained': xp_gained
-                })
-                
-                # Add level up information to the response if applicable
-                feedback['level_up'] = level_up
-                feedback['new_level'] = new_level if level_up else None
-                feedback['xp_gained'] = xp_gained
-                feedback['total_xp'] = USERS_DB[user_id]['xp']
-                feedback['streak'] = USERS_DB[user_id]['streak']
-                
-            except Exception as e:
-                logger.error(f"Error updating user progress: {str(e)}")
-                # Continue with the response even if progress update fails
+        feedback = job.wait()
+        if job.status != 'done':
+            raise RuntimeError(job.error)
         
         logger.info("Successfully generated feedback")
         return jsonify(feedback)
@@ -323,171 +548,626 @@ def get_feedback():
             'message': 'Please try again'
         }), 500
 
-@app.route('/api/learn-word', methods=['POST'])
+@route('/api/feedback/batch', methods=['POST'])
+@rate_limited(quota=False)
+def grade_feedback_batch():
+    """
+    Grade a JSONL body of {"id", "transcript", "language", "prompt"} records and
+    stream one JSONL result per record, in order, then a final {"stats": ...} line.
+    Every record counts against the daily quota; reading stops when it runs out.
+    """
+    subject = quota_subject(session.get('user_id'))
+    metered = rate_limiter.daily_quota and not OFFLINE_MODE
+    exhausted = []
+    
+    def records():
+        for line in request.stream:
+            if metered and line.strip():
+                decision = rate_limiter.consume_quota(subject)
+                if not decision.allowed:
+                    exhausted.append(decision)
+                    return
+            yield line
+    
+    def generate():
+        stats = BatchStats()
+        for result in batch_grader.run(records(), stats=stats):
+            yield json.dumps(result) + '\n'
+        if exhausted:
+            yield json.dumps({'error': 'Daily feedback quota used up', 'retry_after': exhausted[0].retry_after}) + '\n'
+        logger.info(f"Graded batch: {stats.to_dict()}")
+        yield json.dumps({'stats': stats.to_dict()}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@route('/api/feedback/jobs', methods=['POST'])
+@rate_limited
+def submit_feedback_job():
+    fields, error = parse_feedback_request()
+    if error:
+        return error
+    transcript, language, prompt = fields
+    
+    try:
+        job = start_feedback_job(session.get('user_id'), transcript, language, prompt)
+    except QueueFullError as e:
+        logger.warning("Feedback queue full, rejecting job")
+        return queue_full_response(e)
+    
+    poll_url = f"/api/feedback/jobs/{job.id}"
+    response = jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'poll_url': poll_url,
+        'provisional': provisional_scores(transcript, prompt, language)
+    })
+    response.status_code = 202
+    response.headers['Location'] = poll_url
+    return response
+
+@route('/api/feedback/jobs/<job_id>', methods=['GET'])
+def get_feedback_job(job_id):
+    # Someone else's job answers the same as an unknown one
+    job = feedback_dispatcher.get_job(job_id, owner=session.get('user_id'))
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    
+    response = jsonify(job.to_dict())
+    if job.status == 'pending':
+        response.headers['Retry-After'] = '1'
+    return response
+
+@route('/api/feedback/stream', methods=['POST'])
+@rate_limited
+def stream_feedback():
+    """Send each feedback section over Server-Sent Events as soon as it is ready"""
+    fields, error = parse_feedback_request()
+    if error:
+        return error
+    transcript, language, prompt = fields
+    user_id = session.get('user_id')
+    
+    try:
+        slot = feedback_dispatcher.reserve()
+    except QueueFullError as e:
+        logger.warning("Feedback queue full, rejecting stream")
+        return queue_full_response(e)
+    
+    def generate():
+        with slot:
+            try:
+                yield sse_event('provisional', provisional_scores(transcript, prompt, language))
+                for section, value in stream_feedback_sections(transcript, prompt, language):
+                    if section == 'feedback':
+                        feedback = update_user_progress(user_id, transcript, language, prompt, value)
+                        yield sse_event('done', feedback)
+                    else:
+                        yield sse_event('section', {'section': section, 'data': value})
+            except Exception as e:
+                logger.error(f"Error in feedback stream: {str(e)}")
+                yield sse_event('error', {
+                    'error': 'An error occurred while analyzing your response',
+                    'message': 'Please try again'
+                })
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    # Also frees the slot when the client disconnects before the stream starts
+    response.call_on_close(slot.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def update_user_progress(user_id, transcript, language, prompt, feedback):
+    """Store the practice session and update XP, level, streak and achievements"""
+    if user_id:
+        try:
+            # XP, level, streak, achievements and the session entry are applied as one unit
+            with STAGE_SECONDS.time('progress_update'):
+                outcome = user_store.record_practice(user_id, {
+                    'language': language,
+                    'prompt': prompt,
+                    'transcript': transcript,
+                    'score': feedback['score'],
+                    'feedback': feedback['message']
+                })
+                
+                if outcome is not None:
+                    leaderboards.record_practice(user_id, language, feedback['score'], outcome)
+            
+            if outcome is not None:
+                # Add level up information to the response if applicable
+                feedback['level_up'] = outcome['level_up']
+                feedback['new_level'] = outcome['new_level']
+                feedback['xp_gained'] = outcome['xp_gained']
+                feedback['total_xp'] = outcome['total_xp']
+                feedback['streak'] = outcome['streak']
+            
+        except Exception as e:
+            ERRORS.inc('progress_update')
+            logger.error(f"Error updating user progress: {str(e)}")
+            # Continue with the response even if progress update fails
+    
+    return feedback
+
+@route('/api/feedback/cache', methods=['GET'])
+def feedback_cache_stats():
+    return jsonify(feedback_cache.stats())
+
+@route('/api/model/stats', methods=['GET'])
+def model_stats():
+    stats = model_clients.stats()
+    stats['offline'] = OFFLINE_MODE
+    stats['resilience'] = model_resilience.stats()
+    stats['tokens'] = token_usage.stats()
+    if feedback_batcher is not None:
+        stats['batching'] = feedback_batcher.stats()
+    return jsonify(stats)
+
+def share_metrics(response):
+    """Keep this worker's file in METRICS_DIR current for whichever worker answers /metrics"""
+    metrics.maybe_write()
+    return response
+
+@route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+@route('/debug/profiler', methods=['POST'])
+def control_profiler():
+    """Start the sampling profiler, or stop it and download the collapsed stacks"""
+    if not PROFILER_ENABLED or not PROFILER_TOKEN:
+        return jsonify({'error': 'Profiling is disabled'}), 404
+    supplied = request.headers.get('Authorization', '').encode('utf-8')
+    if not hmac.compare_digest(supplied, f'Bearer {PROFILER_TOKEN}'.encode('utf-8')):
+        return jsonify({'error': 'Unauthorized'}), 401
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    if action == 'start':
+        try:
+            interval = max(1.0, float(data.get('interval_ms', 5))) / 1000
+        except (TypeError, ValueError):
+            return jsonify({'error': 'interval_ms must be a number'}), 400
+        started = profiler.start(interval)
+        return jsonify({'running': True, 'started': started, 'interval_ms': profiler.interval * 1000})
+    if action == 'stop':
+        stacks = profiler.stop()
+        if stacks is None:
+            return jsonify({'error': 'Profiler is not running'}), 409
+        return Response(stacks, mimetype='text/plain')
+    return jsonify({'error': "action must be 'start' or 'stop'"}), 400
+
+@route('/api/learn-word', methods=['POST'])
 def learn_word():
     data = request.json
     word = data.get('word')
     
     user_id = session.get('user_id')
-    if user_id and user_id in USERS_DB and word:
-        if word not in USERS_DB[user_id]['learned_words']:
-            USERS_DB[user_id]['learned_words'].append(word)
-            USERS_DB[user_id]['xp'] += 5  # Award XP for learning a word
-            
-            # Check for vocabulary master achievement
-            if len(USERS_DB[user_id]['learned_words']) >= 10:
-                add_achievement(user_id, "vocabulary_master")
+    if user_id and user_store.user_exists(user_id) and word:
+        # Award XP for learning a word
+        added, words_count = user_store.add_learned_word(user_id, word, xp=5)
+        if added:
+            leaderboards.add_xp(user_id, 5)
+            dispatch_achievement_event(user_id, WORD_LEARNED, {'learned_words': words_count})
             
             return jsonify({'success': True, 'message': f'Added "{word}" to your learned words!', 'xp_gained': 5})
     
     return jsonify({'success': False, 'message': 'Failed to add word'})
 
+LEADERBOARDS = (XP, WEEKLY_SCORE, LONGEST_STREAK)
+
+@route('/api/leaderboards/<board>', methods=['GET'])
+def leaderboard(board):
+    if board not in LEADERBOARDS:
+        return jsonify({'error': f'Unknown leaderboard, choose one of: {", ".join(LEADERBOARDS)}'}), 404
+    language = request.args.get('language')
+    name = f'{board}:{language}' if board == XP and language else board
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    
+    user_id = session.get('user_id')
+    total, page, mine = leaderboards.page(name, offset, limit, user_id=user_id)
+    return jsonify({
+        'board': board,
+        'language': language if board == XP else None,
+        'total': total,
+        'items': [
+            {'rank': rank, 'player': player_name(member), 'score': score, 'you': member == user_id}
+            for rank, member, score in page
+        ],
+        'you': {'rank': mine[0], 'score': mine[1]} if mine else None,
+        'next_offset': offset + limit if offset + limit < total else None
+    })
+
+@route('/api/review/due', methods=['GET'])
+def due_reviews():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'No user session'}), 404
+    
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return jsonify({'items': user_store.get_due_cards(user_id, limit=limit)})
+
+@route('/api/review', methods=['POST'])
+def record_review():
+    data = request.get_json(silent=True) or {}
+    word = data.get('word')
+    grade = data.get('grade')
+    
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'No user session'}), 404
+    if not word or not isinstance(grade, int) or isinstance(grade, bool) or not 0 <= grade <= 5:
+        return jsonify({'error': 'Provide a word and a grade from 0 (forgotten) to 5 (perfect recall)'}), 400
+    
+    card = user_store.record_review(user_id, word, grade)
+    if card is None:
+        return jsonify({'error': f'"{word}" is not one of your learned words'}), 404
+    return jsonify(card)
+
+def dispatch_achievement_event(user_id, event, stats):
+    """Award whatever achievements ``event`` earns, returning the new ones"""
+    if not achievement_engine.has_rules(event):
+        return []
+    earned = user_store.get_achievements(user_id)
+    return [
+        achievement_id for achievement_id in achievement_engine.evaluate(event, stats, earned)
+        if add_achievement(user_id, achievement_id)
+    ]
+
+@click.command('backfill-achievements')
+def backfill_achievements():
+    """Re-evaluate every achievement rule over stored history and award missing badges"""
+    awarded = 0
+    for user_id, stats, earned in user_store.achievement_stats():
+        for achievement_id in achievement_engine.evaluate_all(stats, earned):
+            if add_achievement(user_id, achievement_id):
+                awarded += 1
+    click.echo(f"Awarded {awarded} missing achievements")
+
+@click.group('snapshot')
+def snapshot_cli():
+    """Export, compact and query columnar snapshots of user progress (in SNAPSHOT_DIR)"""
+
+@snapshot_cli.command('export')
+@click.option('--full', is_flag=True, help='Write a full snapshot instead of adding to the chain')
+def export_snapshot(full):
+    """Snapshot every user; only sessions since the last snapshot are written unless --full"""
+    writer = snapshots.export(user_store, full=full)
+    click.echo(f"Exported {writer.users} users and {writer.sessions} sessions")
+
+@snapshot_cli.command('compact')
+def compact_snapshots():
+    """Merge the snapshot chain into a single full snapshot"""
+    writer = snapshots.compact()
+    click.echo("No snapshots to compact" if writer is None else
+               f"Compacted into {writer.users} users and {writer.sessions} sessions")
+
+@snapshot_cli.command('restore')
+def restore_snapshot():
+    """Load the latest snapshot chain into the configured store"""
+    click.echo(f"Restored {snapshots.restore(user_store)} users")
+
+@snapshot_cli.command('stats')
+@click.option('--since', type=click.DateTime(['%Y-%m-%d']), help='First day to include')
+@click.option('--until', type=click.DateTime(['%Y-%m-%d']), help='Last day to include')
+def snapshot_stats(since, until):
+    """Per-language session counts and score statistics over the snapshot chain"""
+    stats = snapshots.language_stats(since.date() if since else None, until.date() if until else None)
+    click.echo(json.dumps(stats, indent=2))
+
+@click.command('grade-batch')
+@click.argument('source', type=click.File('r'))
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Results file; an existing one is resumed')
+@click.option('--restart', is_flag=True, help='Overwrite the results file instead of resuming it')
+@click.option('--workers', type=int, help='Concurrent analyses (defaults to BATCH_WORKERS)')
+def grade_batch(source, output, restart, workers):
+    """
+    Grade a JSONL file of transcripts ('-' for stdin), writing JSONL results to
+    --output or stdout. Records already graded in --output are skipped.
+    """
+    grader = batch_grader if workers is None else BatchGrader(
+        batch_grader.grade, batch_grader.fallback, workers=workers, languages=SUPPORTED_LANGUAGES
+    )
+    skip = set()
+    if output and not restart:
+        try:
+            with open(output, encoding='utf-8') as f:
+                skip = completed_ids(f)
+        except FileNotFoundError:
+            pass
+        if skip:
+            click.echo(f"Resuming: {len(skip)} records already graded", err=True)
+    
+    stats = BatchStats()
+    target = open(output, 'w' if restart else 'a', encoding='utf-8') if output else sys.stdout
+    try:
+        for count, result in enumerate(grader.run(source, skip=skip, stats=stats), 1):
+            target.write(json.dumps(result) + '\n')
+            # Every written line is a checkpoint
+            target.flush()
+            if count % 100 == 0:
+                click.echo(f"{count} records, {stats.to_dict()['per_second']}/s", err=True)
+    finally:
+        if output:
+            target.close()
+    click.echo(json.dumps(stats.to_dict()), err=True)
+
 def add_achievement(user_id, achievement_id):
     """Add an achievement to the user's profile if they don't already have it"""
-    if user_id in USERS_DB:
-        if achievement_id not in USERS_DB[user_id]['achievements']:
-            USERS_DB[user_id]['achievements'].append(achievement_id)
-            # Award XP for achievements
-            USERS_DB[user_id]['xp'] += 50
+    # Award XP for achievements
+    added = user_store.add_achievement(user_id, achievement_id, xp=ACHIEVEMENT_XP)
+    if added:
+        leaderboards.add_xp(user_id, ACHIEVEMENT_XP)
+    return added
+
+# Analysis fields each streamed feedback section is built from. A section is sent once all
+# its fields are in; pronunciation and vocabulary come from the local lookup tables, so
+# they go out before the model has generated anything.
+FEEDBACK_SECTIONS = {
+    'grammar': ('grammar_score', 'grammar_feedback'),
+    'fluency': ('fluency_score', 'fluency_feedback'),
+    'pronunciation': ('pronunciation_score', 'pronunciation_feedback'),
+    'vocabulary': ('vocabulary_score', 'vocabulary_feedback'),
+    'summary': ('overall_score', 'overall_feedback'),
+    'suggestions': ('suggestions',)
+}
+
+def format_feedback_section(section, analysis):
+    """Turn the raw analysis fields of one section into its response value"""
+    if section == 'grammar':
+        feedback = analysis['grammar_feedback']
+        return {
+            'score': float(analysis['grammar_score']),
+            'feedback': format_feedback_message(feedback['issues'], feedback['corrections'], feedback['explanation'])
+        }
+    if section == 'fluency':
+        feedback = analysis['fluency_feedback']
+        return {
+            'score': float(analysis['fluency_score']),
+            'feedback': format_feedback_message(feedback['issues'], feedback['improvements'])
+        }
+    if section == 'pronunciation':
+        feedback = analysis['pronunciation_feedback']
+        return {
+            'score': float(analysis['pronunciation_score']),
+            'feedback': format_pronunciation_feedback(feedback['difficult_words'], feedback['correct_pronunciation'])
+        }
+    if section == 'vocabulary':
+        feedback = analysis['vocabulary_feedback']
+        return {
+            'score': float(analysis['vocabulary_score']),
+            'feedback': format_vocabulary_feedback(
+                feedback['basic_words_used'], feedback['suggested_alternatives'], feedback['context']
+            )
+        }
+    if section == 'summary':
+        return {'score': float(analysis['overall_score']), 'message': analysis['overall_feedback']}
+    return analysis['suggestions']
+
+def format_analysis(analysis):
+    """Build the feedback response from a complete model analysis"""
+    summary = format_feedback_section('summary', analysis)
+    return {
+        'score': summary['score'],
+        'message': summary['message'],
+        'grammar': format_feedback_section('grammar', analysis),
+        'fluency': format_feedback_section('fluency', analysis),
+        'pronunciation': format_feedback_section('pronunciation', analysis),
+        'vocabulary': format_feedback_section('vocabulary', analysis),
+        'suggestions': format_feedback_section('suggestions', analysis)
+    }
+
+def section_from_feedback(section, feedback):
+    """Pick one section back out of a formatted feedback response"""
+    if section == 'summary':
+        return {'score': feedback['score'], 'message': feedback['message']}
+    return feedback[section]
+
+def request_model_analysis(transcript, prompt, language):
+    """Ask Gemini for one analysis, retrying only unusable responses; raises if none is usable"""
+    # Create the prompt for Gemini; the model is not asked for the sections filled in locally
+    with STAGE_SECONDS.time('prompt_build'):
+        analysis_prompt = prompt_builder.analysis(transcript, prompt, language)
+        local = local_analyzer.word_sections(transcript, language)
+
+    # Generate the analysis with retries
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            with STAGE_SECONDS.time('model_call'):
+                response = model_resilience.call(lambda: model_clients.generate(analysis_prompt.text))
+            token_usage.record(analysis_prompt, response, response.text)
+            
+            # Parse, repair and validate the JSON, filling defaults for optional fields
+            with STAGE_SECONDS.time('parse'):
+                analysis = parse_analysis(response.text, local)
+            
+            # Format detailed feedback messages
+            with STAGE_SECONDS.time('format'):
+                return format_analysis(analysis.to_dict())
+                
+        except ValueError as e:
+            # ResponseParseError, or response.text on a blocked/empty response
+            INVALID_RESPONSES.inc()
+            logger.warning(f"Unusable model response in attempt {attempt + 1}: {str(e)}")
+            if attempt == max_retries - 1:
+                raise
+
+def run_feedback_batch(key, transcripts):
+    """
+    Analyze several transcripts for the same (language, prompt) with one model call.
+    Any response that is missing or invalid in the batch result comes back as RETRY,
+    so the request that submitted it analyzes it on its own.
+    """
+    language, prompt = key
+    if len(transcripts) == 1:
+        return [RETRY]
+    
+    analyses = {}
+    with STAGE_SECONDS.time('prompt_build'):
+        batch_prompt = prompt_builder.batch_analysis(transcripts, prompt, language)
+        local = [local_analyzer.word_sections(transcript, language) for transcript in transcripts]
+    try:
+        with STAGE_SECONDS.time('model_call'):
+            response = model_resilience.call(lambda: model_clients.generate(
+                batch_prompt.text,
+                generation_config={'max_output_tokens': min(2048 * len(transcripts), 8192)}
+            ))
+        token_usage.record(batch_prompt, response, response.text)
+        with STAGE_SECONDS.time('parse'):
+            analyses = parse_analysis_list(response.text, len(transcripts), local)
+    except Exception as e:
+        ERRORS.inc('model')
+        logger.error(f"Batched analysis failed: {str(e)}")
+    logger.info(f"Batched analysis returned {len(analyses)}/{len(transcripts)} usable results")
+    
+    results = []
+    for index in range(len(transcripts)):
+        if index not in analyses:
+            results.append(RETRY)
+            continue
+        try:
+            results.append(format_analysis(analyses[index].to_dict()))
+        except Exception as e:
+            results.append(e)
+    return results
 
 def analyze_speech_with_gemini(transcript, prompt, language):
     """
     Use Google's Gemini Pro model to analyze speech with detailed feedback
     """
+    started = time.perf_counter()
     try:
-        if not GEMINI_API_KEY:
-            print("No API key available, falling back to mock implementation")
-            return mock_analyze_speech(transcript, prompt, language)
-            
-        # Configure the model
-        model = genai.GenerativeModel('gemini-pro')
+        if OFFLINE_MODE:
+            LOCAL_FALLBACKS.inc('offline')
+            return observe_feedback(local_analyze_speech(transcript, prompt, language), language, 'local', started)
         
-        # Create the prompt for Gemini
-        analysis_prompt = f"""You are a language learning assistant. Analyze this speech response and provide detailed feedback with specific examples and improvements.
-
-Language: {language}
-Original Prompt: "{prompt}"
-Student's Response: "{transcript}"
-
-Analyze the response and provide detailed feedback in the following JSON format exactly:
-{{
-    "grammar_score": <number between 0-10>,
-    "fluency_score": <number between 0-10>,
-    "pronunciation_score": <number between 0-10>,
-    "vocabulary_score": <number between 0-10>,
-    "overall_score": <average of all scores>,
-    "grammar_feedback": {{
-        "issues": ["<specific grammar mistake 1>", "<specific grammar mistake 2>"],
-        "corrections": ["<corrected version 1>", "<corrected version 2>"],
-        "explanation": "<brief explanation of the grammar rules>"
-    }},
-    "fluency_feedback": {{
-        "issues": ["<specific fluency issue 1>", "<specific fluency issue 2>"],
-        "improvements": ["<how to improve 1>", "<how to improve 2>"]
-    }},
-    "pronunciation_feedback": {{
-        "difficult_words": ["<word 1>", "<word 2>"],
-        "correct_pronunciation": ["<pronunciation guide 1>", "<pronunciation guide 2>"]
-    }},
-    "vocabulary_feedback": {{
-        "basic_words_used": ["<word 1>", "<word 2>"],
-        "suggested_alternatives": ["<better word 1>", "<better word 2>"],
-        "context": "<explanation of when to use these alternatives>"
-    }},
-    "overall_feedback": "<2-3 sentences of general feedback>",
-    "suggestions": [
-        "<specific actionable suggestion 1>",
-        "<specific actionable suggestion 2>",
-        "<specific actionable suggestion 3>"
-    ]
-}}
-
-Important: 
-1. Provide specific examples from the student's response
-2. Give clear, actionable corrections
-3. Include brief explanations of rules or patterns
-4. Respond ONLY with the JSON object, no other text"""
-
-        # Generate the analysis with retries
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = model.generate_content(analysis_prompt)
-                response_text = response.text.strip()
-                
-                # Clean up the response text
-                if "```json" in response_text:
-                    json_content = response_text.split("```json")[1].split("```")[0].strip()
-                elif "```" in response_text:
-                    json_content = response_text.split("```")[1].strip()
-                else:
-                    json_content = response_text
-                
-                # Parse JSON and validate required fields
-                analysis = json.loads(json_content)
-                required_fields = ['grammar_score', 'fluency_score', 'pronunciation_score', 
-                                 'vocabulary_score', 'overall_score', 'grammar_feedback',
-                                 'fluency_feedback', 'pronunciation_feedback', 
-                                 'vocabulary_feedback', 'overall_feedback', 'suggestions']
-                
-                if all(field in analysis for field in required_fields):
-                    # Format detailed feedback messages
-                    grammar_msg = format_feedback_message(
-                        analysis['grammar_feedback']['issues'],
-                        analysis['grammar_feedback']['corrections'],
-                        analysis['grammar_feedback']['explanation']
-                    )
-                    
-                    fluency_msg = format_feedback_message(
-                        analysis['fluency_feedback']['issues'],
-                        analysis['fluency_feedback']['improvements']
-                    )
-                    
-                    pronunciation_msg = format_pronunciation_feedback(
-                        analysis['pronunciation_feedback']['difficult_words'],
-                        analysis['pronunciation_feedback']['correct_pronunciation']
-                    )
-                    
-                    vocabulary_msg = format_vocabulary_feedback(
-                        analysis['vocabulary_feedback']['basic_words_used'],
-                        analysis['vocabulary_feedback']['suggested_alternatives'],
-                        analysis['vocabulary_feedback']['context']
-                    )
-                    
-                    return {
-                        'score': float(analysis['overall_score']),
-                        'message': analysis['overall_feedback'],
-                        'grammar': {
-                            'score': float(analysis['grammar_score']),
-                            'feedback': grammar_msg
-                        },
-                        'fluency': {
-                            'score': float(analysis['fluency_score']),
-                            'feedback': fluency_msg
-                        },
-                        'pronunciation': {
-                            'score': float(analysis['pronunciation_score']),
-                            'feedback': pronunciation_msg
-                        },
-                        'vocabulary': {
-                            'score': float(analysis['vocabulary_score']),
-                            'feedback': vocabulary_msg
-                        },
-                        'suggestions': analysis['suggestions']
-                    }
-                else:
-                    print(f"Missing required fields in API response, attempt {attempt + 1}")
-                    if attempt == max_retries - 1:
-                        raise ValueError("Invalid API response format")
-                    
-            except (json.JSONDecodeError, ValueError) as e:
-                print(f"Error in attempt {attempt + 1}: {str(e)}")
-                if attempt == max_retries - 1:
-                    raise
+        # Identical (normalized) submissions reuse the earlier model analysis
+        cached = feedback_cache.get(language, prompt, transcript)
+        if cached is not None:
+            logger.info("Feedback cache hit")
+            return observe_feedback(cached, language, 'cache', started)
+        
+        if feedback_batcher is not None:
+            # Bursts of answers to the same prompt share one model call
+            feedback = feedback_batcher.submit((language, prompt), transcript)
+        else:
+            feedback = request_model_analysis(transcript, prompt, language)
+        
+        # Only real model analyses are cached, never the local fallback
+        feedback_cache.set(language, prompt, transcript, feedback)
+        return observe_feedback(feedback, language, 'model', started)
                 
     except Exception as e:
-        print(f"Error using Gemini API: {str(e)}")
-        return mock_analyze_speech(transcript, prompt, language)
+        logger.error(f"Error using Gemini API: {str(e)}")
+        ERRORS.inc('model')
+        LOCAL_FALLBACKS.inc('circuit_open' if isinstance(e, CircuitOpenError) else 'model_error')
+        return observe_feedback(local_analyze_speech(transcript, prompt, language), language, 'local', started)
+
+def grade_transcript(transcript, prompt, language):
+    """
+    Analysis for batch grading as (feedback, source). Unlike analyze_speech_with_gemini
+    it raises when the model fails, so the record is reported and graded again on resume.
+    """
+    if OFFLINE_MODE:
+        return local_analyze_speech(transcript, prompt, language), 'local'
+    cached = feedback_cache.get(language, prompt, transcript)
+    if cached is not None:
+        return cached, 'cache'
+    if feedback_batcher is not None:
+        # A class answering the same prompt fills model batches quickly
+        feedback = feedback_batcher.submit((language, prompt), transcript)
+    else:
+        feedback = request_model_analysis(transcript, prompt, language)
+    feedback_cache.set(language, prompt, transcript, feedback)
+    return feedback, 'model'
+
+def observe_feedback(feedback, language, source, started):
+    """Record how long producing ``feedback`` took, by language and where it came from"""
+    FEEDBACK_SECONDS.observe(
+        time.perf_counter() - started, language if language in METRIC_LANGUAGES else 'other', source
+    )
+    return feedback
+
+def stream_feedback_sections(transcript, prompt, language):
+    """
+    Yield (section, value) pairs as soon as the streamed model output completes them,
+    followed by ('feedback', full_feedback). Falls back to the local analysis for any
+    section the model did not deliver.
+    """
+    started = time.perf_counter()
+    sent = set()
+    analysis = {}
+    feedback = None
+    source = 'model'
+    
+    cached = feedback_cache.get(language, prompt, transcript) if not OFFLINE_MODE else None
+    if cached is not None:
+        logger.info("Feedback cache hit")
+        feedback = cached
+        source = 'cache'
+    elif not OFFLINE_MODE:
+        try:
+            # Hedging a stream would pay for two generations, so only the deadline and breaker apply
+            with STAGE_SECONDS.time('prompt_build'):
+                analysis_prompt = prompt_builder.analysis(transcript, prompt, language)
+                local = local_analyzer.word_sections(transcript, language)
+            analysis.update(local)
+            yield from completed_sections(analysis, sent)
+            # The call budget covers the whole stream, not just the first chunk
+            deadline = time.monotonic() + model_resilience.budget
+            response = model_resilience.call(
+                lambda: model_clients.generate(analysis_prompt.text, stream=True),
+                hedge=False
+            )
+            parser = IncrementalJSONParser()
+            streamed = []
+            for chunk in model_resilience.iterate(response, deadline):
+                streamed.append(chunk.text)
+                for key, value in parser.feed(chunk.text):
+                    try:
+                        analysis[key] = coerce_field(key, value)
+                    except ResponseParseError:
+                        # Left out; validation below decides whether the rest is usable
+                        continue
+                    if 'overall_score' not in analysis and all(name in analysis for name in SCORE_FIELDS):
+                        analysis['overall_score'] = overall_score(analysis)
+                    yield from completed_sections(analysis, sent)
+            token_usage.record(analysis_prompt, response, ''.join(streamed))
+            # Fills optional fields the stream left out
+            feedback = format_analysis(validate_analysis(analysis, local).to_dict())
+            feedback_cache.set(language, prompt, transcript, feedback)
+        except Exception as e:
+            logger.error(f"Error streaming Gemini analysis: {str(e)}")
+            ERRORS.inc('stream')
+    else:
+        LOCAL_FALLBACKS.inc('offline')
+    
+    if feedback is None:
+        # Fill whatever the model did not finish with the local analysis
+        if not OFFLINE_MODE:
+            LOCAL_FALLBACKS.inc('stream_incomplete')
+        source = 'local'
+        feedback = local_analyze_speech(transcript, prompt, language)
+        for section in sent:
+            if section == 'summary':
+                feedback['score'] = float(analysis['overall_score'])
+                feedback['message'] = analysis['overall_feedback']
+            else:
+                feedback[section] = format_feedback_section(section, analysis)
+    
+    for section in FEEDBACK_SECTIONS:
+        if section not in sent:
+            yield section, section_from_feedback(section, feedback)
+    yield 'feedback', observe_feedback(feedback, language, source, started)
+
+def completed_sections(analysis, sent):
+    """Yield (section, value) for each section whose fields are all in ``analysis`` and that is not in ``sent`` yet"""
+    for section, fields in FEEDBACK_SECTIONS.items():
+        if section not in sent and all(field in analysis for field in fields):
+            value = format_feedback_section(section, analysis)
+            sent.add(section)
+            yield section, value
 
 def format_feedback_message(issues, corrections, explanation=None):
     """Format feedback with issues and corrections"""
@@ -513,136 +1193,104 @@ def format_vocabulary_feedback(basic_words, alternatives, context):
     message += f"\nTip: {context}"
     return message.strip()
 
-def mock_analyze_speech(transcript, prompt, language):
+def local_analyze_speech(transcript, prompt, language):
     """
-    Mock AI analysis function with detailed feedback - used as fallback when Gemini API is unavailable
+    Deterministic local analysis - used for provisional scores and as the fallback
+    when the Gemini API is unavailable
     """
-    # Simple scoring based on transcript length and complexity
-    word_count = len(transcript.split())
-    
-    # Base score on word count (more words = higher score, up to a point)
-    base_score = min(word_count / 5, 10)
-    
-    # Adjust score based on variety of words (simple heuristic)
-    unique_words = len(set(word.lower() for word in transcript.split()))
-    vocabulary_score = min(unique_words / 3, 10)
-    
-    # Average the scores
-    score = (base_score + vocabulary_score) / 2
-    score = min(max(score, 0), 10)  # Ensure score is between 0 and 10
-    
-    # Generate detailed feedback based on score
-    if score < 3:
-        grammar_msg = format_feedback_message(
-            ["Incomplete sentences", "Missing subject-verb agreement"],
-            ["Form complete sentences with subject and verb", "Make sure verbs agree with their subjects"],
-            "Remember to use complete sentences with proper structure: Subject + Verb + Object"
-        )
-        
-        fluency_msg = format_feedback_message(
-            ["Long pauses between words", "Hesitation sounds (um, uh)"],
-            ["Practice speaking in shorter phrases first", "Record yourself and identify pause patterns"]
-        )
-        
-        pronunciation_msg = format_pronunciation_feedback(
-            ["hello", "practice"],
-            ["heh-LOH", "PRAK-tis"]
-        )
-        
-        vocabulary_msg = format_vocabulary_feedback(
-            ["good", "nice"],
-            ["excellent", "wonderful"],
-            "Using more specific adjectives makes your speech more engaging and precise"
-        )
-        
-        overall_feedback = "Keep practicing! Focus on forming complete sentences and speaking more confidently."
-        suggestions = [
-            "Record yourself speaking and listen for pauses",
-            "Practice with simple, complete sentences first",
-            "Use a dictionary to check word pronunciation"
-        ]
-        
-    elif score < 7:
-        grammar_msg = format_feedback_message(
-            ["Occasional tense mixing", "Article usage"],
-            ["Maintain consistent tense throughout", "Pay attention to a/an/the usage"],
-            "Focus on maintaining consistent verb tenses in your speech"
-        )
-        
-        fluency_msg = format_feedback_message(
-            ["Some unnatural pauses", "Speed variations"],
-            ["Practice linking words together", "Maintain a steady speaking pace"]
-        )
-        
-        pronunciation_msg = format_pronunciation_feedback(
-            ["vocabulary", "improvement"],
-            ["voh-KAB-yuh-lair-ee", "im-PROOV-muhnt"]
-        )
-        
-        vocabulary_msg = format_vocabulary_feedback(
-            ["said", "big"],
-            ["expressed", "substantial"],
-            "Try incorporating more advanced vocabulary while maintaining natural speech"
-        )
-        
-        overall_feedback = "Good effort! Your speech is improving. Focus on smoother delivery and more varied vocabulary."
-        suggestions = [
-            "Practice speaking at a consistent pace",
-            "Try using synonyms for common words",
-            "Work on linking words together smoothly"
-        ]
-        
-    else:
-        grammar_msg = format_feedback_message(
-            ["Minor preposition usage", "Complex sentence structures"],
-            ["Review preposition rules", "Break down complex thoughts into clear statements"],
-            "Your grammar is strong - focus on fine-tuning complex expressions"
-        )
-        
-        fluency_msg = format_feedback_message(
-            ["Occasional rhythm breaks", "Natural flow"],
-            ["Practice with longer passages", "Incorporate more idiomatic expressions"]
-        )
-        
-        pronunciation_msg = format_pronunciation_feedback(
-            ["sophisticated", "particularly"],
-            ["suh-FIS-ti-kay-ted", "par-TIK-yuh-ler-lee"]
-        )
-        
-        vocabulary_msg = format_vocabulary_feedback(
-            ["interesting", "difficult"],
-            ["intriguing", "challenging"],
-            "Your vocabulary is good - try incorporating more idiomatic expressions"
+    return format_analysis(local_analyzer.analyze(transcript, prompt, language))
+
+def provisional_scores(transcript, prompt, language):
+    """Instant local scores to show while the model analysis is still running"""
+    feedback = local_analyze_speech(transcript, prompt, language)
+    provisional = {'score': feedback['score']}
+    for section in ('grammar', 'fluency', 'pronunciation', 'vocabulary'):
+        provisional[section] = feedback[section]['score']
+    return provisional
+
+def preload_data():
+    """
+    Load the prompt and vocabulary banks and the local analyzer's tables now
+    instead of on first use, then freeze them out of the garbage collector's
+    reach so workers forked afterwards keep sharing their pages copy-on-write
+    """
+    content_library.preload()
+    local_analyzer.preload(content_library.languages())
+    gc.freeze()
+
+def create_app(preload=None):
+    """
+    Build the Flask application.
+
+    With ``preload`` (defaults to the PRELOAD_DATA setting, on) static data is
+    loaded before the app is returned. A pre-forking server that loads the app
+    in its master process therefore loads it once for all of its workers.
+    """
+    app = Flask(__name__)
+    # Every worker and every restart must agree on the key, or sessions stop validating
+    app.secret_key = os.getenv("FLASK_SECRET_KEY") or load_secret_key(
+        os.getenv("SECRET_KEY_PATH", "speakeasy.secret")
+    )
+    if os.getenv("SESSION_BACKEND", "sqlite") == "sqlite":
+        # Sessions live in the shared database, so any worker can serve any request
+        app.session_interface = SQLiteSessionInterface(
+            os.getenv("SESSION_DATABASE_PATH", DATABASE_PATH),
+            lifetime=timedelta(days=int(os.getenv("SESSION_LIFETIME_DAYS", "30"))),
+            sweep_interval=int(os.getenv("SESSION_SWEEP_INTERVAL", "3600"))
         )
-        
-        overall_feedback = "Excellent work! Your speech is clear and well-structured. Focus on mastering more advanced expressions."
-        suggestions = [
-            "Practice with more complex topics",
-            "Work on incorporating idiomatic expressions",
-            "Try speaking at a faster pace while maintaining clarity"
-        ]
+    proxies = int(os.getenv("TRUSTED_PROXY_COUNT", "0"))
+    if proxies:
+        # Rate limits key on the client address, not the reverse proxy's
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+    for rule, view, options in ROUTES:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.after_request(add_limit_headers)
+    if metrics.directory:
+        app.after_request(share_metrics)
+    app.cli.add_command(backfill_achievements)
+    app.cli.add_command(grade_batch)
+    app.cli.add_command(snapshot_cli)
+    if STORAGE_BACKEND == 'memory' and SNAPSHOT_DIR:
+        restore_memory_store()
     
-    return {
-        'score': round(score, 1),
-        'message': overall_feedback,
-        'grammar': {
-            'score': round(min(score + random.uniform(-1, 1), 10), 1),
-            'feedback': grammar_msg
-        },
-        'fluency': {
-            'score': round(min(score + random.uniform(-1, 1), 10), 1),
-            'feedback': fluency_msg
-        },
-        'pronunciation': {
-            'score': round(min(score + random.uniform(-1, 1), 10), 1),
-            'feedback': pronunciation_msg
-        },
-        'vocabulary': {
-            'score': round(min(score + random.uniform(-1, 1), 10), 1),
-            'feedback': vocabulary_msg
-        },
-        'suggestions': suggestions
-    }
+    # After any restore, so the boards include restored users
+    leaderboards.rebuild()
+    if preload is None:
+        preload = os.getenv("PRELOAD_DATA", "true").lower() in ("1", "true", "yes")
+    if preload:
+        preload_data()
+    if OFFLINE_MODE:
+        logger.info("Offline mode: feedback comes from the local analysis only")
+    return app
+
+def restore_memory_store():
+    """
+    Warm restart for the memory store: load the last snapshot chain, and
+    snapshot again on exit so the next start picks up where this one stopped
+    """
+    started = time.perf_counter()
+    restored = snapshots.restore(user_store)
+    if restored:
+        logger.info(f"Restored {restored} users from {SNAPSHOT_DIR} in {time.perf_counter() - started:.2f}s")
+    atexit.register(save_memory_store)
+
+def save_memory_store():
+    try:
+        snapshots.export(user_store)
+    except Exception as e:
+        logger.error(f"Snapshot on exit failed: {str(e)}")
+
+def drain_feedback(timeout):
+    """
+    Stop taking feedback work and let what is in flight finish, for a graceful
+    shutdown; returns how many analyses were still running at ``timeout``
+    """
+    unfinished = feedback_dispatcher.drain(timeout)
+    if unfinished:
+        logger.warning(f"Shutting down with {unfinished} feedback analyses unfinished")
+    else:
+        logger.info("Drained in-flight feedback")
+    return unfinished
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
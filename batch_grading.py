@@ -0,0 +1,193 @@
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from feedback_cache import make_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+class BatchStats:
+    """Counts for one batch run; ``to_dict`` adds elapsed time and throughput"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.finished = None
+        self.records = 0
+        self.graded = 0
+        self.cached = 0
+        self.local = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.errors = 0
+
+    def to_dict(self):
+        elapsed = (self.finished or time.monotonic()) - self.started
+        done = self.graded + self.cached + self.local + self.duplicates + self.errors
+        return {
+            'records': self.records,
+            'graded': self.graded,
+            'cached': self.cached,
+            'local': self.local,
+            'duplicates': self.duplicates,
+            'skipped': self.skipped,
+            'invalid': self.invalid,
+            'errors': self.errors,
+            'elapsed_s': round(elapsed, 2),
+            'per_second': round(done / elapsed, 2) if elapsed > 0 else 0.0
+        }
+
+
+def parse_record(line, number, languages=None):
+    """
+    (id, transcript, language, prompt) from one JSONL line; raises ValueError when
+    unusable, including when the id is not a string or an integer or when
+    ``languages`` is given and does not hold its language
+    """
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Line {number} is not valid JSON: {e.msg}")
+    if not isinstance(record, dict):
+        raise ValueError(f"Line {number} is not a JSON object")
+    transcript = record.get('transcript')
+    if not isinstance(transcript, str) or not transcript.strip():
+        raise ValueError(f"Line {number} has no transcript")
+    language = record.get('language', 'english')
+    if languages is not None and (not isinstance(language, str) or language not in languages):
+        raise ValueError(f"Line {number} has an unsupported language")
+    record_id = record.get('id', number)
+    if not valid_id(record_id):
+        raise ValueError(f"Line {number} has an id that is not a string or an integer")
+    return record_id, transcript, language, record.get('prompt', '')
+
+
+def valid_id(record_id):
+    """Record ids are strings or integers, so they can be matched against earlier output"""
+    return isinstance(record_id, str) or (isinstance(record_id, int) and not isinstance(record_id, bool))
+
+
+def completed_ids(lines):
+    """Ids of successfully graded records in earlier output, so a resumed run skips them"""
+    done = set()
+    for line in lines:
+        try:
+            result = json.loads(line)
+        except json.JSONDecodeError:
+            # A line cut off when the earlier run was interrupted
+            continue
+        if isinstance(result, dict) and valid_id(result.get('id')) and 'error' not in result:
+            done.add(result['id'])
+    return done
+
+
+class BatchGrader:
+    """
+    Grades JSONL transcript records on a bounded worker pool.
+
+    Results come back in input order. At most ``window`` records are in
+    flight, so memory stays bounded however long the input is. Records whose
+    normalized (language, prompt, transcript) matches one of the last
+    ``dedupe_size`` records reuse that analysis instead of being graded again.
+
+    ``grade(transcript, prompt, language)`` returns (feedback, source) and
+    raises when no model analysis is available. In that case the result
+    carries the error and, if ``fallback`` is given, its feedback, so a resumed
+    run grades that record again. With ``languages`` set, records in any other
+    language are reported as invalid.
+    """
+
+    def __init__(self, grade, fallback=None, workers=4, window=None, dedupe_size=10000, languages=None):
+        self.grade = grade
+        self.fallback = fallback
+        self.languages = languages
+        self.workers = workers
+        self.window = window or workers * 4
+        self.dedupe_size = dedupe_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-grading')
+
+    def _run(self, transcript, prompt, language):
+        try:
+            feedback, source = self.grade(transcript, prompt, language)
+            return {'feedback': feedback, 'source': source}
+        except Exception as e:
+            logger.error(f"Batch grading failed: {str(e)}")
+            result = {'error': str(e) or type(e).__name__}
+            if self.fallback is not None:
+                result['feedback'] = self.fallback(transcript, prompt, language)
+                result['source'] = 'local'
+            return result
+
+    def run(self, lines, skip=(), stats=None):
+        """
+        Yield one result dict per record of ``lines`` (JSONL text lines), in order.
+        Records whose id is in ``skip`` are left out. ``stats`` (a BatchStats)
+        is updated as results are produced.
+        """
+        stats = stats if stats is not None else BatchStats()
+        pending = deque()
+        recent = OrderedDict()
+
+        for number, line in enumerate(lines, 1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            stats.records += 1
+            try:
+                record_id, transcript, language, prompt = parse_record(line, number, self.languages)
+            except ValueError as e:
+                stats.invalid += 1
+                pending.append((number, None, None, {'error': str(e)}))
+            else:
+                if record_id in skip:
+                    stats.skipped += 1
+                    continue
+                key = make_cache_key(language, prompt, transcript)
+                future = recent.get(key)
+                duplicate = future is not None
+                if duplicate:
+                    recent.move_to_end(key)
+                else:
+                    future = self._executor.submit(self._run, transcript, prompt, language)
+                    recent[key] = future
+                    if len(recent) > self.dedupe_size:
+                        recent.popitem(last=False)
+                pending.append((record_id, language, duplicate, future))
+
+            while pending and (len(pending) >= self.window or self._ready(pending[0])):
+                yield self._result(pending.popleft(), stats)
+
+        while pending:
+            yield self._result(pending.popleft(), stats)
+        stats.finished = time.monotonic()
+
+    @staticmethod
+    def _ready(entry):
+        outcome = entry[3]
+        return isinstance(outcome, dict) or outcome.done()
+
+    def _result(self, entry, stats):
+        record_id, language, duplicate, outcome = entry
+        if isinstance(outcome, dict):
+            return dict(outcome, id=record_id)
+        result = {'id': record_id, 'language': language}
+        result.update(outcome.result())
+        if 'error' in result:
+            stats.errors += 1
+        elif duplicate:
+            stats.duplicates += 1
+            result['source'] = 'duplicate'
+        elif result['source'] == 'cache':
+            stats.cached += 1
+        elif result['source'] == 'local':
+            stats.local += 1
+        else:
+            stats.graded += 1
+        return result
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,99 @@
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# A ``run_batch`` entry meaning the batch had no result for that item, so the
+# caller that submitted it evaluates it on its own with ``run_one``
+RETRY = object()
+
+
+class _Batch:
+    __slots__ = ('items', 'futures', 'full')
+
+    def __init__(self):
+        self.items = []
+        self.futures = []
+        self.full = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Collects requests that share a key for up to ``max_wait`` seconds (or until
+    ``max_batch`` arrive) and evaluates them with one ``run_batch(key, items)`` call.
+
+    The first caller for a key leads the batch: it waits for the window to close,
+    runs the batch and hands each follower its result. ``run_batch`` must return
+    one entry per item, either a result, an exception to raise for that item or
+    RETRY. Each caller handed RETRY calls ``run_one(key, item)`` itself, so the
+    retries of a failed batch run side by side rather than one after another.
+    """
+
+    def __init__(self, run_batch, run_one=None, max_wait=0.02, max_batch=8):
+        self.run_batch = run_batch
+        self.run_one = run_one
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.retries = 0
+
+    def submit(self, key, item):
+        """Queue ``item`` under ``key`` and block until its result is ready"""
+        future = Future()
+        with self._lock:
+            batch = self._pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._pending[key] = batch
+            batch.items.append(item)
+            batch.futures.append(future)
+            if len(batch.items) >= self.max_batch:
+                del self._pending[key]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.max_wait)
+            with self._lock:
+                if self._pending.get(key) is batch:
+                    del self._pending[key]
+            self._run(key, batch)
+        result = future.result()
+        if result is RETRY:
+            if self.run_one is None:
+                raise ValueError("Batch returned no result for an item")
+            with self._stats_lock:
+                self.retries += 1
+            return self.run_one(key, item)
+        return result
+
+    def _run(self, key, batch):
+        with self._stats_lock:
+            self.batches += 1
+            self.items += len(batch.items)
+        try:
+            results = self.run_batch(key, list(batch.items))
+            if len(results) != len(batch.items):
+                raise ValueError(f"Batch returned {len(results)} results for {len(batch.items)} items")
+        except Exception as e:
+            logger.error(f"Batch evaluation failed: {str(e)}")
+            results = [e] * len(batch.items)
+        for future, result in zip(batch.futures, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'retries': self.retries,
+                'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0
+            }
@@ -0,0 +1,40 @@
+"""
+Latency of the local scoring engine for single transcripts and batches.
+
+Run from the repository root: python benchmarks/bench_local_analysis.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_analysis import LocalAnalyzer  # noqa: E402
+
+SAMPLES = [
+    ("Um I like football because it is fun. He don't like it but I didn't went to the match.", 'english'),
+    (" ".join(["I really enjoy travelling to different countries because I can learn about new "
+               "cultures and taste delicious food."] * 10), 'english'),
+    ("Yo es estudiante. La problema es que me gusta mucho el fútbol y voy a el parque.", 'spanish'),
+    ("Je ai un ami. Le week-end nous allons au parc et nous jouons au football.", 'french'),
+    ("Ich bist müde. Am Wochenende habe ich mit meinen Freunden Fußball gespielt.", 'german'),
+]
+
+
+def main():
+    analyzer = LocalAnalyzer()
+    # Load every language's tables before timing
+    analyzer.analyze_batch([(text, '', language) for text, language in SAMPLES])
+
+    number = 500
+    for text, language in SAMPLES:
+        seconds = timeit.timeit(lambda: analyzer.analyze(text, '', language), number=number)
+        print(f"{language:8} {len(text.split()):4} words {seconds / number * 1000:7.3f} ms/analysis")
+
+    batch = [(text, '', language) for text, language in SAMPLES] * 40
+    seconds = timeit.timeit(lambda: analyzer.analyze_batch(batch), number=10) / 10
+    print(f"batch of {len(batch)}: {seconds * 1000:.1f} ms ({seconds / len(batch) * 1000:.3f} ms/analysis)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Times response_parser on well-formed, repaired and truncated model responses.
+The corpus of messy responses and their expected outcomes is checked by
+tests/test_response_parser.py.
+
+Run from the repository root: python benchmarks/bench_parser.py
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_parser import parse_analysis  # noqa: E402
+
+ANALYSIS = {
+    "grammar_score": 8, "fluency_score": 7, "pronunciation_score": 9, "vocabulary_score": 6,
+    "overall_score": 7.5,
+    "grammar_feedback": {"issues": ["Verb tense"], "corrections": ["I went"], "explanation": "Past tense"},
+    "fluency_feedback": {"issues": ["Pauses"], "improvements": ["Link ideas"]},
+    "pronunciation_feedback": {"difficult_words": ["through"], "correct_pronunciation": ["/θruː/"]},
+    "vocabulary_feedback": {"basic_words_used": ["good"], "suggested_alternatives": ["excellent"],
+                            "context": "Formal"},
+    "overall_feedback": "Clear and well organised.",
+    "suggestions": ["Read aloud", "Record yourself", "Shadow a native speaker"]
+}
+CLEAN = json.dumps(ANALYSIS, indent=2)
+
+# A response that needs its unescaped quotes repaired, and one cut off mid-value
+QUOTED = CLEAN.replace('Clear and well organised.', 'You said "hello" clearly.')
+TRUNCATED = CLEAN[:CLEAN.index('"suggestions"') + 30]
+
+
+def bench():
+    number = 2000
+    for name, text in (('fast path', "```json\n" + CLEAN + "\n```"), ('repair path', QUOTED),
+                       ('truncated', TRUNCATED)):
+        seconds = timeit.timeit(lambda: parse_analysis(text), number=number)
+        print(f"{name:12} {seconds / number * 1e6:8.1f} us/parse")
+
+
+if __name__ == '__main__':
+    bench()
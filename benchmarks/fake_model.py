@@ -0,0 +1,141 @@
+"""
+In-process stand-in for the Gemini model, for benchmarks and load tests.
+
+FakeModelConfig describes how the stand-in behaves: response latency drawn
+from a log-normal distribution, a share of requests failing with a transient
+server error, and a share of responses that are malformed (truncated JSON or
+prose). install() swaps it in for google.generativeai.GenerativeModel, so
+the app under test runs its real retry, parsing and fallback code without
+calling the API.
+"""
+import json
+import math
+import random
+import threading
+import time
+
+# Only the fields the prompt asks for; pronunciation and vocabulary are filled in locally
+ANALYSIS = {
+    "grammar_score": 7.5,
+    "fluency_score": 7,
+    "grammar_feedback": {
+        "issues": ["I goes to school"],
+        "corrections": ["I go to school"],
+        "explanation": "Use the base form of the verb after 'I'."
+    },
+    "fluency_feedback": {
+        "issues": ["Several long pauses"],
+        "improvements": ["Link ideas with connectors such as 'because' and 'so'"]
+    },
+    "overall_feedback": "A clear answer with a few grammar slips. Work on linking your ideas.",
+    "suggestions": ["Practice verb agreement", "Use connectors", "Learn two new adjectives a day"]
+}
+
+
+class FakeUpstreamError(Exception):
+    """A transient server-side failure, retryable like a real 503"""
+
+    code = 503
+
+
+class FakeModelConfig:
+    def __init__(self, median_latency=0.8, latency_sigma=0.5, error_rate=0.0, malformed_rate=0.0,
+                 stream_chunks=6, seed=None):
+        self.median_latency = median_latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.stream_chunks = stream_chunks
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.malformed = 0
+
+    def draw(self):
+        """Latency and outcome ('ok', 'error', 'truncated' or 'prose') of one request"""
+        with self._lock:
+            self.calls += 1
+            latency = self.median_latency * math.exp(self._random.gauss(0, self.latency_sigma))
+            roll = self._random.random()
+            if roll < self.error_rate:
+                self.errors += 1
+                return latency, 'error'
+            if roll < self.error_rate + self.malformed_rate:
+                self.malformed += 1
+                # Half cut off mid-value, half no JSON at all
+                return latency, 'truncated' if self._random.random() < 0.5 else 'prose'
+            return latency, 'ok'
+
+
+def _batch_size(prompt):
+    marker = "Students' Responses ("
+    start = prompt.find(marker)
+    if start < 0:
+        return None
+    start += len(marker)
+    end = start
+    while end < len(prompt) and prompt[end].isdigit():
+        end += 1
+    return int(prompt[start:end]) if end > start else None
+
+
+def response_text(prompt, outcome):
+    count = _batch_size(prompt)
+    if count is None:
+        text = json.dumps(ANALYSIS)
+    else:
+        text = json.dumps([dict(ANALYSIS, index=index) for index in range(count)])
+    if outcome == 'truncated':
+        return text[:len(text) // 3]
+    if outcome == 'prose':
+        return "I'm sorry, I can't analyze this response."
+    return f"```json\n{text}\n```"
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class _StreamedResponse:
+    def __init__(self, chunks, delay):
+        self._chunks = chunks
+        self._delay = delay
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            time.sleep(self._delay)
+            yield _Response(chunk)
+
+
+def model_class(config):
+    """A GenerativeModel replacement bound to ``config``"""
+
+    class FakeGenerativeModel:
+        def __init__(self, model_name='gemini-pro', generation_config=None, safety_settings=None, **kwargs):
+            self.model_name = model_name
+
+        def generate_content(self, prompt, stream=False, **kwargs):
+            latency, outcome = config.draw()
+            if not stream:
+                time.sleep(latency)
+                if outcome == 'error':
+                    raise FakeUpstreamError("Fake model unavailable")
+                return _Response(response_text(prompt, outcome))
+            if outcome == 'error':
+                time.sleep(latency / config.stream_chunks)
+                raise FakeUpstreamError("Fake model unavailable")
+            text = response_text(prompt, outcome)
+            size = max(1, math.ceil(len(text) / config.stream_chunks))
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            return _StreamedResponse(chunks, latency / len(chunks))
+
+    return FakeGenerativeModel
+
+
+def install(config):
+    """Replace the SDK's GenerativeModel with the stand-in; call before the app builds any model"""
+    import google.generativeai as genai
+
+    genai.GenerativeModel = model_class(config)
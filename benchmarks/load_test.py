@@ -0,0 +1,462 @@
+"""
+Load test of the app over HTTP, with the fake model standing in for Gemini.
+
+Scenarios:
+  classroom  a class answers the same prompt, everyone submitting at once
+  steady     open-loop mixed traffic at a fixed request rate
+  history    users with long practice histories browsing their progress
+
+Each scenario reports p50/p95/p99 latency per endpoint, throughput, error and
+rejection (429) counts, model calls, fallbacks and memory. The server runs in
+this process on a real socket, so client and server share the interpreter.
+Treat the numbers as relative, for comparing revisions on one machine.
+
+Run from the repository root:
+  python benchmarks/load_test.py                         # all scenarios
+  python benchmarks/load_test.py classroom --students 60 --model-latency-ms 1500
+  python benchmarks/load_test.py --save-baseline benchmarks/load_baseline.json
+  python benchmarks/load_test.py --baseline benchmarks/load_baseline.json   # exit 1 on regression
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from flask import request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_model  # noqa: E402
+
+WORDS = (
+    "i you we they like love enjoy play study visit travel eat cook read watch go went have had "
+    "football music books films friends family school work park city beach weekend summer morning "
+    "because and but so then very really quite always sometimes usually often with to at in on "
+    "big small beautiful interesting difficult easy good nice fun happy tired busy new old"
+).split()
+
+LEARNED_WORDS = ("serendipity", "ephemeral", "ubiquitous", "eloquent", "resilient", "meticulous",
+                 "pragmatic", "ambiguous", "candid", "diligent", "tenacious", "vivid")
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux), falling back to the peak"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, seconds, status):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((seconds, status))
+
+    def report(self, elapsed):
+        endpoints = {}
+        everything = []
+        for endpoint, samples in sorted(self.samples.items()):
+            endpoints[endpoint] = self._summary(samples, elapsed)
+            everything.extend(samples)
+        return {'overall': self._summary(everything, elapsed), 'endpoints': endpoints}
+
+    @staticmethod
+    def _summary(samples, elapsed):
+        latencies = sorted(seconds for seconds, status in samples if status and status < 500 and status != 429)
+        errors = sum(1 for _, status in samples if not status or status >= 500)
+        rejected = sum(1 for _, status in samples if status == 429)
+        summary = {
+            'requests': len(samples),
+            'errors': errors,
+            'rejected': rejected,
+            'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+            'throughput': round(len(latencies) / elapsed, 2) if elapsed else 0.0
+        }
+        for p in (50, 95, 99):
+            value = percentile(latencies, p)
+            summary[f'p{p}_ms'] = round(value * 1000, 2) if value is not None else None
+        return summary
+
+
+class Client:
+    """Keep-alive HTTP connection per thread to the server under test"""
+
+    def __init__(self, port, recorder):
+        self.port = port
+        self.recorder = recorder
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+        return connection
+
+    def request(self, endpoint, method, path, cookie, body=None):
+        headers = {'Cookie': cookie}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        started = time.perf_counter()
+        status = None
+        data = b''
+        try:
+            connection = self._connection()
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self._local.connection = None
+        self.recorder.add(endpoint, time.perf_counter() - started, status)
+        return status, data
+
+
+class Harness:
+    def __init__(self, app_module, flask_app, client, rng):
+        self.app_module = app_module
+        self.flask_app = flask_app
+        self.client = client
+        self.rng = rng
+
+    def create_user(self):
+        """Create a user and a session cookie for it through the app's session interface"""
+        user_id = str(uuid.uuid4())
+        self.app_module.user_store.create_user(user_id)
+        interface = self.flask_app.session_interface
+        with self.flask_app.test_request_context():
+            session = interface.open_session(self.flask_app, request)
+            session['user_id'] = user_id
+            response = self.flask_app.response_class()
+            interface.save_session(self.flask_app, session, response)
+        return user_id, response.headers['Set-Cookie'].split(';', 1)[0]
+
+    def transcript(self, rng=None):
+        rng = rng or self.rng
+        sentences = []
+        for _ in range(rng.randint(2, 6)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(6, 14))]
+            sentences.append(' '.join(words).capitalize() + '.')
+        return ' '.join(sentences)
+
+    # One call per endpoint, so every scenario names them the same way
+
+    def prompt(self, cookie):
+        status, data = self.client.request('/api/prompt', 'GET', '/api/prompt?language=english', cookie)
+        if status == 200:
+            return json.loads(data)['prompt']
+        return 'Tell me about your weekend.'
+
+    def feedback(self, cookie, prompt, transcript):
+        return self.client.request('/api/feedback', 'POST', '/api/feedback', cookie, {
+            'transcript': transcript, 'language': 'english', 'prompt': prompt
+        })
+
+    def learn_word(self, cookie, word):
+        return self.client.request('/api/learn-word', 'POST', '/api/learn-word', cookie, {'word': word})
+
+    def progress(self, cookie):
+        return self.client.request('/progress', 'GET', '/progress', cookie)
+
+    def history(self, cookie, pages=3):
+        cursor = None
+        for _ in range(pages):
+            path = '/api/progress/history?limit=50' + (f'&cursor={cursor}' if cursor is not None else '')
+            status, data = self.client.request('/api/progress/history', 'GET', path, cookie)
+            if status != 200:
+                return
+            cursor = json.loads(data).get('next_cursor')
+            if cursor is None:
+                return
+
+    def stats(self, cookie):
+        return self.client.request('/api/progress/stats', 'GET', '/api/progress/stats', cookie)
+
+
+def classroom(harness, args):
+    """Every student fetches a prompt, then all submit answers at the same moment"""
+    students = [harness.create_user() for _ in range(args.students)]
+    transcripts = [[harness.transcript() for _ in students] for _ in range(args.rounds)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.students) as pool:
+        for round_transcripts in transcripts:
+            prompts = list(pool.map(lambda student: harness.prompt(student[1]), students))
+            start = threading.Barrier(args.students)
+
+            def answer(index):
+                cookie = students[index][1]
+                start.wait()
+                harness.feedback(cookie, prompts[0], round_transcripts[index])
+                harness.learn_word(cookie, LEARNED_WORDS[index % len(LEARNED_WORDS)])
+
+            list(pool.map(answer, range(args.students)))
+        list(pool.map(lambda student: harness.progress(student[1]), students))
+    return time.perf_counter() - started
+
+
+def steady(harness, args):
+    """Poisson arrivals at --rate requests/second over --duration seconds"""
+    users = [harness.create_user() for _ in range(args.users)]
+    mix = (('prompt', 0.35), ('feedback', 0.25), ('learn_word', 0.25), ('progress', 0.15))
+    rng = random.Random(args.seed)
+
+    def one(kind, cookie, transcript, word):
+        if kind == 'prompt':
+            harness.prompt(cookie)
+        elif kind == 'feedback':
+            harness.feedback(cookie, 'Tell me about your weekend.', transcript)
+        elif kind == 'learn_word':
+            harness.learn_word(cookie, word)
+        else:
+            harness.progress(cookie)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        next_at = 0.0
+        while next_at < args.duration:
+            delay = started + next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            roll = rng.random()
+            for kind, share in mix:
+                roll -= share
+                if roll < 0:
+                    break
+            _, cookie = rng.choice(users)
+            pool.submit(one, kind, cookie, harness.transcript(rng), rng.choice(LEARNED_WORDS))
+            next_at += rng.expovariate(args.rate)
+    return time.perf_counter() - started
+
+
+def history(harness, args):
+    """Users with --sessions stored practices page through history, check stats and practice again"""
+    store = harness.app_module.user_store
+    today = date.today()
+    users = []
+    for _ in range(args.history_users):
+        user_id, cookie = harness.create_user()
+        for index in range(args.sessions):
+            store.record_practice(user_id, {
+                'language': 'english',
+                'prompt': 'Tell me about your weekend.',
+                'transcript': harness.transcript(),
+                'score': round(harness.rng.uniform(4, 10), 1),
+                'feedback': 'Good effort.'
+            }, today=today - timedelta(days=(args.sessions - index) // 3))
+        users.append(cookie)
+
+    def browse(cookie):
+        rng = random.Random(cookie)
+        for _ in range(args.rounds):
+            harness.progress(cookie)
+            harness.history(cookie)
+            harness.stats(cookie)
+            harness.feedback(cookie, 'Tell me about your weekend.', harness.transcript(rng))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(users)) as pool:
+        list(pool.map(browse, users))
+    return time.perf_counter() - started
+
+
+# Each scenario sets up its users, then runs and returns the measured seconds
+SCENARIOS = {'classroom': classroom, 'steady': steady, 'history': history}
+
+
+def fallback_count(app_module):
+    return sum(value for _, _, value in app_module.LOCAL_FALLBACKS.samples())
+
+
+def run_scenario(name, harness, model, args):
+    harness.client.recorder.samples.clear()
+    calls, errors, malformed = model.calls, model.errors, model.malformed
+    fallbacks = fallback_count(harness.app_module)
+    rss_before = rss_mb()
+    elapsed = SCENARIOS[name](harness, args)
+    report = harness.client.recorder.report(elapsed)
+    report['elapsed_s'] = round(elapsed, 2)
+    report['model'] = {
+        'calls': model.calls - calls,
+        'errors': model.errors - errors,
+        'malformed': model.malformed - malformed,
+        'local_fallbacks': fallback_count(harness.app_module) - fallbacks
+    }
+    report['memory'] = {
+        'rss_mb': round(rss_mb(), 1),
+        'rss_growth_mb': round(rss_mb() - rss_before, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+    return report
+
+
+def print_report(name, report):
+    overall = report['overall']
+    model = report['model']
+    memory = report['memory']
+    print(f"\n== {name}: {overall['requests']} requests in {report['elapsed_s']}s, "
+          f"{overall['throughput']} req/s, {overall['errors']} errors, {overall['rejected']} rejected")
+    print(f"   model calls {model['calls']} ({model['errors']} failed, {model['malformed']} malformed), "
+          f"local fallbacks {model['local_fallbacks']}")
+    print(f"   memory {memory['rss_mb']} MB (+{memory['rss_growth_mb']}), peak {memory['peak_rss_mb']} MB")
+    print(f"   {'endpoint':24} {'requests':>8} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, summary in list(report['endpoints'].items()) + [('(all)', overall)]:
+        print(f"   {endpoint:24} {summary['requests']:8} {summary['errors'] + summary['rejected']:6} "
+              f"{summary['p50_ms'] or 0:9.1f} {summary['p95_ms'] or 0:9.1f} {summary['p99_ms'] or 0:9.1f}")
+
+
+def compare(results, baseline, tolerance, slack_ms):
+    """
+    Regressions of ``results`` against ``baseline``: p95/p99 slower by more than
+    ``tolerance`` and ``slack_ms``, lower throughput or more errors
+    """
+    regressions = []
+    for name, report in results.items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        pairs = [('(all)', report['overall'], previous['overall'])]
+        pairs += [
+            (endpoint, summary, previous['endpoints'][endpoint])
+            for endpoint, summary in report['endpoints'].items()
+            if endpoint in previous['endpoints']
+        ]
+        for endpoint, now, before in pairs:
+            for key in ('p95_ms', 'p99_ms'):
+                if now[key] is not None and before[key] and now[key] > max(
+                    before[key] * (1 + tolerance), before[key] + slack_ms
+                ):
+                    regressions.append(f"{name} {endpoint} {key}: {before[key]} -> {now[key]}")
+            if now['error_rate'] > before['error_rate'] + 0.01:
+                regressions.append(f"{name} {endpoint} error rate: {before['error_rate']} -> {now['error_rate']}")
+        if report['overall']['throughput'] < previous['overall']['throughput'] * (1 - tolerance):
+            regressions.append(
+                f"{name} throughput: {previous['overall']['throughput']} -> {report['overall']['throughput']}"
+            )
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--model-latency-ms', type=float, default=800, help='median fake model latency')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='log-normal spread of the latency')
+    parser.add_argument('--error-rate', type=float, default=0.02, help='share of model calls failing with a 503')
+    parser.add_argument('--malformed-rate', type=float, default=0.05, help='share of unparseable model responses')
+    parser.add_argument('--storage', choices=('sqlite', 'memory'), default='sqlite')
+    parser.add_argument('--students', type=int, default=30)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=20, help='steady scenario requests per second')
+    parser.add_argument('--duration', type=float, default=20, help='steady scenario seconds')
+    parser.add_argument('--concurrency', type=int, default=64, help='steady scenario client threads')
+    parser.add_argument('--history-users', type=int, default=10)
+    parser.add_argument('--sessions', type=int, default=500, help='stored practices per history user')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare against this baseline and exit 1 on a regression')
+    parser.add_argument('--save-baseline', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown')
+    parser.add_argument('--slack-ms', type=float, default=10, help='slowdowns smaller than this are noise')
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario {unknown[0]!r}")
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    return args
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='speakeasy-load-')
+    os.environ['STORAGE_BACKEND'] = args.storage
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'speakeasy.sqlite3')
+    os.environ['FEEDBACK_CACHE_BACKEND'] = 'memory'
+    os.environ['SECRET_KEY_PATH'] = os.path.join(workdir, 'speakeasy.secret')
+    os.environ.setdefault('GEMINI_API_KEY', 'load-test')
+    # Every simulated user shares one address; measure the app, not the limiter
+    os.environ.setdefault('RATE_LIMITING', 'false')
+
+    model = fake_model.FakeModelConfig(
+        median_latency=args.model_latency_ms / 1000,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed
+    )
+    fake_model.install(model)
+
+    import app as app_module
+    from werkzeug.serving import make_server
+
+    logging.getLogger().setLevel(logging.WARNING)
+    for name in ('app', 'werkzeug', 'model_clients', 'prompts', 'resilience', 'storage', 'leaderboards', 'content'):
+        logging.getLogger(name).setLevel(logging.CRITICAL)
+
+    flask_app = app_module.create_app()
+    server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    harness = Harness(app_module, flask_app, Client(server.server_port, Recorder()), random.Random(args.seed))
+
+    config = {
+        key: value for key, value in vars(args).items()
+        if key not in ('json', 'baseline', 'save_baseline', 'tolerance', 'slack_ms')
+    }
+    results = {}
+    for name in args.scenarios:
+        results[name] = run_scenario(name, harness, model, args)
+        print_report(name, results[name])
+    server.shutdown()
+
+    output = {'config': config, 'scenarios': results}
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(output, f, indent=2)
+            print(f"\nWrote {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            print("\nWarning: baseline was recorded with different settings")
+        regressions = compare(results, baseline, args.tolerance, args.slack_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import random
+import threading
+from array import array
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+CONTENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'content')
+
+PROMPT_BANK = 'prompts'
+VOCABULARY_BANK = 'vocabulary'
+
+
+class SeenBitmap:
+    """One bit per bank entry, set once a user has been shown that entry"""
+
+    def __init__(self, data=b''):
+        self.bits = bytearray(data)
+
+    def __contains__(self, index):
+        byte = index >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (index & 7)))
+
+    def add(self, index):
+        byte = index >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        self.bits[byte] |= 1 << (index & 7)
+
+    def count(self):
+        return int.from_bytes(self.bits, 'little').bit_count()
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+
+class ContentBank:
+    """
+    Entries of one JSON Lines file, memory-mapped and decoded on demand.
+
+    Loading scans the file once to record each entry's offset and to index
+    entries by difficulty, by topic and by both, so filtered lookups are a
+    single dict access however large the bank is. An entry's index is its
+    position in the file, so banks must only ever be appended to.
+    """
+
+    def __init__(self, path, cache_size=1024):
+        self.path = path
+        self._offsets = array('Q')
+        self._index = {}
+        self._data = b''
+        if os.path.getsize(path):
+            with open(path, 'rb') as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._scan()
+        self.get = lru_cache(maxsize=cache_size)(self._decode)
+
+    def _scan(self):
+        data = self._data
+        position = 0
+        size = len(data)
+        while position < size:
+            end = data.find(b'\n', position)
+            if end < 0:
+                end = size
+            line = data[position:end].strip()
+            if line and not line.startswith(b'#'):
+                entry = json.loads(line)
+                index = len(self._offsets)
+                self._offsets.append(position)
+                for key in self._keys(entry.get('difficulty'), entry.get('topic')):
+                    self._index.setdefault(key, array('I')).append(index)
+            position = end + 1
+
+    @staticmethod
+    def _keys(difficulty, topic):
+        """
+        Index keys of an entry; an entry without a difficulty or topic is only
+        indexed under the filter it has, and the unfiltered list needs no key
+        """
+        keys = {(difficulty, topic), (difficulty, None), (None, topic)}
+        keys.discard((None, None))
+        return keys
+
+    def _decode(self, index):
+        start = self._offsets[index]
+        end = self._data.find(b'\n', start)
+        return json.loads(self._data[start:end if end >= 0 else len(self._data)])
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def candidates(self, difficulty=None, topic=None):
+        """Indexes of the entries matching the filters, in file order"""
+        if difficulty is None and topic is None:
+            return range(len(self._offsets))
+        return self._index.get((difficulty, topic), ())
+
+    def difficulties(self):
+        return sorted(key[0] for key in self._index if key[1] is None and key[0] is not None)
+
+    def topics(self):
+        return sorted(key[1] for key in self._index if key[0] is None and key[1] is not None)
+
+
+def _seed(*parts):
+    return int.from_bytes(hashlib.sha256(':'.join(parts).encode('utf-8')).digest()[:8], 'big')
+
+
+def _shuffled_position(position, size, seed):
+    """
+    Where the ``position``-th step of a walk lands in a list of ``size`` items. Each
+    pass over the list is a different affine permutation, so a walk visits every
+    item once per pass in an order that looks random, with nothing stored.
+    """
+    rounds, step = divmod(position, size)
+    mix = _seed(str(seed), str(rounds))
+    stride = mix % size or 1
+    while math.gcd(stride, size) != 1:
+        stride += 1
+    return (stride * step + (mix >> 32)) % size
+
+
+class ContentLibrary:
+    """Prompt and vocabulary banks per language, loaded lazily from ``content_dir``"""
+
+    def __init__(self, content_dir=CONTENT_DIR):
+        self.content_dir = content_dir
+        # Bank files present at startup; only these names are ever joined into a path
+        self._available = {kind: frozenset(self.languages(kind)) for kind in (PROMPT_BANK, VOCABULARY_BANK)}
+        self._banks = {}
+        self._lock = threading.Lock()
+
+    def languages(self, kind=PROMPT_BANK):
+        directory = os.path.join(self.content_dir, kind)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len('.jsonl')] for name in os.listdir(directory) if name.endswith('.jsonl'))
+
+    def bank(self, kind, language):
+        """
+        Return the bank for ``kind`` and ``language``, or None if there is no such
+        file. The name comes from the client, so anything that is not a bundled
+        language is refused before it reaches a file path or the cache.
+        """
+        if language not in self._available.get(kind, ()):
+            return None
+        key = (kind, language)
+        bank = self._banks.get(key)
+        if bank is None:
+            with self._lock:
+                bank = self._banks.get(key)
+                if bank is None:
+                    bank = ContentBank(os.path.join(self.content_dir, kind, f'{language}.jsonl'))
+                    self._banks[key] = bank
+                    logger.info(f"Loaded {len(bank)} {kind} for {language}")
+        return bank
+
+    def preload(self):
+        """Load every bank now, e.g. before a pre-forking server starts its workers"""
+        for kind in (PROMPT_BANK, VOCABULARY_BANK):
+            for language in self.languages(kind):
+                self.bank(kind, language)
+
+    def daily(self, kind, language, day, count=5):
+        """The same ``count`` entries for everyone on ``day``, changing from one day to the next"""
+        bank = self.bank(kind, language)
+        if not bank:
+            return []
+        rng = random.Random(_seed(kind, language, day.isoformat()))
+        return [dict(bank.get(index)) for index in rng.sample(range(len(bank)), min(count, len(bank)))]
+
+    def pick(self, kind, language, seen, seed, difficulty=None, topic=None, cursor=0):
+        """
+        Choose an entry matching the filters that is not in ``seen`` (a SeenBitmap).
+
+        Picks walk the matching entries in a shuffled order fixed by ``seed``;
+        ``cursor`` is how far the caller's walk has got. The walk passes each
+        entry once per round, so only entries already shown through other
+        filters are ever skipped and a pick costs O(1) amortized however full
+        ``seen`` is. Returns (index, entry, exhausted, cursor) with the cursor
+        to store for the next pick; ``exhausted`` means every matching entry
+        had been seen, so the seen set should be cleared and the returned entry
+        starts over. Returns (None, None, False, cursor) when nothing matches.
+        """
+        bank = self.bank(kind, language)
+        candidates = bank.candidates(difficulty, topic) if bank else ()
+        if not candidates:
+            return None, None, False, cursor
+        size = len(candidates)
+        seed = _seed(kind, language, seed)
+        for position in range(cursor, cursor + size):
+            index = candidates[_shuffled_position(position, size, seed)]
+            if index not in seen:
+                return index, dict(bank.get(index)), False, position + 1
+        index = candidates[_shuffled_position(cursor, size, seed)]
+        return index, dict(bank.get(index)), True, cursor + 1
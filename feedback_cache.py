@@ -0,0 +1,232 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s']+", re.UNICODE)
+_WHITESPACE_RE = re.compile(r"\s+", re.UNICODE)
+
+
+def normalize_text(text):
+    """Normalize text so trivially different submissions share a cache entry"""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    text = _PUNCTUATION_RE.sub(' ', text)
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def make_cache_key(language, prompt, transcript):
+    """Build a content-addressed key from the normalized request parts"""
+    parts = (normalize_text(language), normalize_text(prompt), normalize_text(transcript))
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU store with per-entry expiry"""
+
+    def __init__(self, max_entries=4096, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """On-disk LRU store so cached feedback survives restarts"""
+
+    # Only refresh the LRU timestamp when it is older than this, so hits stay read-only
+    TOUCH_INTERVAL = 60
+    # Run the eviction query once every this many writes
+    EVICT_EVERY = 64
+
+    def __init__(self, path, max_entries=4096, ttl=86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS feedback_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_feedback_cache_accessed "
+                "ON feedback_cache (accessed_at)"
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # A forked worker's main thread inherits the parent's thread-local connection
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, created_at, accessed_at FROM feedback_cache WHERE key = ?",
+            (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, created_at, accessed_at = row
+        now = time.time()
+        if created_at + self.ttl < now:
+            with conn:
+                conn.execute("DELETE FROM feedback_cache WHERE key = ?", (key,))
+            return None
+        if now - accessed_at > self.TOUCH_INTERVAL:
+            with conn:
+                conn.execute(
+                    "UPDATE feedback_cache SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+        return value
+
+    def set(self, key, value):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO feedback_cache (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+        with self._write_lock:
+            self._writes += 1
+            evict = self._writes % self.EVICT_EVERY == 0
+        if evict:
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        with conn:
+            conn.execute("DELETE FROM feedback_cache WHERE created_at < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM feedback_cache WHERE key IN ("
+                "SELECT key FROM feedback_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM feedback_cache")
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM feedback_cache").fetchone()[0]
+
+
+class FeedbackCache:
+    """Cache of analysis results keyed by normalized (language, prompt, transcript)"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, language, prompt, transcript):
+        """Return a fresh copy of the cached analysis, or None on a miss"""
+        try:
+            value = self.backend.get(make_cache_key(language, prompt, transcript))
+        except sqlite3.Error as e:
+            logger.error(f"Feedback cache read failed: {str(e)}")
+            value = None
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if value is None else json.loads(value)
+
+    def set(self, language, prompt, transcript, feedback):
+        try:
+            self.backend.set(make_cache_key(language, prompt, transcript), json.dumps(feedback))
+        except sqlite3.Error as e:
+            logger.error(f"Feedback cache write failed: {str(e)}")
+
+    def clear(self):
+        self.backend.clear()
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0
+        }
+
+
+class NullCache:
+    """Drop-in replacement used when caching is disabled"""
+
+    def get(self, language, prompt, transcript):
+        return None
+
+    def set(self, language, prompt, transcript, feedback):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {'backend': None, 'entries': 0, 'hits': 0, 'misses': 0, 'hit_rate': 0.0}
+
+
+def build_feedback_cache(backend='memory', max_entries=4096, ttl=86400, path='feedback_cache.sqlite3'):
+    """Create the feedback cache for the configured backend name"""
+    if backend == 'none':
+        return NullCache()
+    if backend == 'sqlite':
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        return FeedbackCache(SQLiteBackend(path, max_entries=max_entries, ttl=ttl))
+    if backend != 'memory':
+        logger.warning(f"Unknown feedback cache backend '{backend}', using in-memory cache")
+    return FeedbackCache(MemoryBackend(max_entries=max_entries, ttl=ttl))
@@ -0,0 +1,265 @@
+import heapq
+import logging
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the dispatcher has no free worker or queue slot"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Feedback queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class FeedbackJob:
+    """A single analysis running on the dispatcher's executor.
+
+    The job resolves exactly once: either when the analysis finishes, or when
+    someone waits on / polls it after its deadline, in which case the fallback
+    result is used instead. ``on_complete`` then turns the raw analysis into the
+    final response (e.g. by recording the user's progress).
+    """
+
+    def __init__(self, job_id, deadline, fallback, on_complete, owner=None):
+        self.id = job_id
+        self.owner = owner
+        self.created_at = time.time()
+        self.deadline = deadline
+        self.finished_at = None
+        self.status = 'pending'
+        self.result = None
+        self.error = None
+        self.timed_out = False
+        self._fallback = fallback
+        self._on_complete = on_complete
+        self._future = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def _resolve(self, analysis=None, exc=None, timed_out=False):
+        with self._lock:
+            if self._done.is_set():
+                return
+            try:
+                if exc is not None:
+                    raise exc
+                if timed_out:
+                    self.timed_out = True
+                    if self._fallback is None:
+                        raise TimeoutError("Analysis did not finish before its deadline")
+                    analysis = self._fallback()
+                self.result = self._on_complete(analysis) if self._on_complete else analysis
+                self.status = 'done'
+            except Exception as e:
+                logger.error(f"Feedback job {self.id} failed: {str(e)}")
+                self.error = str(e)
+                self.status = 'error'
+            self.finished_at = time.time()
+            self._done.set()
+
+    def _future_done(self, future):
+        exc = future.exception()
+        self._resolve(analysis=None if exc else future.result(), exc=exc)
+
+    def poll(self):
+        """Non-blocking check that also enforces the deadline"""
+        if not self._done.is_set() and time.monotonic() >= self.deadline:
+            self._resolve(timed_out=True)
+        return self.status
+
+    def wait(self):
+        """Block until the job resolves or its deadline passes"""
+        remaining = self.deadline - time.monotonic()
+        if remaining > 0:
+            self._done.wait(remaining)
+        self.poll()
+        return self.result
+
+    def done(self):
+        return self._done.is_set()
+
+    def to_dict(self):
+        data = {'job_id': self.id, 'status': self.poll()}
+        if self.status == 'done':
+            data['feedback'] = self.result
+            data['timed_out'] = self.timed_out
+        elif self.status == 'error':
+            data['error'] = self.error
+        return data
+
+
+class DispatcherSlot:
+    """A reserved dispatcher slot; releasing it more than once is harmless"""
+
+    def __init__(self, dispatcher):
+        self._dispatcher = dispatcher
+        self._started = time.monotonic()
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._dispatcher._release_slot(self._started)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class FeedbackDispatcher:
+    """Runs model analyses on a bounded pool with a bounded backlog.
+
+    At most ``max_workers`` analyses run at once and at most ``max_queue`` more
+    wait for a worker; anything beyond that is rejected with QueueFullError so
+    callers can answer 429 instead of piling up threads. Once draining for
+    shutdown, new work is rejected the same way.
+    """
+
+    def __init__(self, max_workers=8, max_queue=32, timeout=30, result_ttl=300):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='feedback')
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._jobs = {}
+        # (monotonic time the job may be dropped, job id), earliest first
+        self._expiry = []
+        self._jobs_lock = threading.Lock()
+        self._in_flight = 0
+        self._avg_latency = 1.0
+        self._stats_lock = threading.Lock()
+        self._idle = threading.Condition(self._stats_lock)
+        self._draining = False
+
+    def submit(self, fn, args=(), fallback=None, on_complete=None, timeout=None, owner=None, track=True):
+        """
+        Schedule ``fn(*args)`` and return its FeedbackJob. A tracked job can be
+        looked up by ``owner`` with get_job until ``result_ttl`` seconds after it
+        finishes; callers that wait on the job themselves pass ``track=False``.
+        """
+        if self._draining or not self._slots.acquire(blocking=False):
+            raise QueueFullError(self.retry_after())
+        timeout = self.timeout if timeout is None else timeout
+        job = FeedbackJob(
+            uuid.uuid4().hex,
+            time.monotonic() + timeout,
+            fallback,
+            on_complete,
+            owner
+        )
+        started = time.monotonic()
+        with self._stats_lock:
+            self._in_flight += 1
+
+        def release(future):
+            self._release_slot(started)
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except RuntimeError:
+            self._slots.release()
+            with self._stats_lock:
+                self._in_flight -= 1
+            raise
+        job._future = future
+        # The slot is held until on_complete (e.g. the progress update) has run too
+        future.add_done_callback(job._future_done)
+        future.add_done_callback(release)
+
+        if track:
+            with self._jobs_lock:
+                self._prune_jobs()
+                self._jobs[job.id] = job
+                heapq.heappush(self._expiry, (job.deadline + self.result_ttl, job.id))
+        return job
+
+    def reserve(self):
+        """Claim a slot for work that runs outside the pool, such as a streamed response.
+
+        Raises QueueFullError right away when no slot is free. The returned slot
+        must be released (or used as a context manager) when the work is done.
+        """
+        if self._draining or not self._slots.acquire(blocking=False):
+            raise QueueFullError(self.retry_after())
+        with self._stats_lock:
+            self._in_flight += 1
+        return DispatcherSlot(self)
+
+    def _release_slot(self, started):
+        self._slots.release()
+        with self._stats_lock:
+            self._in_flight -= 1
+            # Exponentially weighted moving average of analysis latency
+            self._avg_latency = 0.8 * self._avg_latency + 0.2 * (time.monotonic() - started)
+            if not self._in_flight:
+                self._idle.notify_all()
+
+    def get_job(self, job_id, owner=None):
+        """The job with ``job_id`` if it was submitted by ``owner``, else None"""
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    def _prune_jobs(self):
+        # Jobs are queued to expire ``result_ttl`` seconds after their deadline, so
+        # one that never resolves is still dropped. A job that finished after its
+        # deadline goes back in the queue until ``result_ttl`` after it finished.
+        now = time.monotonic()
+        while self._expiry and self._expiry[0][0] <= now:
+            _, job_id = heapq.heappop(self._expiry)
+            job = self._jobs[job_id]
+            kept_for = 0 if job.finished_at is None else job.finished_at + self.result_ttl - time.time()
+            if kept_for > 0:
+                heapq.heappush(self._expiry, (now + kept_for, job_id))
+            else:
+                del self._jobs[job_id]
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up, based on recent latency"""
+        with self._stats_lock:
+            waves = self._in_flight / self.max_workers
+            return max(1, math.ceil(self._avg_latency * waves))
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'avg_latency': round(self._avg_latency, 3),
+                'tracked_jobs': len(self._jobs)
+            }
+
+    def drain(self, timeout):
+        """
+        Stop accepting work and wait up to ``timeout`` seconds for the analyses,
+        jobs and streams in flight to finish. Returns how many are still running.
+        """
+        self._draining = True
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._idle.wait(remaining)
+            unfinished = self._in_flight
+        self._executor.shutdown(wait=False)
+        return unfinished
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,83 @@
+import json
+
+
+class IncrementalJSONParser:
+    """Parse a streamed JSON object one top-level member at a time.
+
+    Model output arrives in arbitrary chunks (possibly wrapped in a ```json
+    fence). ``feed`` returns every ``(key, value)`` pair of the outermost object
+    whose value has been fully received, so callers can act on finished
+    sections before the rest of the object has been generated.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = None
+        self.finished = False
+
+    def feed(self, chunk):
+        members = []
+        if self.finished or not chunk:
+            return members
+        self._buffer += chunk
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                # Skip any preamble (code fences, prose) before the object
+                if char == '{':
+                    self._depth = 1
+                    self._member_start = i + 1
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buffer[self._member_start:i], members)
+                    self.finished = True
+                    break
+            elif char == ',' and self._depth == 1:
+                self._emit(buffer[self._member_start:i], members)
+                self._member_start = i + 1
+            i += 1
+
+        # Drop everything before the member currently being received
+        if self._depth == 0 and not self.finished:
+            self._buffer = ''
+            self._pos = 0
+        elif self._member_start:
+            self._buffer = buffer[self._member_start:]
+            self._pos = i - self._member_start
+            self._member_start = 0
+        else:
+            self._pos = i
+        return members
+
+    @staticmethod
+    def _emit(text, members):
+        if not text.strip():
+            return
+        try:
+            members.extend(json.loads('{' + text + '}').items())
+        except json.JSONDecodeError:
+            # A malformed member is skipped; the caller fills the gap afterwards
+            pass
+
+
+def sse_event(event, data):
+    """Encode one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,56 @@
+"""
+Production server settings, read from the environment.
+
+    gunicorn -c gunicorn.conf.py
+
+Workers are separate processes, so run them with the sqlite storage backend:
+the in-memory store is per process and would give each worker its own users.
+"""
+import glob
+import logging
+import multiprocessing
+import os
+import tempfile
+
+wsgi_app = 'app:create_app()'
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# Feedback requests mostly wait on the model, so each worker serves them from a thread pool
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '8'))
+
+# Any worker may answer /metrics, so the workers pool their metrics in one directory
+if workers > 1:
+    os.environ.setdefault(
+        'METRICS_DIR', os.path.join(tempfile.gettempdir(), f"speakeasy-metrics-{os.getenv('PORT', '8000')}")
+    )
+
+# Import the app and load its static data once in the master; workers share it copy-on-write
+preload_app = True
+
+timeout = int(os.getenv('WEB_TIMEOUT', '60'))
+keepalive = 5
+# On SIGTERM, workers stop accepting connections and finish requests in progress
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', '30'))
+
+accesslog = os.getenv('ACCESS_LOG', '-')
+
+
+def on_starting(server):
+    # Files left by an earlier run would add its totals to this one's
+    if os.getenv('METRICS_DIR'):
+        for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.json')):
+            os.unlink(path)
+    if os.getenv('STORAGE_BACKEND', 'sqlite') == 'memory' and workers > 1:
+        logging.getLogger('gunicorn.error').warning(
+            "STORAGE_BACKEND=memory with several workers: each worker keeps its own users"
+        )
+
+
+def worker_exit(server, worker):
+    # Background feedback jobs outlive their requests; let them finish before the
+    # master's kill deadline
+    from app import drain_feedback
+
+    drain_feedback(max(1, graceful_timeout - 5))
@@ -0,0 +1,222 @@
+import threading
+from collections import deque
+from datetime import date, timedelta
+
+
+class TextStore:
+    """Interns prompts, transcripts and feedback so each distinct text is kept once.
+
+    Texts are reference counted: a text is dropped when the last history record
+    pointing at it is evicted.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._texts = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def add(self, text):
+        with self._lock:
+            text_id = self._ids.get(text)
+            if text_id is None:
+                text_id = self._next_id
+                self._next_id += 1
+                self._ids[text] = text_id
+                self._texts[text_id] = [text, 0]
+            self._texts[text_id][1] += 1
+            return text_id
+
+    def get(self, text_id):
+        return self._texts[text_id][0]
+
+    def release(self, text_id):
+        with self._lock:
+            entry = self._texts[text_id]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._texts[text_id]
+                del self._ids[entry[0]]
+
+    def __len__(self):
+        return len(self._texts)
+
+
+class HistoryRecord:
+    """One practice session, with its texts referenced by TextStore id"""
+
+    __slots__ = ('id', 'practiced_at', 'language', 'prompt_id', 'transcript_id',
+                 'feedback_id', 'score', 'xp_gained')
+
+    def __init__(self, record_id, practiced_at, language, prompt_id, transcript_id,
+                 feedback_id, score, xp_gained):
+        self.id = record_id
+        self.practiced_at = practiced_at
+        self.language = language
+        self.prompt_id = prompt_id
+        self.transcript_id = transcript_id
+        self.feedback_id = feedback_id
+        self.score = score
+        self.xp_gained = xp_gained
+
+
+class HistoryStats:
+    """Aggregates over every session a user has completed, updated on each append"""
+
+    __slots__ = ('sessions', 'total_score', 'languages', 'days', 'day_scores')
+
+    def __init__(self):
+        self.sessions = 0
+        self.total_score = 0.0
+        # language -> [sessions, total score, XP gained]
+        self.languages = {}
+        # ISO date -> sessions that day, and total score that day
+        self.days = {}
+        self.day_scores = {}
+
+    def add(self, language, score, day, xp=0):
+        self.sessions += 1
+        self.total_score += score
+        totals = self.languages.setdefault(language, [0, 0.0, 0])
+        totals[0] += 1
+        totals[1] += score
+        totals[2] += xp
+        self.days[day] = self.days.get(day, 0) + 1
+        self.day_scores[day] = self.day_scores.get(day, 0.0) + score
+
+    def load(self, sessions, total_score, languages, days):
+        """
+        Replace the aggregates with saved ones: (language, sessions, total score, XP)
+        and (day, sessions, total score) tuples
+        """
+        self.sessions = sessions
+        self.total_score = total_score
+        self.languages = {language: [count, total, xp] for language, count, total, xp in languages}
+        self.days = {day: count for day, count, _ in days}
+        self.day_scores = {day: total for day, _, total in days}
+
+    def export(self):
+        """(language totals, day totals) in the shape ``load`` takes"""
+        return (
+            [(language, *totals) for language, totals in sorted(self.languages.items())],
+            [(day, count, self.day_scores.get(day, 0.0)) for day, count in sorted(self.days.items())]
+        )
+
+    def score_since(self, start, today=None):
+        """Score points from the days ``start`` (a date) to ``today``"""
+        today = today or date.today()
+        return sum(
+            self.day_scores.get((start + timedelta(days=offset)).isoformat(), 0.0)
+            for offset in range((today - start).days + 1)
+        )
+
+    def to_dict(self, days=30):
+        return summarize_stats(
+            self.sessions,
+            self.total_score,
+            {language: (count, total) for language, (count, total, _) in self.languages.items()},
+            self.days,
+            days
+        )
+
+
+def summarize_stats(sessions, total_score, languages, daily_counts, days=30):
+    """Shape aggregate counters for the progress page and the stats API"""
+    start = date.today() - timedelta(days=days - 1)
+    return {
+        'sessions': sessions,
+        'average_score': round(total_score / sessions, 1) if sessions else 0.0,
+        'languages': {
+            language: {
+                'sessions': count,
+                'average_score': round(total / count, 1) if count else 0.0
+            }
+            for language, (count, total) in sorted(languages.items())
+        },
+        'daily': [
+            {'date': (start + timedelta(days=offset)).isoformat(),
+             'sessions': daily_counts.get((start + timedelta(days=offset)).isoformat(), 0)}
+            for offset in range(days)
+        ]
+    }
+
+
+class UserHistory:
+    """Ring buffer of a user's most recent sessions plus all-time aggregates"""
+
+    def __init__(self, texts, limit=200):
+        self._texts = texts
+        self._records = deque(maxlen=limit)
+        self._next_id = 1
+        self.stats = HistoryStats()
+
+    def append(self, practiced_at, language, prompt, transcript, feedback, score, xp_gained):
+        if len(self._records) == self._records.maxlen:
+            evicted = self._records[0]
+            for text_id in (evicted.prompt_id, evicted.transcript_id, evicted.feedback_id):
+                self._texts.release(text_id)
+        record = HistoryRecord(
+            self._next_id, practiced_at, language,
+            self._texts.add(prompt), self._texts.add(transcript), self._texts.add(feedback),
+            score, xp_gained
+        )
+        self._next_id += 1
+        self._records.append(record)
+        self.stats.add(language, score, practiced_at[:10], xp_gained)
+        return record
+
+    def _to_dict(self, record):
+        return {
+            'id': record.id,
+            'date': record.practiced_at[:16],
+            'language': record.language,
+            'prompt': self._texts.get(record.prompt_id),
+            'transcript': self._texts.get(record.transcript_id),
+            'score': record.score,
+            'feedback': self._texts.get(record.feedback_id),
+            'xp_gained': record.xp_gained
+        }
+
+    def page(self, cursor=None, limit=20):
+        """Return (records newest first, next cursor) for sessions with id below ``cursor``"""
+        if not self._records:
+            return [], None
+        # Ids are consecutive, so the cursor maps straight to a buffer position
+        first_id = self._records[0].id
+        end = len(self._records) if cursor is None else max(0, min(cursor - first_id, len(self._records)))
+        start = max(0, end - limit)
+        items = [self._to_dict(self._records[i]) for i in range(end - 1, start - 1, -1)]
+        next_cursor = items[-1]['id'] if start > 0 else None
+        return items, next_cursor
+
+    def restore(self, sessions, last_id, stats=None):
+        """
+        Fill an empty history from snapshot tuples (see ``export``). They are
+        numbered consecutively up to ``last_id``, so a buffer restored from its
+        own snapshot keeps its ids and new sessions always number above it.
+        ``stats``, the arguments to HistoryStats.load, replaces the aggregates
+        rebuilt from ``sessions``, which only cover the sessions that fit.
+        """
+        self._next_id = last_id - len(sessions) + 1
+        for _, practiced_at, language, prompt, transcript, feedback, score, xp_gained in sessions:
+            self.append(practiced_at, language, prompt, transcript, feedback, score, xp_gained)
+        if stats is not None:
+            self.stats.load(*stats)
+
+    def export(self, after=0):
+        """Sessions with an id above ``after``, oldest first, as snapshot tuples"""
+        texts = self._texts
+        return [
+            (record.id, record.practiced_at, record.language, texts.get(record.prompt_id),
+             texts.get(record.transcript_id), texts.get(record.feedback_id), record.score, record.xp_gained)
+            for record in self._records if record.id > after
+        ]
+
+    def recent(self, limit=20):
+        """Most recent sessions in chronological order"""
+        items, _ = self.page(limit=limit)
+        items.reverse()
+        return items
+
+    def __len__(self):
+        return len(self._records)
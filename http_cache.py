@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from flask import Response
+from werkzeug.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    # Optional; without it shared bodies are precompressed with gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are sent as they are; compressing them saves nothing
+MIN_COMPRESS_SIZE = 512
+
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _compress(encoding, body):
+    if encoding == 'br':
+        return brotli.compress(body, quality=11)
+    # Fixed mtime, so the same body always compresses to the same bytes
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def make_etag(*parts):
+    """Strong validator from the bytes or strings that make up a representation"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()[:32]
+
+
+def fingerprint(value):
+    """Weak validator for a page rendered from ``value`` (any JSON-like data)"""
+    data = json.dumps(value, sort_keys=True, default=lambda o: sorted(o) if isinstance(o, (set, frozenset)) else str(o))
+    return 'W/' + make_etag(data)
+
+
+class Representation:
+    """
+    One body kept ready to send: its ETag, when it last changed and its
+    compressed forms. Each encoding is compressed once, on first request, at
+    the highest level since the cost is paid a single time.
+    """
+
+    def __init__(self, body, mimetype, last_modified=None):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = make_etag(body)
+        self.last_modified = last_modified
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding):
+        if encoding is None or len(self.body) < MIN_COMPRESS_SIZE:
+            return self.body
+        body = self._encoded.get(encoding)
+        if body is None:
+            with self._lock:
+                body = self._encoded.get(encoding)
+                if body is None:
+                    body = self._encoded[encoding] = _compress(encoding, self.body)
+        return body
+
+
+def negotiate_encoding(accept_encoding):
+    """Best supported encoding the client accepts, or None for the identity body"""
+    for encoding in ENCODINGS:
+        if accept_encoding[encoding] > 0:
+            return encoding
+    return None
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Whether the client's copy is current. If-None-Match takes precedence; the
+    date is only compared when the request carries no ETag.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag.removeprefix('W/'))
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def validated(response, etag, last_modified=None, cache_control=None):
+    """Set the validators and caching policy on ``response``"""
+    weak = etag.startswith('W/')
+    response.set_etag(etag.removeprefix('W/'), weak=weak)
+    if last_modified is not None:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def not_modified_response(etag, last_modified=None, cache_control=None, vary=None):
+    response = Response(status=304)
+    if vary:
+        response.vary.update(vary)
+    return validated(response, etag, last_modified, cache_control)
+
+
+class ResponseCache:
+    """
+    Shared response bodies keyed by whatever they are built from, for content
+    that is the same for every user. ``respond`` answers from the cached
+    representation: 304 when the client's copy is current, otherwise the
+    body in the best encoding the client accepts.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key, build):
+        """The representation stored under ``key``, built by ``build()`` on first use"""
+        with self._lock:
+            representation = self._entries.get(key)
+            if representation is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return representation
+            self.misses += 1
+        # Built outside the lock; two concurrent misses build the same body twice at worst
+        representation = build()
+        with self._lock:
+            self._entries[key] = representation
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return representation
+
+    def respond(self, request, key, build, cache_control):
+        representation = self.get(key, build)
+        if not_modified(request, representation.etag, representation.last_modified):
+            self.not_modified += 1
+            return not_modified_response(representation.etag, representation.last_modified,
+                                         cache_control, vary=('Accept-Encoding',))
+        encoding = negotiate_encoding(request.accept_encodings)
+        body = representation.encoded(encoding)
+        response = Response(body, mimetype=representation.mimetype)
+        if body is not representation.body:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return validated(response, representation.etag, representation.last_modified, cache_control)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified
+        }
+
+
+def json_representation(data, last_modified=None):
+    """A Representation of ``data`` serialized as compact, key-sorted JSON"""
+    body = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return Representation(body, 'application/json', last_modified)
@@ -0,0 +1,272 @@
+import hashlib
+import logging
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+XP = 'xp'
+WEEKLY_SCORE = 'weekly_score'
+LONGEST_STREAK = 'streak'
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level):
+        self.key = key
+        self.next = [None] * level
+        self.width = [1] * level
+
+
+class IndexableSkipList:
+    """
+    Sorted collection of unique, comparable keys with O(log n) insert, remove,
+    rank and positional lookup. Every link records how many positions it skips,
+    so a rank is the sum of the widths walked on the way down.
+    """
+
+    MAX_LEVEL = 24
+
+    def __init__(self, seed=None):
+        self._head = _Node(None, self.MAX_LEVEL)
+        self._size = 0
+        self._random = random.Random(seed)
+
+    def __len__(self):
+        return self._size
+
+    def _random_level(self):
+        level = 1
+        while level < self.MAX_LEVEL and self._random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key):
+        chain = [None] * self.MAX_LEVEL
+        steps_at_level = [0] * self.MAX_LEVEL
+        node = self._head
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key <= key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        new = _Node(key, self._random_level())
+        steps = 0
+        for level in range(len(new.next)):
+            previous = chain[level]
+            new.next[level] = previous.next[level]
+            previous.next[level] = new
+            new.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(len(new.next), self.MAX_LEVEL):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        chain = [None] * self.MAX_LEVEL
+        node = self._head
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), self.MAX_LEVEL):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def index(self, key):
+        """Zero-based position of ``key``, or None if it is not present"""
+        node = self._head
+        position = 0
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        target = node.next[0]
+        return position if target is not None and target.key == key else None
+
+    def slice(self, start, count):
+        """Up to ``count`` keys starting at zero-based position ``start``"""
+        if start >= self._size or count <= 0:
+            return []
+        node = self._head
+        remaining = start + 1
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class Leaderboard:
+    """Scores per member, ranked highest first (ties broken by member id)"""
+
+    def __init__(self):
+        self._scores = {}
+        self._ranking = IndexableSkipList()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def set(self, member, score):
+        old = self._scores.get(member)
+        if old == score:
+            return
+        if old is not None:
+            self._ranking.remove((-old, member))
+        self._ranking.insert((-score, member))
+        self._scores[member] = score
+
+    def incr(self, member, delta):
+        self.set(member, self._scores.get(member, 0) + delta)
+
+    def score(self, member):
+        return self._scores.get(member)
+
+    def rank(self, member):
+        """One-based rank of ``member``, or None if it has no score"""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        return self._ranking.index((-score, member)) + 1
+
+    def page(self, offset=0, limit=20):
+        """[(rank, member, score)] for ranks offset + 1 to offset + limit"""
+        return [
+            (offset + position + 1, member, -negated)
+            for position, (negated, member) in enumerate(self._ranking.slice(offset, limit))
+        ]
+
+
+def week_start(today=None):
+    today = today or date.today()
+    return today - timedelta(days=today.weekday())
+
+
+def player_name(user_id):
+    """Stable public handle, so leaderboards never expose session user ids"""
+    return 'player-' + hashlib.sha256(user_id.encode('utf-8')).hexdigest()[:8]
+
+
+class Leaderboards:
+    """
+    Incrementally maintained rankings: total XP, XP per language ('xp:<language>'),
+    score points this week and longest streak.
+
+    Updates are O(log n). ``loader(week_start)`` returns one row per user
+    (user_id, xp, language_xp, weekly_score, longest_streak) and is used to build
+    the boards at startup. When storage is shared by several processes, a
+    ``refresh_interval`` also rebuilds them from it periodically so each process
+    sees the others' updates. Those rebuilds run on a background thread and the
+    new boards are swapped in when complete, so no reader waits for one.
+    """
+
+    def __init__(self, loader=None, refresh_interval=0):
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self._boards = {}
+        self._week = week_start()
+        self._refreshed_at = 0.0
+        self._refreshing = False
+        self._lock = threading.RLock()
+
+    def _board(self, name):
+        board = self._boards.get(name)
+        if board is None:
+            board = self._boards[name] = Leaderboard()
+        return board
+
+    def _roll_week(self, today=None):
+        current = week_start(today)
+        if current != self._week:
+            self._week = current
+            self._boards.pop(WEEKLY_SCORE, None)
+
+    def rebuild(self):
+        if self.loader is None:
+            return
+        week = week_start()
+        boards = {}
+
+        def board(name):
+            if name not in boards:
+                boards[name] = Leaderboard()
+            return boards[name]
+
+        for row in self.loader(week):
+            user_id = row['user_id']
+            board(XP).set(user_id, row['xp'])
+            for language, xp in row['language_xp'].items():
+                board(f'{XP}:{language}').set(user_id, xp)
+            if row['weekly_score']:
+                board(WEEKLY_SCORE).set(user_id, round(row['weekly_score'], 1))
+            if row['longest_streak']:
+                board(LONGEST_STREAK).set(user_id, row['longest_streak'])
+        with self._lock:
+            self._boards = boards
+            self._week = week
+            self._refreshed_at = time.monotonic()
+        logger.info(f"Rebuilt leaderboards for {len(boards.get(XP, ()))} users")
+
+    def _maybe_refresh(self):
+        if not self.refresh_interval or time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            # Stop other readers from starting the same rebuild
+            self._refreshing = True
+            self._refreshed_at = time.monotonic()
+        threading.Thread(target=self._refresh, name='leaderboard-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.error(f"Leaderboard refresh failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def record_practice(self, user_id, language, score, outcome, today=None):
+        with self._lock:
+            self._roll_week(today)
+            self._board(XP).set(user_id, outcome['total_xp'])
+            self._board(f'{XP}:{language}').incr(user_id, outcome['xp_gained'])
+            weekly = self._board(WEEKLY_SCORE)
+            weekly.set(user_id, round((weekly.score(user_id) or 0) + score, 1))
+            streaks = self._board(LONGEST_STREAK)
+            if outcome['streak'] > (streaks.score(user_id) or 0):
+                streaks.set(user_id, outcome['streak'])
+
+    def add_xp(self, user_id, xp):
+        with self._lock:
+            self._board(XP).incr(user_id, xp)
+
+    def page(self, name, offset=0, limit=20, user_id=None):
+        """Return (total, [(rank, user_id, score)], (rank, score) of ``user_id`` or None)"""
+        self._maybe_refresh()
+        with self._lock:
+            self._roll_week()
+            board = self._boards.get(name)
+            if board is None:
+                return 0, [], None
+            mine = None
+            if user_id is not None and board.score(user_id) is not None:
+                mine = (board.rank(user_id), board.score(user_id))
+            return len(board), board.page(offset, limit), mine
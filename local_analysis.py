@@ -0,0 +1,545 @@
+import os
+import re
+import threading
+from bisect import bisect_left
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Used for any language without bundled tables
+DEFAULT_LANGUAGE = 'english'
+
+# Frequency ranks at which each vocabulary band ends; words past the bundled
+# table fall into the last, least frequent band
+BAND_EDGES = (100,)
+BAND_WEIGHTS = (0.0, 0.5, 1.0)
+
+MTLD_THRESHOLD = 0.72
+
+_WORD_RE = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*['’]?")
+_SENTENCE_RE = re.compile(r'[.!?]+')
+_VOWELS = set('aeiouyáéíóúàèìòùâêîôûäëïöüœæ')
+# Consonant pairs that start a syllable together (pro-ble-ma, not prob-le-ma)
+_ONSETS = {'bl', 'br', 'cl', 'cr', 'dr', 'fl', 'fr', 'gl', 'gr', 'pl', 'pr', 'tr', 'ch', 'sh', 'th', 'ph'}
+
+FILLERS = {
+    'english': {'um', 'uh', 'erm', 'er', 'hmm', 'ah', 'uhm'},
+    'spanish': {'eh', 'em', 'mmm', 'este', 'ehh'},
+    'french': {'euh', 'hum', 'ben', 'bah', 'heu'},
+    'german': {'äh', 'ähm', 'hm', 'öh', 'ähh'},
+}
+
+# French elided articles and pronouns, looked up under their full form
+ELISIONS = {
+    "l'": 'le', "j'": 'je', "d'": 'de', "qu'": 'que', "n'": 'ne',
+    "s'": 'se', "c'": 'ce', "m'": 'me', "t'": 'te'
+}
+
+# (pattern, {matched word: replacement}, explanation). Patterns run over each lowercased
+# sentence of the transcript with tokens joined by single spaces; the last group is replaced, and a
+# pattern ending in a lookahead shows the word after it in the issue and correction.
+# Earlier rules win where two rules match the same words.
+GRAMMAR_RULES = {
+    'english': [
+        # After an auxiliary the base form is right ('does she have', 'what did he do'),
+        # and so is 'were' in the subjunctive ('if it were')
+        (r"\b" + ''.join(rf"(?<!\b{word} )" for word in (
+            'do', 'does', 'did', "don't", "doesn't", "didn't", 'can', 'could', 'would', 'will',
+            'should', 'might', 'must', 'let', 'make', 'if', 'wish'
+        )) + r"(he|she|it) (don't|have|are|were|do)\b",
+         {"don't": "doesn't", 'have': 'has', 'are': 'is', 'were': 'was', 'do': 'does'},
+         "Third-person singular subjects (he, she, it) take singular verb forms"),
+        (r"\b(i) (is|are|has)\b",
+         {'is': 'am', 'are': 'am', 'has': 'have'},
+         "With 'I' use 'am' and 'have'"),
+        (r"\b(we|they|you) (is|was|has|does|doesn't)\b",
+         {'is': 'are', 'was': 'were', 'has': 'have', 'does': 'do', "doesn't": "don't"},
+         "Plural subjects (we, you, they) take plural verb forms"),
+        (r"\b(people|children) (is|was|has)\b",
+         {'is': 'are', 'was': 'were', 'has': 'have'},
+         "'People' and 'children' are plural nouns"),
+        # Vowel letters that sound like a consonant: 'a European', 'a one-off'
+        (r"\b(a) (?=[aeio])(?!eu|ew|one\b|ones\b|once\b)",
+         {'a': 'an'},
+         "Use 'an' before words that start with a vowel sound"),
+        (r"\b(more) (?=(?:better|worse|bigger|easier|harder|faster|smaller|larger|happier|cheaper|older|younger)\b)",
+         {'more': ''},
+         "Comparatives ending in -er already mean 'more'"),
+        (r"\b(did|didn't) (went|saw|ate|came|took|gave|made|bought|had|got|said|told|wrote|ran|found|thought|knew|felt|left)\b",
+         {'went': 'go', 'saw': 'see', 'ate': 'eat', 'came': 'come', 'took': 'take', 'gave': 'give',
+          'made': 'make', 'bought': 'buy', 'had': 'have', 'got': 'get', 'said': 'say', 'told': 'tell',
+          'wrote': 'write', 'ran': 'run', 'found': 'find', 'thought': 'think', 'knew': 'know',
+          'felt': 'feel', 'left': 'leave'},
+         "After 'did' or 'didn't' use the base form of the verb"),
+        (r"\b(can|could|should|must|will|would|might) (to) (?=\w)",
+         {'to': ''},
+         "Modal verbs are followed by the base verb without 'to'"),
+        (r"\b(?:i|we|they|you) (am|are) (?=agree\b)",
+         {'am': '', 'are': ''},
+         "'Agree' is a verb, so it does not need 'am' or 'are'"),
+    ],
+    'spanish': [
+        (r"\b(yo) (es|eres|está|tiene|va|hace|puede|quiere|son)\b",
+         {'es': 'soy', 'eres': 'soy', 'está': 'estoy', 'tiene': 'tengo', 'va': 'voy', 'hace': 'hago',
+          'puede': 'puedo', 'quiere': 'quiero', 'son': 'soy'},
+         "Con 'yo' el verbo va en primera persona"),
+        (r"\b(yo) (?=gustan?\b)",
+         {'yo': 'me'},
+         "'Gustar' se usa con pronombre: 'me gusta'"),
+        (r"\b(más) (?=(?:mejor|peor|mayor|menor)\b)",
+         {'más': ''},
+         "'Mejor', 'peor', 'mayor' y 'menor' ya son comparativos"),
+        (r"\b(la) (?=(?:problema|día|sistema|tema|mapa|idioma|programa)\b)",
+         {'la': 'el'},
+         "Estos sustantivos terminados en -a son masculinos"),
+        (r"\b(el) (?=(?:mano|gente|ciudad|foto|moto|radio|clase|noche|leche)\b)",
+         {'el': 'la'},
+         "Estos sustantivos son femeninos"),
+        (r"\b(a|de) (el)\b",
+         {'el': ''},
+         "'A el' y 'de el' se contraen en 'al' y 'del'"),
+        (r"\b(muy) (mucho)\b",
+         {'mucho': 'muchísimo'},
+         "No se dice 'muy mucho'; usa 'muchísimo'"),
+    ],
+    'french': [
+        (r"\b(je est|je es|je sont|je a)\b",
+         {'je est': 'je suis', 'je es': 'je suis', 'je sont': 'je suis', 'je a': "j'ai"},
+         "Avec 'je', on conjugue à la première personne : je suis, j'ai"),
+        (r"\b(je|le|la|de|ne|que|se) (?=[aeiouéèêàâîô])",
+         {'je': "j'", 'le': "l'", 'la': "l'", 'de': "d'", 'ne': "n'", 'que': "qu'", 'se': "s'"},
+         "Devant une voyelle, on fait l'élision : j'ai, l'ami, c'est"),
+        (r"\b(ce) (?=(?:est|était)\b)",
+         {'ce': "c'"},
+         "Devant une voyelle, on fait l'élision : j'ai, l'ami, c'est"),
+        (r"\b(ce) (?=[aeiouéèêàâîô])",
+         {'ce': 'cet'},
+         "Devant un nom masculin qui commence par une voyelle, 'ce' devient 'cet' : cet arbre"),
+        (r"\b(si) (?=ils?\b)",
+         {'si': "s'"},
+         "'Si' devient 's'' devant 'il' et 'ils'"),
+        (r"\b(de|à) (le|les)\b",
+         {'le': '', 'les': ''},
+         "De + le = du, de + les = des, à + le = au, à + les = aux"),
+        (r"\b(il|elle|on) (sont|suis|ai)\b",
+         {'sont': 'est', 'suis': 'est', 'ai': 'a'},
+         "Avec 'il', 'elle' ou 'on', le verbe est à la troisième personne du singulier"),
+        (r"\b(ils|elles) (est|a)\b",
+         {'est': 'sont', 'a': 'ont'},
+         "Avec 'ils' ou 'elles', le verbe est au pluriel"),
+        (r"\b(plus) (?=(?:meilleur|meilleure|bon|bonne|pire)\b)",
+         {'plus': ''},
+         "'Meilleur' est déjà un comparatif ; on ne dit pas 'plus bon'"),
+    ],
+    'german': [
+        (r"\b(ich) (bist|ist|sind|hat|hast)\b",
+         {'bist': 'bin', 'ist': 'bin', 'sind': 'bin', 'hat': 'habe', 'hast': 'habe'},
+         "Mit 'ich' steht das Verb in der ersten Person: ich bin, ich habe"),
+        (r"\b(du) (bin|ist|sind|habe|hat)\b",
+         {'bin': 'bist', 'ist': 'bist', 'sind': 'bist', 'habe': 'hast', 'hat': 'hast'},
+         "Mit 'du' endet das Verb meist auf -st: du bist, du hast"),
+        (r"\b(er|es) (bin|bist|habe|hast)\b",
+         {'bin': 'ist', 'bist': 'ist', 'habe': 'hat', 'hast': 'hat'},
+         "Mit 'er' oder 'es' steht das Verb in der dritten Person: er ist, er hat"),
+        (r"\b(mehr) (?=(?:besser|größer|schöner|kleiner|älter|jünger|schneller)\b)",
+         {'mehr': ''},
+         "Komparative auf -er brauchen kein 'mehr'"),
+        (r"\b(ich|du|er|sie|es|wir|ihr) (habe|hast|hat|haben|habt) (?=(?:gegangen|gekommen|gefahren|geflogen|geblieben|gewesen|geworden|gelaufen)\b)",
+         {'habe': 'bin', 'hast': 'bist', 'hat': 'ist', 'haben': 'sind', 'habt': 'seid'},
+         "Verben der Bewegung bilden das Perfekt mit 'sein'"),
+    ],
+}
+
+OVERALL_FEEDBACK = (
+    (3, "Keep practicing! Focus on forming complete sentences and speaking more confidently."),
+    (7, "Good effort! Your speech is improving. Focus on smoother delivery and more varied vocabulary."),
+    (10, "Excellent work! Your speech is clear and well-structured. Focus on mastering more advanced expressions."),
+)
+
+SUGGESTIONS = {
+    'grammar': "Review the corrections above and say each corrected sentence aloud three times",
+    'fluency': "Record yourself and practice answering without filler words or restarts",
+    'pronunciation': "Break long words into syllables and practice them slowly before speeding up",
+    'vocabulary': "Replace one everyday word in each answer with a more precise alternative",
+    'length': "Aim for longer answers: give a reason and an example for each point",
+}
+
+
+def _clamp(value):
+    return round(min(max(value, 0.0), 10.0), 1)
+
+
+def _mtld_pass(tokens):
+    factors = 0.0
+    types = set()
+    count = 0
+    for token in tokens:
+        types.add(token)
+        count += 1
+        if len(types) / count <= MTLD_THRESHOLD:
+            factors += 1
+            types = set()
+            count = 0
+    if count:
+        factors += (1 - len(types) / count) / (1 - MTLD_THRESHOLD)
+    return len(tokens) / factors if factors else float(len(tokens))
+
+
+def mtld(tokens):
+    """Measure of textual lexical diversity, averaged over a forward and a backward pass"""
+    if not tokens:
+        return 0.0
+    return (_mtld_pass(tokens) + _mtld_pass(tokens[::-1])) / 2
+
+
+def _silent_e(word, language):
+    """English words like 'because' or 'time' end in a silent e"""
+    return (language == 'english' and len(word) > 2 and word.endswith('e')
+            and word[-2] not in _VOWELS and not word.endswith('le'))
+
+
+def count_syllables(word, language='english'):
+    groups = 0
+    previous = False
+    for char in word:
+        vowel = char in _VOWELS
+        if vowel and not previous:
+            groups += 1
+        previous = vowel
+    if groups > 1 and _silent_e(word, language):
+        groups -= 1
+    return max(groups, 1)
+
+
+def syllabify(word, language='english'):
+    """Rough written syllable split ('practice' -> 'prac-tice') used as a pronunciation guide"""
+    parts = []
+    start = 0
+    i = 0
+    n = len(word)
+    while i < n:
+        # Find the end of the next vowel group, then the consonants after it
+        while i < n and word[i] not in _VOWELS:
+            i += 1
+        while i < n and word[i] in _VOWELS:
+            i += 1
+        j = i
+        while j < n and word[j] not in _VOWELS:
+            j += 1
+        if j >= n:
+            break
+        if j == n - 1 and _silent_e(word, language):
+            break
+        # One consonant starts the next syllable; of a cluster, the last one or two do
+        if j - i <= 1:
+            split = i
+        elif word[j - 2:j] in _ONSETS:
+            split = j - 2
+        else:
+            split = j - 1
+        parts.append(word[start:split])
+        start = split
+        i = split
+    parts.append(word[start:])
+    return '-'.join(part for part in parts if part)
+
+
+class WordTable:
+    """
+    Read-only word -> text lookup held as two parallel sorted lists and
+    searched with bisect. Loaded from a bundled file of tab-separated
+    'word<TAB>text' lines; a missing file gives an empty table.
+    """
+
+    def __init__(self, entries=()):
+        merged = {}
+        for word, text in entries:
+            # The first entry for a word wins, as in the frequency tables
+            merged.setdefault(word, text)
+        self.words = sorted(merged)
+        self.texts = [merged[word] for word in self.words]
+
+    @classmethod
+    def load(cls, path):
+        entries = []
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith('#') or '\t' not in line:
+                        continue
+                    word, text = line.rstrip('\r\n').split('\t', 1)
+                    if word.strip() and text.strip():
+                        entries.append((word.strip().casefold(), text.strip()))
+        return cls(entries)
+
+    def get(self, word, default=None):
+        index = bisect_left(self.words, word)
+        if index < len(self.words) and self.words[index] == word:
+            return self.texts[index]
+        return default
+
+    def __contains__(self, word):
+        return self.get(word) is not None
+
+    def __len__(self):
+        return len(self.words)
+
+
+class LanguageTables:
+    """
+    Frequency ranks, fillers, compiled grammar rules and the pronunciation and
+    vocabulary-upgrade lookup tables for one language
+    """
+
+    def __init__(self, language, data_dir=DATA_DIR):
+        self.language = language
+        self.ranks = {}
+        path = os.path.join(data_dir, 'frequency', f'{language}.txt')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    word = line.strip()
+                    if word and not word.startswith('#') and word not in self.ranks:
+                        self.ranks[word] = len(self.ranks) + 1
+        self.fillers = FILLERS.get(language, set())
+        self.pronunciation = WordTable.load(os.path.join(data_dir, 'pronunciation', f'{language}.txt'))
+        self.upgrades = WordTable.load(os.path.join(data_dir, 'upgrades', f'{language}.txt'))
+        self.rules = [
+            (re.compile(pattern), replacements, explanation)
+            for pattern, replacements, explanation in GRAMMAR_RULES.get(language, [])
+        ]
+
+    def band(self, word):
+        """0 for the most frequent words, higher for rarer ones"""
+        if not self.ranks:
+            # No bundled table for this language, so every word counts as common
+            return 1
+        rank = self.ranks.get(ELISIONS.get(word, word))
+        if rank is None:
+            return len(BAND_EDGES) + 1
+        return bisect_left(BAND_EDGES, rank)
+
+
+class LocalAnalyzer:
+    """
+    Deterministic, offline analysis of a transcript in the same shape as the model's
+    JSON analysis, fast enough to answer instantly while the model is still working.
+
+    Scores come from lexical diversity (MTLD and type-token ratio), frequency-band
+    vocabulary, rule-based grammar checks and filler/repetition counts.
+    Pronunciation can only be estimated from text, so it is scored from the
+    complexity of the words the speaker attempted. Pronunciation guides and
+    vocabulary alternatives come from bundled per-language lookup tables.
+    """
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self.languages = self._bundled_languages(data_dir)
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bundled_languages(data_dir):
+        languages = {DEFAULT_LANGUAGE} | set(GRAMMAR_RULES)
+        directory = os.path.join(data_dir, 'frequency')
+        if os.path.isdir(directory):
+            languages.update(name[:-len('.txt')] for name in os.listdir(directory) if name.endswith('.txt'))
+        return frozenset(languages)
+
+    def tables(self, language):
+        """
+        Tables for ``language``. The name comes from the client, so anything that is
+        not a bundled language gets the default tables; it never reaches a file path.
+        """
+        if language not in self.languages:
+            language = DEFAULT_LANGUAGE
+        tables = self._tables.get(language)
+        if tables is None:
+            with self._lock:
+                tables = self._tables.get(language)
+                if tables is None:
+                    tables = LanguageTables(language, self.data_dir)
+                    self._tables[language] = tables
+        return tables
+
+    def preload(self, languages):
+        for language in languages:
+            self.tables(language)
+
+    @staticmethod
+    def tokenize(transcript, language):
+        tokens = []
+        for match in _WORD_RE.finditer(transcript.casefold().replace('’', "'")):
+            word = match.group()
+            if language == 'french' and "'" in word[:-1]:
+                # l'ami -> l' ami, so elided articles count as their own word
+                head, _, tail = word.partition("'")
+                if head + "'" in ELISIONS:
+                    tokens.append(head + "'")
+                    word = tail
+            tokens.append(word)
+        return tokens
+
+    def analyze(self, transcript, prompt='', language='english'):
+        return self.analyze_batch([(transcript, prompt, language)])[0]
+
+    def analyze_batch(self, items):
+        """Analyze (transcript, prompt, language) tuples; language tables are loaded once per batch"""
+        tables = {language: self.tables(language) for _, _, language in items}
+        return [self._analyze(transcript, tables[language]) for transcript, _, language in items]
+
+    def word_sections(self, transcript, language='english'):
+        """
+        Only the pronunciation and vocabulary scores and feedback, which come from
+        the bundled lookup tables; the model is asked for the other sections
+        """
+        tables = self.tables(language)
+        _, words, length_factor = self._words(transcript, tables)
+        return self._word_sections(words, tables, length_factor)
+
+    def _words(self, transcript, tables):
+        """(all tokens, tokens without fillers, length factor)"""
+        tokens = self.tokenize(transcript, tables.language)
+        words = [token for token in tokens if token not in tables.fillers]
+        # Short answers cannot score full marks however clean they are
+        return tokens, words, 0.5 + 0.5 * min(1.0, len(words) / 40)
+
+    def _analyze(self, transcript, tables):
+        tokens, words, length_factor = self._words(transcript, tables)
+        n = len(words)
+        sentences = [s for s in _SENTENCE_RE.split(transcript) if s.strip()]
+
+        # Rules run within one sentence at a time, so they never match across a full stop
+        grammar_issues, grammar_corrections, explanations = self._grammar(
+            [' '.join(self.tokenize(sentence, tables.language)) for sentence in sentences], tables
+        )
+        grammar = 9.5 - 25 * len(grammar_issues) / max(n, 10)
+
+        fillers = len(tokens) - n
+        repeats = sum(1 for a, b in zip(words, words[1:]) if a == b)
+        fluency = 9.5 - 20 * fillers / max(len(tokens), 10) - 15 * repeats / max(n, 10)
+        fluency_issues, fluency_improvements = [], []
+        if fillers:
+            fluency_issues.append(f"Filler words used {fillers} time{'s' if fillers != 1 else ''}")
+            fluency_improvements.append("Pause silently instead of using filler sounds")
+        if repeats:
+            fluency_issues.append(f"Repeated words ({repeats} restart{'s' if repeats != 1 else ''})")
+            fluency_improvements.append("Plan the next phrase before you start it")
+        if len(sentences) > 1:
+            average = n / len(sentences)
+            if average < 4:
+                fluency -= 1.5
+                fluency_issues.append("Very short, choppy sentences")
+                fluency_improvements.append("Link ideas with words like 'because', 'so' and 'but'")
+            elif average > 35:
+                fluency -= 1.0
+                fluency_issues.append("Very long run-on sentences")
+                fluency_improvements.append("Break long thoughts into two or three sentences")
+        if not fluency_issues:
+            fluency_issues.append("No major fluency issues detected")
+            fluency_improvements.append("Practice with longer answers to build a steady pace")
+
+        word_sections = self._word_sections(words, tables, length_factor)
+        scores = {
+            'grammar_score': _clamp(grammar * length_factor),
+            'fluency_score': _clamp(fluency * length_factor),
+            'pronunciation_score': word_sections['pronunciation_score'],
+            'vocabulary_score': word_sections['vocabulary_score'],
+        }
+        overall = _clamp(sum(scores.values()) / len(scores))
+
+        analysis = dict(word_sections)
+        analysis.update(scores)
+        analysis.update({
+            'overall_score': overall,
+            'grammar_feedback': {
+                'issues': grammar_issues,
+                'corrections': grammar_corrections,
+                'explanation': explanations[0] if explanations else
+                "No common grammar errors detected - keep using complete sentences"
+            },
+            'fluency_feedback': {'issues': fluency_issues, 'improvements': fluency_improvements},
+            'overall_feedback': next(text for limit, text in OVERALL_FEEDBACK if overall < limit or limit == 10),
+            'suggestions': self._suggestions(scores, n)
+        })
+        return analysis
+
+    @staticmethod
+    def _word_sections(words, tables, length_factor):
+        n = len(words)
+        diversity = mtld(words)
+        ttr = len(set(words)) / n if n else 0.0
+        bands = [tables.band(word) for word in words]
+        rare_share = sum(BAND_WEIGHTS[band] for band in bands) / n if n else 0.0
+        vocabulary = 3.5 + 3 * min(1.0, diversity / 60) + 1.5 * ttr + 2 * min(1.0, rare_share / 0.35)
+
+        # Words from the pronunciation table are known to be hard, whatever their length
+        difficult = {
+            word for word in set(words)
+            if word in tables.pronunciation or count_syllables(word, tables.language) >= 3
+        }
+        complex_share = sum(1 for word in words if word in difficult) / n if n else 0.0
+        pronunciation = 7.0 + 2.5 * min(1.0, complex_share / 0.15)
+
+        difficult = sorted(difficult, key=lambda word: (word not in tables.pronunciation, -len(word), word))[:3]
+        basic = [word for word in dict.fromkeys(words) if word in tables.upgrades][:3]
+        return {
+            'pronunciation_score': _clamp(pronunciation * length_factor),
+            'vocabulary_score': _clamp(vocabulary * length_factor),
+            'pronunciation_feedback': {
+                'difficult_words': difficult,
+                # Words missing from the table get a written syllable split instead
+                'correct_pronunciation': [
+                    tables.pronunciation.get(word) or syllabify(word, tables.language) for word in difficult
+                ]
+            },
+            'vocabulary_feedback': {
+                'basic_words_used': basic,
+                'suggested_alternatives': [tables.upgrades.get(word) for word in basic],
+                'context': "Using more specific words makes your speech more engaging and precise"
+                if basic else "Good range of vocabulary - keep adding less common words"
+            },
+        }
+
+    @staticmethod
+    def _grammar(sentences, tables):
+        issues, corrections, explanations = [], [], []
+        found_at = []
+        for position, text in enumerate(sentences):
+            covered = []
+            for pattern, replacements, explanation in tables.rules:
+                for match in pattern.finditer(text):
+                    if any(match.start() < end and start < match.end() for start, end in covered):
+                        continue
+                    covered.append(match.span())
+                    found_at.append((position, match.start()))
+                    groups = match.groups()
+                    prefix = text[match.start():match.start(len(groups))]
+                    replacement = replacements.get(groups[-1], groups[-1])
+                    # Lookahead rules: the word the rule looked at completes the example
+                    tail = text[match.end():].split(' ', 1)[0] if match.group().endswith(' ') else ''
+                    found = ' '.join((match.group().strip() + ' ' + tail).split())
+                    corrected = ' '.join(f"{prefix}{replacement} {tail}".split()).replace("' ", "'")
+                    issues.append(f"'{found}'")
+                    corrections.append(_merge_contraction(groups, corrected, tables.language))
+                    if explanation not in explanations:
+                        explanations.append(explanation)
+        # Report issues in the order they occur in the transcript
+        order = sorted(range(len(issues)), key=found_at.__getitem__)[:5]
+        return [issues[i] for i in order], [corrections[i] for i in order], explanations
+
+    @staticmethod
+    def _suggestions(scores, words):
+        ranked = sorted(scores, key=lambda name: scores[name])
+        suggestions = [SUGGESTIONS['length']] if words < 20 else []
+        for name in ranked:
+            suggestions.append(SUGGESTIONS[name[:-len('_score')]])
+        return suggestions[:3]
+
+
+def _merge_contraction(groups, corrected, language):
+    """Join contracted forms the rules produce ('de' + '' + 'le' -> 'du', 'a el' -> 'al')"""
+    if language == 'french' and len(groups) == 2 and groups[0] in ('de', 'à') and groups[1] in ('le', 'les'):
+        return {('de', 'le'): 'du', ('de', 'les'): 'des', ('à', 'le'): 'au', ('à', 'les'): 'aux'}[groups]
+    if language == 'spanish' and len(groups) == 2 and groups[1] == 'el' and groups[0] in ('a', 'de'):
+        return 'al' if groups[0] == 'a' else 'del'
+    return corrected
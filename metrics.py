@@ -0,0 +1,333 @@
+import bisect
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'speakeasy_'
+
+# Seconds; covers cache hits and local analysis through slow model generations
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def empty(self):
+        return Counter(self.name[len(PREFIX):], self.documentation, self.labelnames)
+
+    def export(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def merge(self, exported):
+        with self._lock:
+            for labels, value in exported:
+                labels = tuple(labels)
+                self._values[labels] = self._values.get(labels, 0) + value
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, _labels(self.labelnames, labels), value) for labels, value in values]
+
+
+class Histogram:
+    """Bucketed observations per label combination, in the cumulative Prometheus layout"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One count per bucket plus +Inf, then the running sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[position] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def empty(self):
+        return Histogram(self.name[len(PREFIX):], self.documentation, self.labelnames, self.buckets)
+
+    def export(self):
+        with self._lock:
+            return [[list(labels), list(values)] for labels, values in self._series.items()]
+
+    def merge(self, exported):
+        with self._lock:
+            for labels, values in exported:
+                if len(values) != len(self.buckets) + 2:
+                    # Written by a process with other buckets, e.g. before a deploy
+                    continue
+                series = self._series.setdefault(tuple(labels), [0] * (len(self.buckets) + 1) + [0.0])
+                for position, value in enumerate(values):
+                    series[position] += value
+
+    def samples(self):
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        samples = []
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                samples.append((
+                    self.name + '_bucket',
+                    _labels(self.labelnames, labels, (('le', _number(bound)),)),
+                    cumulative
+                ))
+            samples.append((self.name + '_sum', _labels(self.labelnames, labels), values[-1]))
+            samples.append((self.name + '_count', _labels(self.labelnames, labels), cumulative))
+        return samples
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    """
+    Metrics rendered in the Prometheus text format. Besides metrics updated in
+    place, collectors are called at scrape time to export the counters and
+    gauges other components already keep; they return
+    [(name, kind, documentation, [(labels dict, value)])].
+
+    With ``directory`` set, the worker processes of one server share their
+    metrics: each writes its values to ``<pid>.json`` there when it renders and
+    at most every ``write_interval`` seconds through ``maybe_write``, and
+    ``render`` adds up every worker's file. Counters and histograms include
+    workers that have exited, so totals never go backwards; gauges only count
+    live workers.
+    """
+
+    def __init__(self, directory=None, write_interval=5):
+        self.directory = directory
+        self.write_interval = write_interval
+        self._metrics = []
+        self._collectors = []
+        self._written_at = 0.0
+        self._write_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        self._collectors.append(fn)
+        return fn
+
+    def _collect(self):
+        families = []
+        for collect in self._collectors:
+            try:
+                families.extend(collect())
+            except Exception as e:
+                logger.error(f"Metrics collector {collect.__name__} failed: {str(e)}")
+        return families
+
+    def write(self, families=None):
+        """Write this process's values for the other workers to merge"""
+        data = {
+            'pid': os.getpid(),
+            'metrics': {metric.name: metric.export() for metric in self._metrics},
+            'families': self._collect() if families is None else families
+        }
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        with self._write_lock:
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(f'{path}.tmp', path)
+            self._written_at = time.monotonic()
+
+    def maybe_write(self):
+        if self.directory and time.monotonic() - self._written_at >= self.write_interval:
+            try:
+                self.write()
+            except OSError as e:
+                logger.error(f"Writing metrics failed: {str(e)}")
+
+    def _merged(self, families):
+        self.write(families)
+        metrics = [metric.empty() for metric in self._metrics]
+        by_name = {metric.name: metric for metric in metrics}
+        gathered = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.json'))):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            live = data['pid'] == os.getpid() or _alive(data['pid'])
+            for name, exported in data['metrics'].items():
+                if name in by_name:
+                    by_name[name].merge(exported)
+            for name, kind, documentation, samples in data['families']:
+                if kind == 'gauge' and not live:
+                    continue
+                values = gathered.setdefault(name, (kind, documentation, {}))[2]
+                for labels, value in samples:
+                    key = tuple(labels.items())
+                    values[key] = values.get(key, 0) + value
+        families = [
+            (name, kind, documentation, [(dict(key), value) for key, value in values.items()])
+            for name, (kind, documentation, values) in gathered.items()
+        ]
+        return metrics, families
+
+    def render(self):
+        metrics, families = self._metrics, self._collect()
+        if self.directory:
+            metrics, families = self._merged(families)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name}{labels} {_number(value)}' for name, labels, value in metric.samples())
+        for name, kind, documentation, samples in families:
+            name = PREFIX + name
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{_labels(labels.keys(), labels.values())} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that can be started and stopped while the app runs.
+    A background thread snapshots every other thread's stack each ``interval``
+    seconds; ``stop`` returns the counts as collapsed stacks ("a;b;c count"
+    lines) ready for flame graph tools. Nothing runs while it is stopped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._stacks = _Tally()
+        self.interval = None
+        self.samples = 0
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval=0.005):
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self.interval = interval
+            self.samples = 0
+            self._stacks = _Tally()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+        logger.info(f"Sampling profiler started, interval {interval * 1000:.1f}ms")
+        return True
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                    frame = frame.f_back
+                self._stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        """Stop sampling and return the collapsed stacks, or None if it was not running"""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return None
+            self._stop.set()
+            thread.join()
+            self._thread = None
+        logger.info(f"Sampling profiler stopped after {self.samples} samples")
+        return ''.join(f'{stack} {count}\n' for stack, count in self._stacks.most_common())
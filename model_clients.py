@@ -0,0 +1,113 @@
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'gemini-pro'
+
+
+class ModelClientManager:
+    """
+    Builds configured GenerativeModel instances once per (model name, config) and
+    shares them between threads.
+
+    Every model created here is bound to the SDK's default generative client, a
+    single long-lived channel that all threads multiplex their requests over,
+    so no request pays for connection setup after the first one.
+
+    The SDK is slow to import, so it is only imported and configured with
+    ``api_key`` when the first model is built.
+    """
+
+    def __init__(self, generation_config=None, safety_settings=None, api_key=None):
+        self.generation_config = generation_config or {}
+        self.safety_settings = safety_settings or []
+        self.api_key = api_key
+        self._configured = False
+        self._models = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._setup_seconds = 0.0
+        self._generation_seconds = 0.0
+        self._models_built = 0
+
+    @staticmethod
+    def _key(model_name, generation_config, safety_settings):
+        return (
+            model_name,
+            json.dumps(generation_config, sort_keys=True),
+            json.dumps(safety_settings, sort_keys=True)
+        )
+
+    def get(self, model_name=DEFAULT_MODEL, generation_config=None, safety_settings=None):
+        """Return the shared model for this name and config, building it on first use"""
+        generation_config = dict(self.generation_config, **(generation_config or {}))
+        safety_settings = safety_settings if safety_settings is not None else self.safety_settings
+        key = self._key(model_name, generation_config, safety_settings)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                self._configure()
+                model = self._build(model_name, generation_config, safety_settings)
+                self._models[key] = model
+                self._models_built += 1
+            return model
+
+    def _configure(self):
+        if self._configured:
+            return
+        import google.generativeai as genai
+
+        if self.api_key:
+            genai.configure(api_key=self.api_key)
+        self._configured = True
+        logger.info("Gemini API configured successfully")
+
+    @staticmethod
+    def _build(model_name, generation_config, safety_settings):
+        import google.generativeai as genai
+        from google.generativeai import client as genai_client
+
+        model = genai.GenerativeModel(
+            model_name,
+            generation_config=generation_config,
+            safety_settings=safety_settings
+        )
+        # Bind the shared client now rather than lazily on the first request,
+        # so concurrent first requests do not race to set it up
+        try:
+            model._client = genai_client.get_default_generative_client()
+        except Exception as e:
+            logger.warning(f"Could not pre-bind generative client: {str(e)}")
+        logger.info(f"Built model client for {model_name}")
+        return model
+
+    def generate(self, prompt, model_name=DEFAULT_MODEL, stream=False, **kwargs):
+        """Call generate_content on the shared model, timing setup and generation separately"""
+        started = time.perf_counter()
+        model = self.get(model_name, **kwargs)
+        setup = time.perf_counter() - started
+        response = model.generate_content(prompt, stream=stream)
+        generation = time.perf_counter() - started - setup
+        with self._stats_lock:
+            self._requests += 1
+            self._setup_seconds += setup
+            self._generation_seconds += generation
+        logger.info(f"Model request setup {setup * 1000:.2f}ms, generation {generation * 1000:.1f}ms")
+        return response
+
+    def stats(self):
+        with self._stats_lock:
+            requests = self._requests
+            return {
+                'models_built': self._models_built,
+                'requests': requests,
+                'avg_setup_ms': round(self._setup_seconds / requests * 1000, 3) if requests else 0.0,
+                'avg_generation_ms': round(self._generation_seconds / requests * 1000, 1) if requests else 0.0
+            }
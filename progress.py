@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+from achievements import PRACTICE_COMPLETED, achievement_engine
+
+XP_PER_LEVEL = 100
+ACHIEVEMENT_XP = 50
+
+
+def level_for_xp(xp):
+    """Level up logic (100 XP per level)"""
+    return (xp // XP_PER_LEVEL) + 1
+
+
+def apply_practice(state, score, today=None):
+    """
+    Apply one completed practice session to a user's state in place.
+
+    ``state`` holds the user's counters (sessions, total_score, xp, level, streak,
+    last_practice_date) plus an ``achievements`` set. Storage backends call this
+    while holding the user's lock or transaction, so the whole update lands as a
+    single unit. Returns what changed, for the feedback response.
+    """
+    today = today or date.today()
+
+    # Update session count and score
+    state['sessions'] += 1
+    state['total_score'] += score
+
+    # Update XP
+    xp_gained = int(score * 10)
+    state['xp'] += xp_gained
+
+    # Update streak
+    last_date = state['last_practice_date']
+    if last_date:
+        if last_date == (today - timedelta(days=1)).isoformat():
+            state['streak'] += 1
+        elif last_date != today.isoformat():
+            # Reset streak if not consecutive days
+            state['streak'] = 1
+    else:
+        state['streak'] = 1
+    state['last_practice_date'] = today.isoformat()
+
+    # Only the rules listening for completed practices are evaluated
+    new_achievements = achievement_engine.evaluate(PRACTICE_COMPLETED, {
+        'sessions': state['sessions'],
+        'score': score,
+        'streak': state['streak']
+    }, state['achievements'])
+    state['achievements'].update(new_achievements)
+    state['xp'] += ACHIEVEMENT_XP * len(new_achievements)
+
+    # Level is derived last so XP from achievements counts too
+    new_level = level_for_xp(state['xp'])
+    level_up = new_level > state['level']
+    state['level'] = new_level
+
+    return {
+        'xp_gained': xp_gained,
+        'level_up': level_up,
+        'new_level': new_level if level_up else None,
+        'total_xp': state['xp'],
+        'streak': state['streak'],
+        'new_achievements': new_achievements
+    }
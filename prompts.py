@@ -0,0 +1,198 @@
+import logging
+import re
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Marks the part of an over-long transcript that was left out of the prompt
+TRUNCATION_MARKER = ' [...] '
+
+# Share of a truncated transcript kept from its start; the rest comes from its end
+HEAD_SHARE = 0.75
+
+# Pronunciation and vocabulary feedback come from the local lookup tables and the
+# overall score is averaged on the server, so the model only covers the rest
+ANALYSIS_JSON_FORMAT = """{
+    "grammar_score": <number between 0-10>,
+    "fluency_score": <number between 0-10>,
+    "grammar_feedback": {
+        "issues": ["<specific grammar mistake 1>", "<specific grammar mistake 2>"],
+        "corrections": ["<corrected version 1>", "<corrected version 2>"],
+        "explanation": "<brief explanation of the grammar rules>"
+    },
+    "fluency_feedback": {
+        "issues": ["<specific fluency issue 1>", "<specific fluency issue 2>"],
+        "improvements": ["<how to improve 1>", "<how to improve 2>"]
+    },
+    "overall_feedback": "<2-3 sentences of general feedback>",
+    "suggestions": [
+        "<specific actionable suggestion 1>",
+        "<specific actionable suggestion 2>",
+        "<specific actionable suggestion 3>"
+    ]
+}"""
+
+# The instruction blocks only depend on the language, so they come first and are
+# compiled once per language; the prompt and the student's answers follow them.
+ANALYSIS_INSTRUCTIONS = """You are a language learning assistant. Analyze the {language} speech response below and provide detailed grammar and fluency feedback with specific examples and improvements.
+
+Provide the feedback in the following JSON format exactly:
+{json_format}
+
+Important:
+1. Provide specific examples from the student's response
+2. Give clear, actionable corrections
+3. Include brief explanations of rules or patterns
+4. A response containing "[...]" was shortened; do not comment on the missing part
+5. Respond ONLY with the JSON object, no other text
+
+Language: {language}
+"""
+
+BATCH_INSTRUCTIONS = """You are a language learning assistant. Analyze each of the {language} speech responses below independently and provide detailed grammar and fluency feedback with specific examples and improvements.
+
+Respond with a JSON array containing one object per response, in the same order. Each object must have an "index" field with the response number, plus the following fields exactly:
+{json_format}
+
+Important:
+1. Analyze every response on its own, never compare them
+2. Provide specific examples from each student's response
+3. Give clear, actionable corrections
+4. A response containing "[...]" was shortened; do not comment on the missing part
+5. Respond ONLY with the JSON array, no other text
+
+Language: {language}
+"""
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+BuiltPrompt = namedtuple('BuiltPrompt', ['text', 'tokens', 'truncated'])
+
+
+def estimate_tokens(text):
+    """
+    Approximate model token count without a round trip to the API: about four
+    characters per token, but never fewer than one per word or punctuation mark
+    """
+    if not text:
+        return 0
+    return max(len(_TOKEN_PIECES.findall(text)), (len(text) + 3) // 4)
+
+
+def truncate_transcript(transcript, max_tokens):
+    """
+    Collapse whitespace and, if the transcript is still over ``max_tokens``,
+    keep its start and end joined by TRUNCATION_MARKER. Cuts fall on word
+    boundaries. Returns (text, truncated).
+    """
+    text = ' '.join(transcript.split())
+    tokens = estimate_tokens(text)
+    if not max_tokens or tokens <= max_tokens:
+        return text, False
+
+    words = text.split(' ')
+    # Scale the kept share down until the estimate fits; usually one pass
+    keep = len(words) * max_tokens / tokens
+    while True:
+        head = max(1, int(keep * HEAD_SHARE))
+        tail = max(0, int(keep) - head)
+        if head + tail >= len(words):
+            head, tail = len(words), 0
+        shortened = ' '.join(words[:head]) + TRUNCATION_MARKER + ' '.join(words[len(words) - tail:] if tail else [])
+        if estimate_tokens(shortened) <= max_tokens or head == 1:
+            return shortened.rstrip(), True
+        keep *= 0.9
+
+
+class PromptBuilder:
+    """
+    Builds analysis prompts from instruction blocks compiled once per language,
+    with every transcript trimmed to ``max_transcript_tokens`` (0 for no limit)
+    """
+
+    def __init__(self, max_transcript_tokens=800):
+        self.max_transcript_tokens = max_transcript_tokens
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def _instructions(self, template, language):
+        key = (template, language)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            text = template.format(language=language, json_format=ANALYSIS_JSON_FORMAT)
+            compiled = (text, estimate_tokens(text))
+            with self._lock:
+                self._compiled[key] = compiled
+        return compiled
+
+    def analysis(self, transcript, prompt, language):
+        """Prompt asking for a JSON analysis of one response"""
+        instructions, instruction_tokens = self._instructions(ANALYSIS_INSTRUCTIONS, language)
+        response, truncated = truncate_transcript(transcript, self.max_transcript_tokens)
+        details = f'Original Prompt: "{prompt}"\nStudent\'s Response: "{response}"'
+        return BuiltPrompt(instructions + details, instruction_tokens + estimate_tokens(details), truncated)
+
+    def batch_analysis(self, transcripts, prompt, language):
+        """Prompt asking for a JSON array with an analysis of each response, in order"""
+        instructions, instruction_tokens = self._instructions(BATCH_INSTRUCTIONS, language)
+        responses = []
+        truncated = False
+        for index, transcript in enumerate(transcripts):
+            response, cut = truncate_transcript(transcript, self.max_transcript_tokens)
+            truncated = truncated or cut
+            responses.append(f'{index}. "{response}"')
+        details = (
+            f'Original Prompt: "{prompt}"\n'
+            f"Students' Responses ({len(transcripts)}, one JSON object each):\n" + '\n'.join(responses)
+        )
+        return BuiltPrompt(instructions + details, instruction_tokens + estimate_tokens(details), truncated)
+
+
+def response_tokens(response, text):
+    """
+    (prompt tokens, response tokens) reported by the model, or (None, estimate
+    from ``text``) for SDK versions whose responses carry no usage metadata
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None and getattr(usage, 'candidates_token_count', None):
+        return usage.prompt_token_count, usage.candidates_token_count
+    return None, estimate_tokens(text)
+
+
+class TokenUsage:
+    """Running totals of prompt and response tokens across model requests"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._prompt_tokens = 0
+        self._response_tokens = 0
+        self._truncated = 0
+
+    def record(self, built, response, text):
+        """Log and count one request's tokens; returns (prompt tokens, response tokens)"""
+        reported, generated = response_tokens(response, text)
+        prompt_tokens = reported or built.tokens
+        with self._lock:
+            self._requests += 1
+            self._prompt_tokens += prompt_tokens
+            self._response_tokens += generated
+            self._truncated += built.truncated
+        logger.info(
+            f"Model request used {prompt_tokens} prompt tokens"
+            f"{' (transcript truncated)' if built.truncated else ''}, {generated} response tokens"
+        )
+        return prompt_tokens, generated
+
+    def stats(self):
+        with self._lock:
+            requests = self._requests
+            return {
+                'requests': requests,
+                'prompt_tokens': self._prompt_tokens,
+                'response_tokens': self._response_tokens,
+                'avg_prompt_tokens': round(self._prompt_tokens / requests, 1) if requests else 0.0,
+                'avg_response_tokens': round(self._response_tokens / requests, 1) if requests else 0.0,
+                'truncated_requests': self._truncated
+            }
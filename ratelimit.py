@@ -0,0 +1,244 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from storage import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# ``reset`` is seconds until the bucket is full again (or the quota renews),
+# ``retry_after`` seconds until the next request would be allowed (0 when allowed)
+Decision = namedtuple('Decision', 'allowed limit remaining reset retry_after')
+
+RATE_LIMIT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+    bucket TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS model_quota (
+    subject TEXT NOT NULL,
+    day TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    PRIMARY KEY (subject, day)
+);
+"""
+
+
+def _seconds_until_tomorrow():
+    now = datetime.now()
+    return max(math.ceil((datetime.combine(now.date() + timedelta(days=1), datetime.min.time()) - now).total_seconds()), 1)
+
+
+class MemoryBuckets:
+    """
+    Token buckets and daily counters for a single process. Each check is one
+    dict lookup and a little arithmetic. Buckets left alone for ``idle_after``
+    seconds have refilled, and counters from earlier days have expired, so both
+    are dropped, at most once per ``sweep_interval``.
+    """
+
+    def __init__(self, sweep_interval=300, idle_after=3600):
+        self.sweep_interval = sweep_interval
+        self.idle_after = idle_after
+        self._buckets = {}
+        self._quotas = {}
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def take(self, bucket, rate, capacity, now):
+        """(allowed, tokens left) after trying to take one token from ``bucket``"""
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            tokens, updated_at = self._buckets.get(bucket, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[bucket] = (tokens, now)
+            return allowed, tokens
+
+    def refund(self, bucket, capacity):
+        """Put back a token taken from ``bucket`` for a request that was refused elsewhere"""
+        with self._lock:
+            state = self._buckets.get(bucket)
+            if state is not None:
+                self._buckets[bucket] = (min(capacity, state[0] + 1), state[1])
+
+    def _sweep(self, now):
+        self._next_sweep = now + self.sweep_interval
+        self._buckets = {
+            bucket: state for bucket, state in self._buckets.items() if now - state[1] < self.idle_after
+        }
+        today = date.today().isoformat()
+        self._quotas = {subject: state for subject, state in self._quotas.items() if state[0] == today}
+
+    def count(self, subject, day, limit):
+        """(allowed, calls used today) after trying to count one call for ``subject``"""
+        with self._lock:
+            counted_day, calls = self._quotas.get(subject, (day, 0))
+            if counted_day != day:
+                calls = 0
+            allowed = calls < limit
+            if allowed:
+                calls += 1
+            self._quotas[subject] = (day, calls)
+            return allowed, calls
+
+
+class SQLiteBuckets:
+    """
+    Token buckets and daily counters in a SQLite database that every worker
+    process shares. Each check is a single upsert on a primary key.
+    """
+
+    def __init__(self, path, pool_size=5, sweep_interval=300, idle_after=3600):
+        self.pool = ConnectionPool(path, size=pool_size)
+        self.sweep_interval = sweep_interval
+        self.idle_after = idle_after
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        with self.pool.connection() as conn:
+            conn.executescript(RATE_LIMIT_SCHEMA)
+
+    def take(self, bucket, rate, capacity, now):
+        self._maybe_sweep(now)
+        with self.pool.connection() as conn:
+            # The update only happens when a token is available; otherwise no row comes back
+            row = conn.execute(
+                "INSERT INTO rate_limit_buckets (bucket, tokens, updated_at) VALUES (?1, ?2 - 1, ?3) "
+                "ON CONFLICT(bucket) DO UPDATE SET "
+                "tokens = min(?2, tokens + (?3 - updated_at) * ?4) - 1, updated_at = ?3 "
+                "WHERE min(?2, tokens + (?3 - updated_at) * ?4) >= 1 "
+                "RETURNING tokens",
+                (bucket, capacity, now, rate)
+            ).fetchone()
+            if row is not None:
+                return True, row['tokens']
+            row = conn.execute(
+                "SELECT min(?2, tokens + (?3 - updated_at) * ?4) AS tokens FROM rate_limit_buckets WHERE bucket = ?1",
+                (bucket, capacity, now, rate)
+            ).fetchone()
+            return False, row['tokens'] if row is not None else 0.0
+
+    def refund(self, bucket, capacity):
+        with self.pool.connection() as conn:
+            conn.execute(
+                "UPDATE rate_limit_buckets SET tokens = min(?2, tokens + 1) WHERE bucket = ?1",
+                (bucket, capacity)
+            )
+
+    def count(self, subject, day, limit):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "INSERT INTO model_quota (subject, day, calls) VALUES (?1, ?2, 1) "
+                "ON CONFLICT(subject, day) DO UPDATE SET calls = calls + 1 WHERE calls < ?3 "
+                "RETURNING calls",
+                (subject, day, limit)
+            ).fetchone()
+            if row is not None:
+                return True, row['calls']
+            return False, limit
+
+    def _maybe_sweep(self, now):
+        if now < self._next_sweep or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sweep = now + self.sweep_interval
+            with self.pool.connection() as conn:
+                conn.execute("DELETE FROM rate_limit_buckets WHERE updated_at < ?", (now - self.idle_after,))
+                conn.execute("DELETE FROM model_quota WHERE day < ?", (date.today().isoformat(),))
+        except Exception as e:
+            logger.error(f"Rate limit sweep failed: {str(e)}")
+        finally:
+            self._sweep_lock.release()
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limits plus daily model-call quotas.
+
+    ``limits`` maps a kind of client key, such as 'user' or 'ip', to
+    (per_minute, burst): each key gets a bucket holding up to ``burst``
+    requests that refills at ``per_minute`` requests a minute, so a client can
+    make a short burst but not keep up more than the steady rate. A request
+    must get a token from the bucket of every key it is checked against; when
+    one refuses, the tokens already taken from the others are put back.
+    ``daily_quota`` caps model calls per subject and calendar day (0 disables it).
+    """
+
+    def __init__(self, store, limits, daily_quota=0):
+        self.store = store
+        self.limits = {kind: (per_minute / 60.0, burst) for kind, (per_minute, burst) in limits.items() if per_minute > 0}
+        self.daily_quota = daily_quota
+        self.limited = 0
+        self.quota_exceeded = 0
+
+    def check(self, keys, now=None):
+        """
+        Take a token for each of ``keys`` ({kind: key}; None keys are skipped),
+        or none at all when any bucket is empty.
+        Returns the decision of the bucket that refused, or else of the one with
+        the fewest tokens left, or None when no limit applies.
+        """
+        now = time.time() if now is None else now
+        decision = None
+        taken = []
+        for kind, key in keys.items():
+            if key is None or kind not in self.limits:
+                continue
+            rate, burst = self.limits[kind]
+            bucket = f'{kind}:{key}'
+            allowed, tokens = self.store.take(bucket, rate, burst, now)
+            current = Decision(
+                allowed=allowed,
+                limit=burst,
+                remaining=max(int(tokens), 0),
+                reset=math.ceil((burst - tokens) / rate),
+                retry_after=0 if allowed else max(math.ceil((1 - tokens) / rate), 1)
+            )
+            if not allowed:
+                self.limited += 1
+                for charged, capacity in taken:
+                    self.store.refund(charged, capacity)
+                return current
+            taken.append((bucket, burst))
+            if decision is None or current.remaining < decision.remaining:
+                decision = current
+        return decision
+
+    def consume_quota(self, subject, today=None):
+        """Count one model call against ``subject``'s daily quota"""
+        day = (today or date.today()).isoformat()
+        allowed, calls = self.store.count(subject, day, self.daily_quota)
+        reset = _seconds_until_tomorrow()
+        if not allowed:
+            self.quota_exceeded += 1
+        return Decision(
+            allowed=allowed,
+            limit=self.daily_quota,
+            remaining=max(self.daily_quota - calls, 0),
+            reset=reset,
+            retry_after=0 if allowed else reset
+        )
+
+    def stats(self):
+        return {'limited': self.limited, 'quota_exceeded': self.quota_exceeded}
+
+
+def build_rate_limiter(backend='memory', limits=None, daily_quota=0, path='speakeasy.sqlite3'):
+    """Create the rate limiter for the configured backend name"""
+    if backend == 'sqlite':
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        store = SQLiteBuckets(path)
+    else:
+        if backend != 'memory':
+            logger.warning(f"Unknown rate limit backend '{backend}', using in-memory buckets")
+        store = MemoryBuckets()
+    return RateLimiter(store, limits or {}, daily_quota=daily_quota)
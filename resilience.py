@@ -0,0 +1,255 @@
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that is currently considered unhealthy"""
+
+
+# Raised by the SDK's transport when the upstream cannot be reached in time; anything
+# else without a status code is a bug on our side and retrying it would not help
+TRANSIENT_ERRORS = (TimeoutError, ConnectionError)
+
+
+def status_code(error):
+    """HTTP-style status of an upstream error (the SDK sets ``code``), or None"""
+    code = getattr(error, 'code', None)
+    return code if isinstance(code, int) and not isinstance(code, bool) else None
+
+
+def is_retryable(error):
+    """Retry timeouts, connection problems, throttling and server errors, not bad requests or bugs"""
+    code = status_code(error)
+    if code is not None:
+        return code == 429 or code >= 500
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures. While open every call
+    is refused until ``reset_timeout`` has passed; then a single probe call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Circuit closed, upstream recovered")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release(self):
+        """End a call that said nothing about the upstream's health, freeing a half-open probe"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuit opened after {self._failures} consecutive failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies"""
+
+    def __init__(self, size=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._sorted = None
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._sorted = None
+
+    def percentile(self, p):
+        """Return the p-th percentile, or None until enough samples have been seen"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            if self._sorted is None:
+                self._sorted = sorted(self._samples)
+            index = min(len(self._sorted) - 1, int(len(self._sorted) * p / 100))
+            return self._sorted[index]
+
+
+class ResilientCaller:
+    """
+    Runs upstream calls with a per-attempt deadline, an overall time budget,
+    exponential backoff with full jitter between retries, a circuit breaker and,
+    optionally, a hedged second request once an attempt runs past the recent
+    p95 latency (the first successful response wins).
+    """
+
+    def __init__(self, breaker=None, attempt_timeout=15.0, max_attempts=3, backoff_base=0.25,
+                 backoff_max=4.0, budget=25.0, hedge=False, hedge_percentile=95, max_threads=16):
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.budget = budget
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        # Attempts run here so a stuck call can be abandoned when its deadline passes
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='model-call')
+        self._stats_lock = threading.Lock()
+        self._counts = {'calls': 0, 'retries': 0, 'timeouts': 0, 'hedges': 0, 'short_circuited': 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._counts[name] += 1
+
+    def call(self, fn, hedge=None):
+        hedge = self.hedge if hedge is None else hedge
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise CircuitOpenError("Model upstream is unavailable, circuit is open")
+        self._count('calls')
+
+        deadline = time.monotonic() + self.budget
+        last_error = None
+        for attempt in range(self.max_attempts):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                result = self._attempt(fn, min(self.attempt_timeout, remaining), hedge)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                last_error = e
+                if not is_retryable(e):
+                    if status_code(e) is not None:
+                        # The upstream answered, it just rejected this request
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                logger.warning(f"Model call attempt {attempt + 1} failed: {str(e)}")
+                if self.breaker.state == CircuitBreaker.OPEN or attempt == self.max_attempts - 1:
+                    break
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                delay = min(delay, max(0.0, deadline - time.monotonic()))
+                self._count('retries')
+                time.sleep(delay)
+        raise last_error or TimeoutError("Model call budget exhausted")
+
+    def iterate(self, chunks, deadline):
+        """
+        Yield the chunks of a streamed response until ``deadline`` (a time.monotonic()
+        value), then raise TimeoutError however slowly the upstream is sending.
+        Chunks are read on the call executor so a stalled stream can be abandoned.
+        """
+        received = queue.Queue()
+        stopped = threading.Event()
+        finished = object()
+
+        def pump():
+            try:
+                for chunk in chunks:
+                    received.put((chunk, None))
+                    if stopped.is_set():
+                        return
+                received.put((finished, None))
+            except Exception as e:
+                received.put((None, e))
+
+        self._executor.submit(pump)
+        try:
+            while True:
+                try:
+                    chunk, error = received.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    self._count('timeouts')
+                    self.breaker.record_failure()
+                    raise TimeoutError("Streamed model response passed its deadline")
+                if error is not None:
+                    if is_retryable(error):
+                        self.breaker.record_failure()
+                    raise error
+                if chunk is finished:
+                    return
+                yield chunk
+        finally:
+            stopped.set()
+
+    def _attempt(self, fn, timeout, hedge):
+        started = time.monotonic()
+        futures = [self._executor.submit(fn)]
+
+        hedge_after = self.latency.percentile(self.hedge_percentile) if hedge else None
+        if hedge_after is not None and hedge_after < timeout:
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done:
+                self._count('hedges')
+                futures.append(self._executor.submit(fn))
+
+        error = None
+        while futures:
+            remaining = timeout - (time.monotonic() - started)
+            done, pending = wait(futures, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+            if not done:
+                self._count('timeouts')
+                raise TimeoutError(f"Model call exceeded {timeout:.1f}s")
+            for future in done:
+                if future.exception() is None:
+                    self.latency.add(time.monotonic() - started)
+                    return future.result()
+                error = future.exception()
+            futures = list(pending)
+        raise error
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._counts)
+        p95 = self.latency.percentile(95)
+        stats['circuit'] = self.breaker.state
+        stats['p95_ms'] = round(p95 * 1000, 1) if p95 is not None else None
+        return stats
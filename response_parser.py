@@ -0,0 +1,287 @@
+import json
+import re
+from dataclasses import asdict, dataclass, field
+
+
+class ResponseParseError(ValueError):
+    """Raised when a model response cannot be turned into a valid analysis"""
+
+
+SCORE_FIELDS = ('grammar_score', 'fluency_score', 'pronunciation_score', 'vocabulary_score')
+
+
+@dataclass
+class GrammarFeedback:
+    issues: list = field(default_factory=list)
+    corrections: list = field(default_factory=list)
+    explanation: str = ''
+
+
+@dataclass
+class FluencyFeedback:
+    issues: list = field(default_factory=list)
+    improvements: list = field(default_factory=list)
+
+
+@dataclass
+class PronunciationFeedback:
+    difficult_words: list = field(default_factory=list)
+    correct_pronunciation: list = field(default_factory=list)
+
+
+@dataclass
+class VocabularyFeedback:
+    basic_words_used: list = field(default_factory=list)
+    suggested_alternatives: list = field(default_factory=list)
+    context: str = ''
+
+
+@dataclass
+class Analysis:
+    grammar_score: float
+    fluency_score: float
+    pronunciation_score: float
+    vocabulary_score: float
+    overall_score: float
+    grammar_feedback: GrammarFeedback = field(default_factory=GrammarFeedback)
+    fluency_feedback: FluencyFeedback = field(default_factory=FluencyFeedback)
+    pronunciation_feedback: PronunciationFeedback = field(default_factory=PronunciationFeedback)
+    vocabulary_feedback: VocabularyFeedback = field(default_factory=VocabularyFeedback)
+    overall_feedback: str = ''
+    suggestions: list = field(default_factory=list)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+# Nested feedback objects and the type of each of their fields
+FEEDBACK_SCHEMAS = {
+    'grammar_feedback': (GrammarFeedback, {'issues': list, 'corrections': list, 'explanation': str}),
+    'fluency_feedback': (FluencyFeedback, {'issues': list, 'improvements': list}),
+    'pronunciation_feedback': (PronunciationFeedback, {'difficult_words': list, 'correct_pronunciation': list}),
+    'vocabulary_feedback': (VocabularyFeedback, {
+        'basic_words_used': list, 'suggested_alternatives': list, 'context': str
+    }),
+}
+
+_NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+_WHITESPACE = ' \t\r\n'
+
+
+def _coerce_score(value, name):
+    if isinstance(value, bool):
+        raise ResponseParseError(f"Invalid value for {name}: {value!r}")
+    if isinstance(value, (int, float)):
+        score = float(value)
+    elif isinstance(value, str) and _NUMBER_RE.search(value):
+        # Accept "8", "8.5/10" or "8 out of 10"
+        score = float(_NUMBER_RE.search(value).group())
+    else:
+        raise ResponseParseError(f"Invalid value for {name}: {value!r}")
+    return min(max(score, 0.0), 10.0)
+
+
+def _coerce_list(value):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    return [str(item) for item in value if item is not None]
+
+
+def _coerce_str(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ' '.join(str(item) for item in value)
+    return str(value)
+
+
+def coerce_field(name, value):
+    """Normalize one top-level analysis field, filling nested defaults"""
+    if name in SCORE_FIELDS or name == 'overall_score':
+        return _coerce_score(value, name)
+    if name in FEEDBACK_SCHEMAS:
+        _, fields = FEEDBACK_SCHEMAS[name]
+        if not isinstance(value, dict):
+            value = {}
+        return {
+            key: _coerce_list(value.get(key)) if kind is list else _coerce_str(value.get(key))
+            for key, kind in fields.items()
+        }
+    if name == 'suggestions':
+        return _coerce_list(value)
+    if name == 'overall_feedback':
+        return _coerce_str(value)
+    return value
+
+
+def overall_score(scores):
+    """Mean of the section scores, for analyses that come without an overall score"""
+    return round(sum(scores[name] for name in SCORE_FIELDS) / len(SCORE_FIELDS), 1)
+
+
+def validate_analysis(data, local=None):
+    """
+    Check a decoded analysis against the schema and return a typed Analysis.
+    ``local`` holds fields computed on the server, which replace any the model sent.
+    """
+    if not isinstance(data, dict):
+        raise ResponseParseError(f"Expected a JSON object, got {type(data).__name__}")
+    if local:
+        data = {**data, **local}
+    missing = [name for name in SCORE_FIELDS if data.get(name) is None]
+    if missing:
+        raise ResponseParseError(f"Missing required fields: {', '.join(missing)}")
+
+    values = {name: coerce_field(name, data[name]) for name in SCORE_FIELDS}
+    if data.get('overall_score') is not None:
+        values['overall_score'] = coerce_field('overall_score', data['overall_score'])
+    else:
+        values['overall_score'] = overall_score(values)
+    for name, (cls, _) in FEEDBACK_SCHEMAS.items():
+        values[name] = cls(**coerce_field(name, data.get(name)))
+    values['overall_feedback'] = coerce_field('overall_feedback', data.get('overall_feedback'))
+    values['suggestions'] = coerce_field('suggestions', data.get('suggestions'))
+    return Analysis(**values)
+
+
+def _repair_json(text, start):
+    """
+    Copy the JSON value starting at ``text[start]`` in a single pass, fixing
+    trailing commas, unescaped quotes and raw control characters inside strings,
+    and closing anything left open by a truncated response.
+
+    Returns ``(repaired, fallback)``. ``fallback`` is only set for truncated
+    input: the text cut back to the last complete member, for when the
+    member the response stopped in cannot be closed into valid JSON.
+    """
+    out = []
+    closers = []
+    # Output length and open containers after the last complete member
+    safe = (0, [])
+    in_string = False
+    i = start
+    n = len(text)
+    while i < n:
+        char = text[i]
+        if in_string:
+            if char == '\\' and i + 1 < n:
+                out.append(text[i:i + 2])
+                i += 2
+                continue
+            if char == '"':
+                # Only treat the quote as closing if what follows can follow a string
+                j = i + 1
+                while j < n and text[j] in _WHITESPACE:
+                    j += 1
+                if j >= n or text[j] in ',:}]':
+                    in_string = False
+                    out.append(char)
+                else:
+                    out.append('\\"')
+            elif char == '\n':
+                out.append('\\n')
+            elif char == '\r':
+                out.append('\\r')
+            elif char == '\t':
+                out.append('\\t')
+            else:
+                out.append(char)
+        elif char == '"':
+            in_string = True
+            out.append(char)
+        elif char in '{[':
+            closers.append('}' if char == '{' else ']')
+            out.append(char)
+            safe = (len(out), list(closers))
+        elif char in '}]':
+            _strip_trailing_comma(out)
+            if closers:
+                out.append(closers.pop())
+            if not closers:
+                return ''.join(out), None
+        elif char == ',':
+            safe = (len(out), list(closers))
+            out.append(char)
+        else:
+            out.append(char)
+        i += 1
+
+    # Truncated response: close the open string and containers
+    if in_string:
+        out.append('"')
+    _strip_trailing_comma(out)
+    if out and out[-1] == ':':
+        out.append('null')
+    out.extend(reversed(closers))
+    length, open_closers = safe
+    fallback = out[:length]
+    _strip_trailing_comma(fallback)
+    fallback.extend(reversed(open_closers))
+    return ''.join(out), ''.join(fallback)
+
+
+def _strip_trailing_comma(out):
+    while out and out[-1] in _WHITESPACE:
+        out.pop()
+    if out and out[-1] == ',':
+        out.pop()
+
+
+_decoder = json.JSONDecoder()
+
+
+def extract_json(text, opener='{'):
+    """Decode the first JSON object (or array, with opener='[') found in ``text``"""
+    start = text.find(opener) if text else -1
+    if start < 0:
+        raise ResponseParseError(f"No JSON {'object' if opener == '{' else 'array'} found in response")
+    try:
+        # Fast path: well-formed JSON, possibly surrounded by fences or prose
+        value, _ = _decoder.raw_decode(text, start)
+        return value
+    except json.JSONDecodeError:
+        pass
+    repaired, fallback = _repair_json(text, start)
+    try:
+        return json.loads(repaired)
+    except json.JSONDecodeError as e:
+        if fallback is not None:
+            try:
+                return json.loads(fallback)
+            except json.JSONDecodeError:
+                pass
+        raise ResponseParseError(f"Unrecoverable JSON in response: {str(e)}") from e
+
+
+def parse_analysis(text, local=None):
+    """
+    Parse one model response into a typed Analysis, completed with the ``local`` fields.
+
+    Fences, surrounding prose, trailing commas, unescaped quotes, raw newlines and
+    truncated output are repaired; ResponseParseError means the response is unusable.
+    """
+    return validate_analysis(extract_json(text, '{'), local)
+
+
+def parse_analysis_list(text, count, local=None):
+    """
+    Parse a batched response into {index: Analysis}, skipping entries that are
+    unusable. ``local`` optionally lists the local fields for each index.
+    """
+    items = extract_json(text, '[')
+    analyses = {}
+    if not isinstance(items, list):
+        return analyses
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        index = item.get('index', position)
+        if not isinstance(index, int) or not 0 <= index < count or index in analyses:
+            continue
+        try:
+            analyses[index] = validate_analysis(item, local[index] if local else None)
+        except ResponseParseError:
+            continue
+    return analyses
@@ -0,0 +1,157 @@
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import timedelta
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from storage import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at);
+"""
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session contents loaded from the store; the cookie only carries the id"""
+
+    def __init__(self, initial=None, session_id=None, expires_at=None):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.session_id = session_id
+        self.expires_at = expires_at
+        self.modified = False
+
+
+class SQLiteSessionInterface(SessionInterface):
+    """
+    Sessions kept in a SQLite table that every worker process shares.
+
+    The cookie holds a random session id, signed with the app's secret key.
+    Sessions expire ``lifetime`` after they were last saved. A session used in
+    the last half of its lifetime is saved again to extend it, so reads stay
+    read-only most of the time. Expired rows are deleted at most once per
+    ``sweep_interval`` seconds per process, by whichever request comes first.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, path, lifetime=timedelta(days=30), sweep_interval=3600, pool_size=5):
+        self.pool = ConnectionPool(path, size=pool_size)
+        self.lifetime = lifetime.total_seconds()
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        with self.pool.connection() as conn:
+            conn.executescript(SESSION_SCHEMA)
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='speakeasy-session', key_derivation='hmac')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                session_id = self._signer(app).unsign(cookie).decode('ascii')
+            except BadSignature:
+                session_id = None
+            if session_id:
+                with self.pool.connection() as conn:
+                    row = conn.execute(
+                        "SELECT data, expires_at FROM sessions WHERE session_id = ? AND expires_at > ?",
+                        (session_id, time.time())
+                    ).fetchone()
+                if row is not None:
+                    return ServerSideSession(self.serializer.loads(row['data']), session_id, row['expires_at'])
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        now = time.time()
+        self._maybe_sweep(now)
+
+        if not session:
+            if session.modified and session.session_id:
+                with self.pool.connection() as conn:
+                    conn.execute("DELETE FROM sessions WHERE session_id = ?", (session.session_id,))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        renew = session.expires_at is not None and session.expires_at - now < self.lifetime / 2
+        if not (session.modified or renew or session.session_id is None):
+            return
+        if session.session_id is None:
+            session.session_id = secrets.token_urlsafe(32)
+        expires_at = now + self.lifetime
+        with self.pool.connection() as conn:
+            conn.execute(
+                "INSERT INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+                (session.session_id, self.serializer.dumps(dict(session)), expires_at)
+            )
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.session_id).decode('ascii'),
+            max_age=int(self.lifetime),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            httponly=self.get_cookie_httponly(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+    def _maybe_sweep(self, now):
+        if now < self._next_sweep or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sweep = now + self.sweep_interval
+            with self.pool.connection() as conn:
+                removed = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+            if removed:
+                logger.info(f"Removed {removed} expired sessions")
+        except Exception as e:
+            logger.error(f"Session sweep failed: {str(e)}")
+        finally:
+            self._sweep_lock.release()
+
+
+def load_secret_key(path):
+    """
+    Read the secret key kept in ``path``, creating it on first use, so every
+    worker process and every restart signs sessions with the same key
+    """
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    # Written in full under a temporary name, then linked into place; when several
+    # workers start at once, only the first link succeeds and all read that key
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with os.fdopen(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+        f.write(secrets.token_hex(32))
+    try:
+        os.link(temporary, path)
+        logger.info(f"Generated a new secret key in {path}")
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(temporary)
+    with open(path) as f:
+        return f.read().strip()
@@ -0,0 +1,468 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import date, datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    # Optional; without it statistics are computed with a plain loop over the columns
+    np = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SPKSNAP1'
+SUFFIX = '.spk'
+
+# Practice times are kept as whole seconds since this naive epoch, matching the
+# naive local timestamps the user stores record
+EPOCH = datetime(1970, 1, 1)
+
+# Column name -> array typecode, per table. Strings are written once to the
+# file's string table and referenced by index ('I' columns). A list-valued user
+# field is an offsets column (one entry per user plus one) into a values column;
+# a user's cards and sessions are contiguous runs of the card and session tables,
+# and so are their all-time per-language and per-day history aggregates.
+COLUMNS = {
+    'user.id': 'I',
+    'user.sessions': 'q',
+    'user.total_score': 'd',
+    'user.xp': 'q',
+    'user.level': 'q',
+    'user.streak': 'q',
+    'user.last_practice_date': 'q',
+    'user.last_session': 'q',
+    'user.achievements.offsets': 'Q',
+    'user.achievements': 'I',
+    'user.languages.offsets': 'Q',
+    'user.languages': 'I',
+    'user.cards.offsets': 'Q',
+    'user.log.offsets': 'Q',
+    'user.language_stats.offsets': 'Q',
+    'user.daily_stats.offsets': 'Q',
+    'card.word': 'I',
+    'card.due': 'q',
+    'card.interval': 'q',
+    'card.repetitions': 'q',
+    'card.ease': 'd',
+    'card.lapses': 'q',
+    'language_stat.language': 'I',
+    'language_stat.sessions': 'q',
+    'language_stat.total_score': 'd',
+    'language_stat.xp': 'q',
+    'daily_stat.day': 'q',
+    'daily_stat.sessions': 'q',
+    'daily_stat.total_score': 'd',
+    'session.id': 'q',
+    'session.practiced_at': 'q',
+    'session.language': 'I',
+    'session.prompt': 'I',
+    'session.transcript': 'I',
+    'session.feedback': 'I',
+    'session.score': 'd',
+    'session.xp_gained': 'q',
+    'strings.offsets': 'Q',
+    'strings.data': 'B',
+}
+
+NUMPY_TYPES = {'I': 'u4', 'q': 'i8', 'Q': 'u8', 'd': 'f8', 'f': 'f4', 'B': 'u1'}
+
+
+def _seconds(practiced_at):
+    return int((datetime.fromisoformat(practiced_at) - EPOCH).total_seconds())
+
+
+def _timestamp(seconds):
+    return (EPOCH + timedelta(seconds=seconds)).isoformat(sep=' ', timespec='seconds')
+
+
+class SnapshotWriter:
+    """
+    Builds one snapshot file from user dicts shaped like
+    UserRepository.export_users yields them. Columns are accumulated in typed
+    arrays and written back to back, 8-byte aligned, after a JSON header that
+    records where each one starts.
+    """
+
+    def __init__(self):
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        for name in ('user.achievements.offsets', 'user.languages.offsets', 'user.cards.offsets',
+                     'user.log.offsets', 'user.language_stats.offsets', 'user.daily_stats.offsets',
+                     'strings.offsets'):
+            self.columns[name].append(0)
+        self._codes = {}
+        self.users = 0
+        self.sessions = 0
+
+    def _code(self, text):
+        code = self._codes.get(text)
+        if code is None:
+            code = self._codes[text] = len(self._codes)
+            self.columns['strings.data'].frombytes(text.encode('utf-8'))
+            self.columns['strings.offsets'].append(len(self.columns['strings.data']))
+        return code
+
+    def add_user(self, user):
+        c = self.columns
+        c['user.id'].append(self._code(user['user_id']))
+        c['user.sessions'].append(user['sessions'])
+        c['user.total_score'].append(user['total_score'])
+        c['user.xp'].append(user['xp'])
+        c['user.level'].append(user['level'])
+        c['user.streak'].append(user['streak'])
+        last_practice = user['last_practice_date']
+        c['user.last_practice_date'].append(date.fromisoformat(last_practice).toordinal() if last_practice else 0)
+        c['user.last_session'].append(user['last_session'])
+        for field in ('achievements', 'languages'):
+            c[f'user.{field}'].extend(self._code(value) for value in user[field])
+            c[f'user.{field}.offsets'].append(len(c[f'user.{field}']))
+        for word, due, interval, repetitions, ease, lapses in user['cards']:
+            c['card.word'].append(self._code(word))
+            c['card.due'].append(due)
+            c['card.interval'].append(interval)
+            c['card.repetitions'].append(repetitions)
+            c['card.ease'].append(ease)
+            c['card.lapses'].append(lapses)
+        c['user.cards.offsets'].append(len(c['card.word']))
+        for language, sessions, total_score, xp in user['language_stats']:
+            c['language_stat.language'].append(self._code(language))
+            c['language_stat.sessions'].append(sessions)
+            c['language_stat.total_score'].append(total_score)
+            c['language_stat.xp'].append(xp)
+        c['user.language_stats.offsets'].append(len(c['language_stat.language']))
+        for day, sessions, total_score in user['daily_stats']:
+            c['daily_stat.day'].append(date.fromisoformat(day).toordinal())
+            c['daily_stat.sessions'].append(sessions)
+            c['daily_stat.total_score'].append(total_score)
+        c['user.daily_stats.offsets'].append(len(c['daily_stat.day']))
+        for session_id, practiced_at, language, prompt, transcript, feedback, score, xp_gained in user['log']:
+            c['session.id'].append(session_id)
+            c['session.practiced_at'].append(_seconds(practiced_at))
+            c['session.language'].append(self._code(language))
+            c['session.prompt'].append(self._code(prompt))
+            c['session.transcript'].append(self._code(transcript))
+            c['session.feedback'].append(self._code(feedback))
+            c['session.score'].append(score)
+            c['session.xp_gained'].append(xp_gained)
+        c['user.log.offsets'].append(len(c['session.id']))
+        self.users += 1
+        self.sessions += len(user['log'])
+
+    def write(self, path, base=None):
+        """Write the file under a temporary name and move it into place, so readers never see half of it"""
+        header = {'byteorder': sys.byteorder, 'base': base, 'users': self.users, 'sessions': self.sessions,
+                  'created_at': datetime.now().isoformat(timespec='seconds'), 'columns': {}}
+        # Offsets depend on the header's own length, so lay the columns out relative to its end first
+        position = 0
+        for name, values in self.columns.items():
+            header['columns'][name] = [values.typecode, values.itemsize, position, len(values)]
+            position += -(-len(values) * values.itemsize // 8) * 8
+        encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        start = -(-(len(MAGIC) + 4 + len(encoded)) // 8) * 8
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(encoded)) + encoded)
+            f.write(bytes(start - f.tell()))
+            for name, values in self.columns.items():
+                f.write(values.tobytes())
+                f.write(bytes(-f.tell() % 8))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+
+
+class Snapshot:
+    """
+    A snapshot file mapped into memory. Columns are zero-copy views of the
+    mapping, so opening a file costs only its header however many sessions it
+    holds; pages are read in as columns are used.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        length, = struct.unpack_from('<I', self._data, len(MAGIC))
+        self.header = json.loads(self._data[len(MAGIC) + 4:len(MAGIC) + 4 + length])
+        if self.header['byteorder'] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {self.header['byteorder']}-endian machine")
+        self._start = -(-(len(MAGIC) + 4 + length) // 8) * 8
+        self._columns = {}
+        self._strings = None
+
+    @property
+    def base(self):
+        return self.header['base']
+
+    def column(self, name):
+        """A read-only memoryview of the column, indexable like a list"""
+        view = self._columns.get(name)
+        if view is None:
+            typecode, itemsize, offset, count = self.header['columns'][name]
+            if array(typecode).itemsize != itemsize:
+                raise ValueError(f"Column {name} has {itemsize}-byte items, expected {array(typecode).itemsize}")
+            start = self._start + offset
+            view = self._columns[name] = memoryview(self._data)[start:start + itemsize * count].cast(typecode)
+        return view
+
+    def numpy_column(self, name):
+        typecode, itemsize, offset, count = self.header['columns'][name]
+        return np.frombuffer(self._data, dtype=NUMPY_TYPES[typecode], count=count, offset=self._start + offset)
+
+    def string(self, code):
+        offsets = self.column('strings.offsets')
+        if self._strings is None:
+            self._strings = self.column('strings.data')
+        return bytes(self._strings[offsets[code]:offsets[code + 1]]).decode('utf-8')
+
+    def user_rows(self):
+        """{user_id: row} for the users in this file"""
+        ids = self.column('user.id')
+        return {self.string(ids[row]): row for row in range(len(ids))}
+
+    def user(self, row, log=True):
+        """The user dict at ``row``, in the shape UserRepository.export_users yields"""
+        c = self.column
+
+        def values(field):
+            offsets = c(f'user.{field}.offsets')
+            return [self.string(code) for code in c(f'user.{field}')[offsets[row]:offsets[row + 1]]]
+
+        last_practice = c('user.last_practice_date')[row]
+        cards = c('user.cards.offsets')
+        user = {
+            'user_id': self.string(c('user.id')[row]),
+            'sessions': c('user.sessions')[row],
+            'total_score': c('user.total_score')[row],
+            'xp': c('user.xp')[row],
+            'level': c('user.level')[row],
+            'streak': c('user.streak')[row],
+            'last_practice_date': date.fromordinal(last_practice).isoformat() if last_practice else None,
+            'last_session': c('user.last_session')[row],
+            'achievements': values('achievements'),
+            'languages': values('languages'),
+            'cards': [
+                (self.string(c('card.word')[i]), c('card.due')[i], c('card.interval')[i],
+                 c('card.repetitions')[i], c('card.ease')[i], c('card.lapses')[i])
+                for i in range(cards[row], cards[row + 1])
+            ],
+            'log': self.log(row) if log else [],
+            'language_stats': None,
+            'daily_stats': None
+        }
+        # Files written before the aggregates were stored leave them to be rebuilt from the log
+        if 'language_stat.xp' in self.header['columns']:
+            languages = c('user.language_stats.offsets')
+            days = c('user.daily_stats.offsets')
+            user['language_stats'] = [
+                (self.string(c('language_stat.language')[i]), c('language_stat.sessions')[i],
+                 c('language_stat.total_score')[i], c('language_stat.xp')[i])
+                for i in range(languages[row], languages[row + 1])
+            ]
+            user['daily_stats'] = [
+                (date.fromordinal(c('daily_stat.day')[i]).isoformat(), c('daily_stat.sessions')[i],
+                 c('daily_stat.total_score')[i])
+                for i in range(days[row], days[row + 1])
+            ]
+        return user
+
+    def log(self, row):
+        c = self.column
+        offsets = c('user.log.offsets')
+        return [
+            (c('session.id')[i], _timestamp(c('session.practiced_at')[i]), self.string(c('session.language')[i]),
+             self.string(c('session.prompt')[i]), self.string(c('session.transcript')[i]),
+             self.string(c('session.feedback')[i]), c('session.score')[i], c('session.xp_gained')[i])
+            for i in range(offsets[row], offsets[row + 1])
+        ]
+
+
+class SnapshotStore:
+    """
+    A directory of snapshot files forming a chain. The first file is a full
+    snapshot; each later one is incremental and holds every user's current
+    counters, achievements, languages and cards but only the sessions
+    recorded since the file before it. ``compact`` folds the chain back into
+    a single full snapshot.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _paths(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name.startswith('snapshot-') and name.endswith(SUFFIX)
+        )
+
+    def chain(self):
+        """Snapshots from the newest full one to the newest, oldest first"""
+        chain = []
+        for path in reversed(self._paths()):
+            snapshot = Snapshot(path)
+            chain.append(snapshot)
+            if snapshot.base is None:
+                break
+        chain.reverse()
+        return chain
+
+    def _next_path(self, paths):
+        sequence = int(os.path.basename(paths[-1])[len('snapshot-'):-len(SUFFIX)]) + 1 if paths else 1
+        return os.path.join(self.directory, f'snapshot-{sequence:06d}{SUFFIX}')
+
+    def export(self, repository, full=False):
+        """
+        Write a snapshot of ``repository``: incremental on top of the existing
+        chain unless ``full`` or there is none yet. Returns the writer, whose
+        ``users`` and ``sessions`` count what was written.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        paths = self._paths()
+        chain = [] if full else self.chain()
+        watermarks = {}
+        if chain:
+            newest = chain[-1]
+            last_sessions = newest.column('user.last_session')
+            watermarks = {user_id: last_sessions[row] for user_id, row in newest.user_rows().items()}
+        writer = SnapshotWriter()
+        for user in repository.export_users(after=watermarks):
+            writer.add_user(user)
+        path = self._next_path(paths)
+        writer.write(path, base=os.path.basename(chain[-1].path) if chain else None)
+        logger.info(f"Wrote {'incremental' if chain else 'full'} snapshot {path}: "
+                    f"{writer.users} users, {writer.sessions} new sessions")
+        return writer
+
+    def users(self):
+        """Every user's latest state with all sessions across the chain, oldest session first"""
+        chain = self.chain()
+        if not chain:
+            return
+        rows = [snapshot.user_rows() for snapshot in chain]
+        newest = chain[-1]
+        for user_id, row in rows[-1].items():
+            user = newest.user(row, log=False)
+            for snapshot, snapshot_rows in zip(chain, rows):
+                if user_id in snapshot_rows:
+                    user['log'].extend(snapshot.log(snapshot_rows[user_id]))
+            yield user
+
+    def restore(self, repository):
+        """Load the chain into ``repository``; returns the number of users restored"""
+        count = 0
+        for user in self.users():
+            repository.import_user(user)
+            count += 1
+        return count
+
+    def compact(self):
+        """Merge the chain into one full snapshot and remove the files it replaces"""
+        paths = self._paths()
+        if not paths:
+            return None
+        writer = SnapshotWriter()
+        for user in self.users():
+            writer.add_user(user)
+        path = self._next_path(paths)
+        writer.write(path)
+        for old in paths:
+            os.unlink(old)
+        logger.info(f"Compacted {len(paths)} snapshots into {path}: {writer.users} users, {writer.sessions} sessions")
+        return writer
+
+    def language_stats(self, since=None, until=None):
+        """
+        Session count and mean, standard deviation, minimum and maximum score per
+        language over every session in the chain, optionally limited to days
+        ``since`` to ``until`` (dates, inclusive). Reads only the language, score
+        and time columns; with NumPy each file is aggregated in a few array
+        operations.
+        """
+        low = (datetime.combine(since, datetime.min.time()) - EPOCH).total_seconds() if since else None
+        high = (datetime.combine(until + timedelta(days=1), datetime.min.time()) - EPOCH).total_seconds() if until else None
+        # language -> [count, sum, sum of squares, min, max]
+        totals = {}
+        for snapshot in self.chain():
+            if np is not None:
+                self._aggregate_numpy(snapshot, low, high, totals)
+            else:
+                self._aggregate(snapshot, low, high, totals)
+        stats = {}
+        for language, (count, total, squares, lowest, highest) in sorted(totals.items()):
+            mean = total / count
+            stats[language] = {
+                'sessions': count,
+                'mean': round(mean, 3),
+                'std': round(max(squares / count - mean * mean, 0.0) ** 0.5, 3),
+                'min': round(lowest, 3),
+                'max': round(highest, 3)
+            }
+        return stats
+
+    @staticmethod
+    def _merge(totals, language, count, total, squares, lowest, highest):
+        entry = totals.get(language)
+        if entry is None:
+            totals[language] = [count, total, squares, lowest, highest]
+        else:
+            entry[0] += count
+            entry[1] += total
+            entry[2] += squares
+            entry[3] = min(entry[3], lowest)
+            entry[4] = max(entry[4], highest)
+
+    def _aggregate_numpy(self, snapshot, low, high, totals):
+        languages = snapshot.numpy_column('session.language')
+        scores = snapshot.numpy_column('session.score').astype(np.float64)
+        if low is not None or high is not None:
+            times = snapshot.numpy_column('session.practiced_at')
+            keep = np.ones(len(times), dtype=bool)
+            if low is not None:
+                keep &= times >= low
+            if high is not None:
+                keep &= times < high
+            languages, scores = languages[keep], scores[keep]
+        if not len(scores):
+            return
+        # Language codes index the file's string table; renumber them densely first
+        codes, dense = np.unique(languages, return_inverse=True)
+        counts = np.bincount(dense)
+        sums = np.bincount(dense, weights=scores)
+        squares = np.bincount(dense, weights=scores * scores)
+        lowest = np.full(len(codes), np.inf)
+        highest = np.full(len(codes), -np.inf)
+        np.minimum.at(lowest, dense, scores)
+        np.maximum.at(highest, dense, scores)
+        for i, code in enumerate(codes):
+            self._merge(totals, snapshot.string(int(code)), int(counts[i]), float(sums[i]), float(squares[i]),
+                        float(lowest[i]), float(highest[i]))
+
+    def _aggregate(self, snapshot, low, high, totals):
+        languages = snapshot.column('session.language')
+        scores = snapshot.column('session.score')
+        times = snapshot.column('session.practiced_at')
+        by_code = {}
+        for i, (code, score) in enumerate(zip(languages, scores)):
+            if (low is not None and times[i] < low) or (high is not None and times[i] >= high):
+                continue
+            entry = by_code.get(code)
+            if entry is None:
+                by_code[code] = [1, score, score * score, score, score]
+            else:
+                entry[0] += 1
+                entry[1] += score
+                entry[2] += score * score
+                if score < entry[3]:
+                    entry[3] = score
+                if score > entry[4]:
+                    entry[4] = score
+        for code, entry in by_code.items():
+            self._merge(totals, snapshot.string(code), *entry)
@@ -0,0 +1,150 @@
+import heapq
+from array import array
+from datetime import date
+
+# SM-2 defaults
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+# Grades run from 0 (forgot completely) to 5 (perfect recall); below 3 is a lapse
+MAX_GRADE = 5
+PASSING_GRADE = 3
+
+
+def today_ordinal(today=None):
+    return (today or date.today()).toordinal()
+
+
+def schedule(repetitions, interval, ease, grade):
+    """
+    Apply one SM-2 review. Returns (repetitions, interval in days, ease, lapsed).
+    """
+    if not 0 <= grade <= MAX_GRADE:
+        raise ValueError(f"Grade must be between 0 and {MAX_GRADE}, got {grade}")
+    lapsed = grade < PASSING_GRADE
+    if lapsed:
+        repetitions = 0
+        interval = 1
+    else:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = max(1, round(interval * ease))
+        repetitions += 1
+    miss = MAX_GRADE - grade
+    ease = max(MIN_EASE, ease + 0.1 - miss * (0.08 + miss * 0.02))
+    return repetitions, interval, ease, lapsed
+
+
+def card_to_dict(word, due, interval, repetitions, ease, lapses):
+    return {
+        'word': word,
+        'due': date.fromordinal(due).isoformat(),
+        'interval': interval,
+        'repetitions': repetitions,
+        'ease': round(ease, 2),
+        'lapses': lapses
+    }
+
+
+class CardDeck:
+    """
+    One user's review cards, stored column-wise in typed arrays with a slot per word.
+
+    Due lookups go through a min-heap of (due day, slot). Reviews push a fresh
+    entry instead of updating in place; entries whose day no longer matches the
+    card are discarded when they surface, and the heap is rebuilt once stale
+    entries outnumber live ones.
+    """
+
+    def __init__(self):
+        self.words = []
+        self._slots = {}
+        self._due = array('l')
+        self._interval = array('l')
+        self._repetitions = array('l')
+        self._ease = array('d')
+        self._lapses = array('l')
+        self._heap = []
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self._slots
+
+    def add(self, word, today=None):
+        """Add a card first due the day after it was learned; returns False if it exists"""
+        if word in self._slots:
+            return False
+        slot = len(self.words)
+        self._slots[word] = slot
+        self.words.append(word)
+        due = today_ordinal(today) + 1
+        self._due.append(due)
+        self._interval.append(0)
+        self._repetitions.append(0)
+        self._ease.append(INITIAL_EASE)
+        self._lapses.append(0)
+        heapq.heappush(self._heap, (due, slot))
+        return True
+
+    def export(self):
+        """(word, due, interval, repetitions, ease, lapses) per card, in the order learned"""
+        return list(zip(self.words, self._due, self._interval, self._repetitions, self._ease, self._lapses))
+
+    def restore(self, word, due, interval, repetitions, ease, lapses):
+        """Add a card with its scheduling state, as exported"""
+        self.add(word)
+        slot = self._slots[word]
+        self._due[slot] = due
+        self._interval[slot] = interval
+        self._repetitions[slot] = repetitions
+        self._ease[slot] = ease
+        self._lapses[slot] = lapses
+        heapq.heappush(self._heap, (due, slot))
+
+    def _card(self, slot):
+        return card_to_dict(
+            self.words[slot], self._due[slot], self._interval[slot],
+            self._repetitions[slot], self._ease[slot], self._lapses[slot]
+        )
+
+    def card(self, word):
+        slot = self._slots.get(word)
+        return None if slot is None else self._card(slot)
+
+    def review(self, word, grade, today=None):
+        """Record a review of ``word`` and return its updated card, or None for an unknown word"""
+        slot = self._slots.get(word)
+        if slot is None:
+            return None
+        repetitions, interval, ease, lapsed = schedule(
+            self._repetitions[slot], self._interval[slot], self._ease[slot], grade
+        )
+        self._repetitions[slot] = repetitions
+        self._interval[slot] = interval
+        self._ease[slot] = ease
+        self._lapses[slot] += lapsed
+        self._due[slot] = today_ordinal(today) + interval
+        heapq.heappush(self._heap, (self._due[slot], slot))
+        if len(self._heap) > 2 * len(self.words) + 16:
+            self._heap = [(due, slot) for slot, due in enumerate(self._due)]
+            heapq.heapify(self._heap)
+        return self._card(slot)
+
+    def due_cards(self, today=None, limit=20):
+        """Cards due on or before ``today``, most overdue first; O(limit log n)"""
+        day = today_ordinal(today)
+        found = []
+        taken = set()
+        while self._heap and self._heap[0][0] <= day and len(found) < limit:
+            due, slot = heapq.heappop(self._heap)
+            if due != self._due[slot] or slot in taken:
+                continue
+            taken.add(slot)
+            found.append((due, slot))
+        for entry in found:
+            heapq.heappush(self._heap, entry)
+        return [self._card(slot) for _, slot in found]
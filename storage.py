@@ -0,0 +1,1027 @@
+import hashlib
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from content import SeenBitmap
+from history import TextStore, UserHistory, summarize_stats
+from progress import apply_practice
+from srs import INITIAL_EASE, CardDeck, card_to_dict, schedule, today_ordinal
+
+logger = logging.getLogger(__name__)
+
+# Per-user counters kept on the users row / profile
+STAT_FIELDS = ('sessions', 'total_score', 'xp', 'level', 'streak', 'last_practice_date')
+
+# Sessions shown on the progress page; older ones are reached through get_history
+RECENT_SESSIONS = 20
+
+
+def _now():
+    return datetime.now().isoformat(sep=' ', timespec='seconds')
+
+
+
+def longest_streak(days):
+    """Longest run of consecutive days in a sorted sequence of ISO dates"""
+    longest = run = 0
+    previous = None
+    for day in days:
+        current = date.fromisoformat(day)
+        run = run + 1 if previous is not None and current - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = current
+    return longest
+
+
+def new_user_profile():
+    """Default profile for a user who has not practiced yet"""
+    return {
+        'progress': [],
+        'sessions': 0,
+        'total_score': 0,
+        'achievements': [],
+        'learned_words': [],
+        'last_practice_date': None,
+        'streak': 0,
+        'xp': 0,
+        'level': 1,
+        'languages_practiced': set()
+    }
+
+
+class UserRepository:
+    """Storage interface for user profiles, practice sessions, achievements and words.
+
+    ``get_user`` returns the full profile in the shape the templates expect;
+    the other methods read or change one part of it.
+    """
+
+    def create_user(self, user_id):
+        raise NotImplementedError
+
+    def user_exists(self, user_id):
+        raise NotImplementedError
+
+    def get_user(self, user_id):
+        """
+        Return the user's profile: counters, achievements, learned words, languages,
+        the RECENT_SESSIONS latest sessions as ``progress`` and aggregates as ``stats``.
+        Its cost does not depend on how many sessions the user has completed.
+        """
+        raise NotImplementedError
+
+    def get_history(self, user_id, cursor=None, limit=20):
+        """Return (sessions newest first, next cursor) for sessions older than ``cursor``"""
+        raise NotImplementedError
+
+    def get_history_stats(self, user_id, days=30):
+        """Average score, per-language totals and per-day counts, or None for an unknown user"""
+        raise NotImplementedError
+
+    def get_stats(self, user_id):
+        """Return the counters in STAT_FIELDS, or None for an unknown user"""
+        raise NotImplementedError
+
+    def record_practice(self, user_id, entry, today=None):
+        """
+        Atomically count a practice session: apply_practice to the user's counters
+        and achievements, then store ``entry``. Returns apply_practice's outcome,
+        or None for an unknown user.
+        """
+        raise NotImplementedError
+
+    def add_language(self, user_id, language):
+        """Record a practiced language, returning (added, number of languages)"""
+        raise NotImplementedError
+
+    def get_learned_words(self, user_id):
+        raise NotImplementedError
+
+    def add_learned_word(self, user_id, word, xp=0, today=None):
+        """
+        Record a learned word, schedule its first review for the next day and
+        award XP, returning (added, number of words)
+        """
+        raise NotImplementedError
+
+    def get_due_cards(self, user_id, today=None, limit=20):
+        """Review cards due on or before ``today``, most overdue first"""
+        raise NotImplementedError
+
+    def record_review(self, user_id, word, grade, today=None):
+        """Apply an SM-2 review grade (0-5) to a card, returning the card or None if unknown"""
+        raise NotImplementedError
+
+    def add_achievement(self, user_id, achievement_id, xp=0):
+        """Award an achievement and its XP once, returning whether it was new"""
+        raise NotImplementedError
+
+    def get_achievements(self, user_id):
+        """Return the set of achievement ids the user has earned"""
+        raise NotImplementedError
+
+    def achievement_stats(self):
+        """
+        Yield (user_id, stats, earned achievement ids) for every user, with the
+        all-time stats achievement rules check: sessions, score (best session),
+        streak (longest), learned_words and languages
+        """
+        raise NotImplementedError
+
+    def leaderboard_rows(self, week_start):
+        """
+        One row per user for building leaderboards: user_id, xp, language_xp
+        ({language: XP from practice}), weekly_score (score points since
+        ``week_start``) and longest_streak
+        """
+        raise NotImplementedError
+
+    def get_seen(self, user_id, key):
+        """Return the SeenBitmap of content entries shown to the user under ``key``"""
+        raise NotImplementedError
+
+    def mark_seen(self, user_id, key, index, reset=False, cursor=None):
+        """
+        Set bit ``index`` of the user's ``key`` bitmap, clearing the rest first if
+        ``reset``. ``cursor``, a (cursor key, position) pair, is stored with it.
+        """
+        raise NotImplementedError
+
+    def get_cursor(self, user_id, key):
+        """Position of the user's walk through the content entries under ``key`` (0 to start)"""
+        raise NotImplementedError
+
+    def export_users(self, after=None):
+        """
+        Yield every user for a snapshot: the STAT_FIELDS counters, achievements,
+        languages, cards as (word, due, interval, repetitions, ease, lapses),
+        and as ``log`` the sessions with an id above ``after[user_id]`` as
+        (id, practiced_at, language, prompt, transcript, feedback, score,
+        xp_gained), oldest first. ``last_session`` is the highest session id
+        exported so far, the user's ``after`` for the next snapshot.
+        ``language_stats`` as (language, sessions, total_score, xp) and
+        ``daily_stats`` as (day, sessions, total_score) are the all-time history aggregates,
+        which the log alone cannot rebuild once old sessions are dropped.
+        """
+        raise NotImplementedError
+
+    def import_user(self, user):
+        """
+        Create a user from a snapshot, in the shape export_users yields. Without
+        ``language_stats`` and ``daily_stats`` the aggregates are rebuilt from the log.
+        """
+        raise NotImplementedError
+
+
+class MemoryUserRepository(UserRepository):
+    """Process-local store, matching the original USERS_DB dict.
+
+    Each user is guarded by one of a fixed set of striped locks, so updates for
+    one user are serialized without a global lock across all users. Practice
+    history is kept in a bounded ring buffer per user (``history_limit``
+    sessions), with texts interned in a shared TextStore.
+    """
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, history_limit=200):
+        self.history_limit = history_limit
+        self._users = {}
+        self._texts = TextStore()
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+    def _lock(self, user_id):
+        return self._locks[hash(user_id) % self.LOCK_STRIPES]
+
+    def _new_user(self):
+        user = new_user_profile()
+        del user['progress']
+        user['history'] = UserHistory(self._texts, limit=self.history_limit)
+        # Learned words are the review deck's words, in the order they were learned
+        del user['learned_words']
+        user['cards'] = CardDeck()
+        # Insertion-ordered set of achievement ids
+        user['achievements'] = {}
+        user['seen'] = {}
+        user['cursors'] = {}
+        return user
+
+    def create_user(self, user_id):
+        with self._lock(user_id):
+            if user_id not in self._users:
+                self._users[user_id] = self._new_user()
+
+    def user_exists(self, user_id):
+        return user_id in self._users
+
+    def get_user(self, user_id):
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            if user is None:
+                return None
+            profile = dict(user)
+            history = profile.pop('history')
+            profile['progress'] = history.recent(RECENT_SESSIONS)
+            profile['stats'] = history.stats.to_dict()
+            profile['achievements'] = list(user['achievements'])
+            profile['learned_words'] = list(profile.pop('cards').words)
+            del profile['seen']
+            del profile['cursors']
+            profile['languages_practiced'] = set(user['languages_practiced'])
+            return profile
+
+    def get_history(self, user_id, cursor=None, limit=20):
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            return ([], None) if user is None else user['history'].page(cursor, limit)
+
+    def get_history_stats(self, user_id, days=30):
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            return None if user is None else user['history'].stats.to_dict(days)
+
+    def get_stats(self, user_id):
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            return None if user is None else {field: user[field] for field in STAT_FIELDS}
+
+    def record_practice(self, user_id, entry, today=None):
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            if user is None:
+                return None
+            state = {field: user[field] for field in STAT_FIELDS}
+            state['achievements'] = set(user['achievements'])
+            outcome = apply_practice(state, entry['score'], today)
+            user.update({field: state[field] for field in STAT_FIELDS})
+            user['achievements'].update(dict.fromkeys(outcome['new_achievements']))
+            user['history'].append(
+                _now(), entry['language'], entry['prompt'], entry['transcript'],
+                entry['feedback'], entry['score'], outcome['xp_gained']
+            )
+            return outcome
+
+    def add_language(self, user_id, language):
+        with self._lock(user_id):
+            languages = self._users[user_id]['languages_practiced']
+            added = language not in languages
+            languages.add(language)
+            return added, len(languages)
+
+    def get_learned_words(self, user_id):
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            return [] if user is None else list(user['cards'].words)
+
+    def add_learned_word(self, user_id, word, xp=0, today=None):
+        with self._lock(user_id):
+            user = self._users[user_id]
+            cards = user['cards']
+            if not cards.add(word, today):
+                return False, len(cards)
+            user['xp'] += xp
+            return True, len(cards)
+
+    def get_due_cards(self, user_id, today=None, limit=20):
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            return [] if user is None else user['cards'].due_cards(today, limit)
+
+    def record_review(self, user_id, word, grade, today=None):
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            return None if user is None else user['cards'].review(word, grade, today)
+
+    def add_achievement(self, user_id, achievement_id, xp=0):
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            if user is None or achievement_id in user['achievements']:
+                return False
+            user['achievements'][achievement_id] = None
+            user['xp'] += xp
+            return True
+
+    def get_achievements(self, user_id):
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            return set() if user is None else set(user['achievements'])
+
+    def achievement_stats(self):
+        for user_id in list(self._users):
+            with self._lock(user_id):
+                user = self._users[user_id]
+                items, _ = user['history'].page(limit=self.history_limit)
+                stats = {
+                    'sessions': user['sessions'],
+                    # Only sessions still in the history buffer count towards the best score
+                    'score': max((item['score'] for item in items), default=0),
+                    'streak': max(user['streak'], longest_streak(sorted(user['history'].stats.days))),
+                    'learned_words': len(user['cards']),
+                    'languages': len(user['languages_practiced'])
+                }
+                earned = set(user['achievements'])
+            yield user_id, stats, earned
+
+    def leaderboard_rows(self, week_start):
+        rows = []
+        for user_id in list(self._users):
+            with self._lock(user_id):
+                user = self._users[user_id]
+                stats = user['history'].stats
+                rows.append({
+                    'user_id': user_id,
+                    'xp': user['xp'],
+                    'language_xp': {language: totals[2] for language, totals in stats.languages.items()},
+                    'weekly_score': stats.score_since(week_start),
+                    'longest_streak': longest_streak(sorted(stats.days))
+                })
+        return rows
+
+    def export_users(self, after=None):
+        after = after or {}
+        for user_id in list(self._users):
+            with self._lock(user_id):
+                user = self._users[user_id]
+                watermark = after.get(user_id, 0)
+                log = user['history'].export(after=watermark)
+                language_stats, daily_stats = user['history'].stats.export()
+                exported = {field: user[field] for field in STAT_FIELDS}
+                exported.update({
+                    'user_id': user_id,
+                    'achievements': list(user['achievements']),
+                    'languages': sorted(user['languages_practiced']),
+                    'cards': user['cards'].export(),
+                    'log': log,
+                    'last_session': log[-1][0] if log else watermark,
+                    'language_stats': language_stats,
+                    'daily_stats': daily_stats
+                })
+            yield exported
+
+    def import_user(self, user):
+        restored = self._new_user()
+        restored.update({field: user[field] for field in STAT_FIELDS})
+        restored['achievements'] = dict.fromkeys(user['achievements'])
+        restored['languages_practiced'] = set(user['languages'])
+        for card in user['cards']:
+            restored['cards'].restore(*card)
+        stats = None
+        if user.get('language_stats') is not None:
+            stats = (user['sessions'], user['total_score'], user['language_stats'], user['daily_stats'])
+        restored['history'].restore(user['log'], user['last_session'], stats)
+        with self._lock(user['user_id']):
+            self._users[user['user_id']] = restored
+
+    def get_seen(self, user_id, key):
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            return SeenBitmap(user['seen'].get(key, b'') if user else b'')
+
+    def mark_seen(self, user_id, key, index, reset=False, cursor=None):
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            if user is None:
+                return
+            seen = SeenBitmap(b'' if reset else user['seen'].get(key, b''))
+            seen.add(index)
+            user['seen'][key] = seen.to_bytes()
+            if cursor is not None:
+                cursor_key, position = cursor
+                user['cursors'][cursor_key] = position
+
+    def get_cursor(self, user_id, key):
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            return user['cursors'].get(key, 0) if user else 0
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    sessions INTEGER NOT NULL DEFAULT 0,
+    total_score REAL NOT NULL DEFAULT 0,
+    xp INTEGER NOT NULL DEFAULT 0,
+    level INTEGER NOT NULL DEFAULT 1,
+    streak INTEGER NOT NULL DEFAULT 0,
+    last_practice_date TEXT
+);
+CREATE TABLE IF NOT EXISTS texts (
+    id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL UNIQUE,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS practice_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    practiced_at TEXT NOT NULL,
+    language TEXT NOT NULL,
+    prompt_id INTEGER NOT NULL REFERENCES texts (id),
+    transcript_id INTEGER NOT NULL REFERENCES texts (id),
+    feedback_id INTEGER NOT NULL REFERENCES texts (id),
+    score REAL NOT NULL,
+    xp_gained INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_practice_sessions_user_id
+    ON practice_sessions (user_id, id);
+CREATE INDEX IF NOT EXISTS idx_practice_sessions_user_date
+    ON practice_sessions (user_id, practiced_at);
+CREATE TABLE IF NOT EXISTS user_language_stats (
+    user_id TEXT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    language TEXT NOT NULL,
+    sessions INTEGER NOT NULL DEFAULT 0,
+    total_score REAL NOT NULL DEFAULT 0,
+    xp INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, language)
+);
+CREATE TABLE IF NOT EXISTS user_daily_stats (
+    user_id TEXT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    day TEXT NOT NULL,
+    sessions INTEGER NOT NULL DEFAULT 0,
+    total_score REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+CREATE INDEX IF NOT EXISTS idx_user_daily_stats_day ON user_daily_stats (day);
+CREATE TABLE IF NOT EXISTS achievements (
+    user_id TEXT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    achievement_id TEXT NOT NULL,
+    earned_at TEXT NOT NULL,
+    PRIMARY KEY (user_id, achievement_id)
+);
+CREATE INDEX IF NOT EXISTS idx_achievements_earned_at ON achievements (earned_at);
+CREATE TABLE IF NOT EXISTS learned_words (
+    user_id TEXT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    word TEXT NOT NULL,
+    learned_at TEXT NOT NULL,
+    PRIMARY KEY (user_id, word)
+);
+CREATE INDEX IF NOT EXISTS idx_learned_words_learned_at ON learned_words (learned_at);
+CREATE TABLE IF NOT EXISTS review_cards (
+    user_id TEXT NOT NULL,
+    word TEXT NOT NULL,
+    due_day INTEGER NOT NULL,
+    interval INTEGER NOT NULL DEFAULT 0,
+    repetitions INTEGER NOT NULL DEFAULT 0,
+    ease REAL NOT NULL DEFAULT 2.5,
+    lapses INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, word),
+    FOREIGN KEY (user_id, word) REFERENCES learned_words (user_id, word) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_review_cards_due ON review_cards (user_id, due_day);
+CREATE TABLE IF NOT EXISTS user_languages (
+    user_id TEXT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    language TEXT NOT NULL,
+    PRIMARY KEY (user_id, language)
+);
+CREATE TABLE IF NOT EXISTS seen_content (
+    user_id TEXT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    content_key TEXT NOT NULL,
+    bitmap BLOB NOT NULL,
+    PRIMARY KEY (user_id, content_key)
+);
+CREATE TABLE IF NOT EXISTS content_cursors (
+    user_id TEXT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    cursor_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (user_id, cursor_key)
+);
+"""
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of SQLite connections shared between threads.
+
+    SQLite connections must not be used across fork(), so a process that finds
+    the pool was filled by its parent (a pre-forking server's master) replaces
+    the inherited connections with its own.
+    """
+
+    def __init__(self, path, size=5):
+        self.path = path
+        self.size = size
+        self._fill()
+
+    def _fill(self):
+        self._pid = os.getpid()
+        self._pool = queue.Queue(maxsize=self.size)
+        for _ in range(self.size):
+            self._pool.put(self._connect())
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        if self._pid != os.getpid():
+            # The parent's connections are left alone rather than closed under it
+            self._fill()
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Run a block in one transaction; IMMEDIATE takes the write lock up front"""
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+# (table, column, definition, statement filling it from practice_sessions) for columns
+# added after the first release, so older databases are upgraded in place
+AGGREGATE_COLUMNS = (
+    ('user_language_stats', 'xp', 'INTEGER NOT NULL DEFAULT 0',
+     "UPDATE user_language_stats SET xp = (SELECT COALESCE(SUM(s.xp_gained), 0) FROM practice_sessions s "
+     "WHERE s.user_id = user_language_stats.user_id AND s.language = user_language_stats.language)"),
+    ('user_daily_stats', 'total_score', 'REAL NOT NULL DEFAULT 0',
+     "UPDATE user_daily_stats SET total_score = (SELECT COALESCE(SUM(s.score), 0) FROM practice_sessions s "
+     "WHERE s.user_id = user_daily_stats.user_id AND s.practiced_at >= user_daily_stats.day "
+     "AND s.practiced_at < date(user_daily_stats.day, '+1 day'))"),
+)
+
+
+class SQLiteUserRepository(UserRepository):
+    """User store backed by a SQLite database in WAL mode, shareable across processes"""
+
+    def __init__(self, path, pool_size=5):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.pool = ConnectionPool(path, size=pool_size)
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+            self._add_aggregate_columns(conn)
+            # Words learned before reviews were scheduled start out due today
+            conn.execute(
+                "INSERT OR IGNORE INTO review_cards (user_id, word, due_day) "
+                "SELECT user_id, word, ? FROM learned_words",
+                (today_ordinal(),)
+            )
+
+    @staticmethod
+    def _add_aggregate_columns(conn):
+        """Give databases created before the leaderboard aggregates their columns, filled from the sessions"""
+        for table, column, definition, fill in AGGREGATE_COLUMNS:
+            if column not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                conn.execute(fill)
+
+    def create_user(self, user_id):
+        with self.pool.connection() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO users (user_id, created_at) VALUES (?, ?)", (user_id, _now())
+            )
+
+    def user_exists(self, user_id):
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    def get_user(self, user_id):
+        with self.pool.transaction() as conn:
+            row = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                return None
+            profile = new_user_profile()
+            profile.update({field: row[field] for field in STAT_FIELDS})
+            profile['progress'], _ = self._history_page(conn, user_id, None, RECENT_SESSIONS)
+            profile['progress'].reverse()
+            profile['stats'] = self._history_stats(conn, user_id, row['sessions'], row['total_score'], 30)
+            profile['achievements'] = [
+                r[0] for r in conn.execute(
+                    "SELECT achievement_id FROM achievements WHERE user_id = ? ORDER BY earned_at, rowid",
+                    (user_id,)
+                )
+            ]
+            profile['learned_words'] = self._learned_words(conn, user_id)
+            profile['languages_practiced'] = {
+                r[0] for r in conn.execute("SELECT language FROM user_languages WHERE user_id = ?", (user_id,))
+            }
+            return profile
+
+    @staticmethod
+    def _history_page(conn, user_id, cursor, limit):
+        # Keyset pagination on (user_id, id): each page is one index range scan
+        rows = conn.execute(
+            "SELECT s.id, s.practiced_at, s.language, p.body AS prompt, t.body AS transcript, "
+            "s.score, f.body AS feedback, s.xp_gained "
+            "FROM practice_sessions s "
+            "JOIN texts p ON p.id = s.prompt_id "
+            "JOIN texts t ON t.id = s.transcript_id "
+            "JOIN texts f ON f.id = s.feedback_id "
+            "WHERE s.user_id = ? AND s.id < ? ORDER BY s.id DESC LIMIT ?",
+            (user_id, cursor if cursor is not None else 2 ** 63 - 1, limit + 1)
+        ).fetchall()
+        items = [
+            {
+                'id': r['id'],
+                'date': r['practiced_at'][:16],
+                'language': r['language'],
+                'prompt': r['prompt'],
+                'transcript': r['transcript'],
+                'score': r['score'],
+                'feedback': r['feedback'],
+                'xp_gained': r['xp_gained']
+            }
+            for r in rows[:limit]
+        ]
+        next_cursor = items[-1]['id'] if len(rows) > limit else None
+        return items, next_cursor
+
+    @staticmethod
+    def _history_stats(conn, user_id, sessions, total_score, days):
+        languages = {
+            r[0]: (r[1], r[2]) for r in conn.execute(
+                "SELECT language, sessions, total_score FROM user_language_stats WHERE user_id = ?",
+                (user_id,)
+            )
+        }
+        start = (date.today() - timedelta(days=days - 1)).isoformat()
+        daily_counts = dict(conn.execute(
+            "SELECT day, sessions FROM user_daily_stats WHERE user_id = ? AND day >= ?", (user_id, start)
+        ).fetchall())
+        return summarize_stats(sessions, total_score, languages, daily_counts, days)
+
+    def get_history(self, user_id, cursor=None, limit=20):
+        with self.pool.connection() as conn:
+            return self._history_page(conn, user_id, cursor, limit)
+
+    def get_history_stats(self, user_id, days=30):
+        with self.pool.transaction() as conn:
+            row = conn.execute(
+                "SELECT sessions, total_score FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            return self._history_stats(conn, user_id, row['sessions'], row['total_score'], days)
+
+    @staticmethod
+    def _text_id(conn, text):
+        """Store a text once, keyed by its digest, and return its id"""
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        conn.execute("INSERT OR IGNORE INTO texts (digest, body) VALUES (?, ?)", (digest, text))
+        return conn.execute("SELECT id FROM texts WHERE digest = ?", (digest,)).fetchone()[0]
+
+    def get_stats(self, user_id):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(STAT_FIELDS)} FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            return None if row is None else dict(row)
+
+    def record_practice(self, user_id, entry, today=None):
+        # IMMEDIATE takes the write lock before reading, so concurrent submissions
+        # (from any process) apply one after another instead of overwriting each other
+        with self.pool.transaction(immediate=True) as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(STAT_FIELDS)} FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            state = dict(row)
+            state['achievements'] = {
+                r[0] for r in conn.execute(
+                    "SELECT achievement_id FROM achievements WHERE user_id = ?", (user_id,)
+                )
+            }
+            outcome = apply_practice(state, entry['score'], today)
+            now = _now()
+            conn.execute(
+                f"UPDATE users SET {', '.join(f'{field} = ?' for field in STAT_FIELDS)} WHERE user_id = ?",
+                (*(state[field] for field in STAT_FIELDS), user_id)
+            )
+            conn.executemany(
+                "INSERT INTO achievements (user_id, achievement_id, earned_at) VALUES (?, ?, ?)",
+                [(user_id, achievement_id, now) for achievement_id in outcome['new_achievements']]
+            )
+            conn.execute(
+                "INSERT INTO practice_sessions "
+                "(user_id, practiced_at, language, prompt_id, transcript_id, feedback_id, score, xp_gained) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, now, entry['language'],
+                 self._text_id(conn, entry['prompt']),
+                 self._text_id(conn, entry['transcript']),
+                 self._text_id(conn, entry['feedback']),
+                 entry['score'], outcome['xp_gained'])
+            )
+            # Keep the aggregates current so stats never scan the sessions table
+            conn.execute(
+                "INSERT INTO user_language_stats (user_id, language, sessions, total_score, xp) VALUES (?, ?, 1, ?, ?) "
+                "ON CONFLICT (user_id, language) DO UPDATE SET sessions = sessions + 1, "
+                "total_score = total_score + excluded.total_score, xp = xp + excluded.xp",
+                (user_id, entry['language'], entry['score'], outcome['xp_gained'])
+            )
+            conn.execute(
+                "INSERT INTO user_daily_stats (user_id, day, sessions, total_score) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (user_id, day) DO UPDATE SET "
+                "sessions = sessions + 1, total_score = total_score + excluded.total_score",
+                (user_id, now[:10], entry['score'])
+            )
+            return outcome
+
+    def add_language(self, user_id, language):
+        with self.pool.transaction(immediate=True) as conn:
+            added = conn.execute(
+                "INSERT OR IGNORE INTO user_languages (user_id, language) VALUES (?, ?)", (user_id, language)
+            ).rowcount == 1
+            count = conn.execute(
+                "SELECT COUNT(*) FROM user_languages WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+            return added, count
+
+    @staticmethod
+    def _learned_words(conn, user_id):
+        return [
+            r[0] for r in conn.execute(
+                "SELECT word FROM learned_words WHERE user_id = ? ORDER BY learned_at, rowid", (user_id,)
+            )
+        ]
+
+    def get_learned_words(self, user_id):
+        with self.pool.connection() as conn:
+            return self._learned_words(conn, user_id)
+
+    def add_learned_word(self, user_id, word, xp=0, today=None):
+        with self.pool.transaction(immediate=True) as conn:
+            added = conn.execute(
+                "INSERT OR IGNORE INTO learned_words (user_id, word, learned_at) VALUES (?, ?, ?)",
+                (user_id, word, _now())
+            ).rowcount == 1
+            if added:
+                conn.execute(
+                    "INSERT INTO review_cards (user_id, word, due_day, ease) VALUES (?, ?, ?, ?)",
+                    (user_id, word, today_ordinal(today) + 1, INITIAL_EASE)
+                )
+            if added and xp:
+                conn.execute("UPDATE users SET xp = xp + ? WHERE user_id = ?", (xp, user_id))
+            count = conn.execute(
+                "SELECT COUNT(*) FROM learned_words WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+            return added, count
+
+    def add_achievement(self, user_id, achievement_id, xp=0):
+        with self.pool.transaction(immediate=True) as conn:
+            added = conn.execute(
+                "INSERT OR IGNORE INTO achievements (user_id, achievement_id, earned_at) VALUES (?, ?, ?)",
+                (user_id, achievement_id, _now())
+            ).rowcount == 1
+            if added and xp:
+                conn.execute("UPDATE users SET xp = xp + ? WHERE user_id = ?", (xp, user_id))
+            return added
+
+    def get_due_cards(self, user_id, today=None, limit=20):
+        # Served by idx_review_cards_due: a range scan of only the due rows
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT word, due_day, interval, repetitions, ease, lapses FROM review_cards "
+                "WHERE user_id = ? AND due_day <= ? ORDER BY due_day LIMIT ?",
+                (user_id, today_ordinal(today), limit)
+            ).fetchall()
+            return [card_to_dict(*row) for row in rows]
+
+    def record_review(self, user_id, word, grade, today=None):
+        with self.pool.transaction(immediate=True) as conn:
+            row = conn.execute(
+                "SELECT interval, repetitions, ease, lapses FROM review_cards WHERE user_id = ? AND word = ?",
+                (user_id, word)
+            ).fetchone()
+            if row is None:
+                return None
+            repetitions, interval, ease, lapsed = schedule(row['repetitions'], row['interval'], row['ease'], grade)
+            due = today_ordinal(today) + interval
+            lapses = row['lapses'] + lapsed
+            conn.execute(
+                "UPDATE review_cards SET due_day = ?, interval = ?, repetitions = ?, ease = ?, lapses = ? "
+                "WHERE user_id = ? AND word = ?",
+                (due, interval, repetitions, ease, lapses, user_id, word)
+            )
+            return card_to_dict(word, due, interval, repetitions, ease, lapses)
+
+    def get_achievements(self, user_id):
+        with self.pool.connection() as conn:
+            return {
+                r[0] for r in conn.execute("SELECT achievement_id FROM achievements WHERE user_id = ?", (user_id,))
+            }
+
+    def achievement_stats(self):
+        with self.pool.connection() as conn:
+            users = {
+                r['user_id']: {'sessions': r['sessions'], 'score': 0, 'streak': r['streak'],
+                               'learned_words': 0, 'languages': 0}
+                for r in conn.execute("SELECT user_id, sessions, streak FROM users")
+            }
+            for user_id, best in conn.execute(
+                "SELECT user_id, MAX(score) FROM practice_sessions GROUP BY user_id"
+            ):
+                users[user_id]['score'] = best
+            for table, stat in (('learned_words', 'learned_words'), ('user_languages', 'languages')):
+                for user_id, count in conn.execute(f"SELECT user_id, COUNT(*) FROM {table} GROUP BY user_id"):
+                    users[user_id][stat] = count
+            days = {}
+            for user_id, day in conn.execute("SELECT user_id, day FROM user_daily_stats ORDER BY user_id, day"):
+                days.setdefault(user_id, []).append(day)
+            for user_id, user_days in days.items():
+                users[user_id]['streak'] = max(users[user_id]['streak'], longest_streak(user_days))
+            earned = {}
+            for user_id, achievement_id in conn.execute("SELECT user_id, achievement_id FROM achievements"):
+                earned.setdefault(user_id, set()).add(achievement_id)
+        for user_id, stats in users.items():
+            yield user_id, stats, earned.get(user_id, set())
+
+    def leaderboard_rows(self, week_start):
+        with self.pool.connection() as conn:
+            rows = {
+                r['user_id']: {
+                    'user_id': r['user_id'], 'xp': r['xp'], 'language_xp': {},
+                    'weekly_score': 0.0, 'longest_streak': 0
+                }
+                for r in conn.execute("SELECT user_id, xp FROM users")
+            }
+            # Both come from the aggregates record_practice keeps, never from the sessions table
+            for user_id, language, xp in conn.execute("SELECT user_id, language, xp FROM user_language_stats"):
+                rows[user_id]['language_xp'][language] = xp
+            # Summed here rather than grouped in SQL, so the query reads this week's rows through the day index
+            for user_id, score in conn.execute(
+                "SELECT user_id, total_score FROM user_daily_stats WHERE day >= ?", (week_start.isoformat(),)
+            ):
+                rows[user_id]['weekly_score'] += score
+            days = {}
+            for user_id, day in conn.execute("SELECT user_id, day FROM user_daily_stats ORDER BY user_id, day"):
+                days.setdefault(user_id, []).append(day)
+            for user_id, user_days in days.items():
+                rows[user_id]['longest_streak'] = longest_streak(user_days)
+            return list(rows.values())
+
+    @staticmethod
+    def _seen(conn, user_id, key):
+        row = conn.execute(
+            "SELECT bitmap FROM seen_content WHERE user_id = ? AND content_key = ?", (user_id, key)
+        ).fetchone()
+        return SeenBitmap(row[0] if row else b'')
+
+    def get_seen(self, user_id, key):
+        with self.pool.connection() as conn:
+            return self._seen(conn, user_id, key)
+
+    def mark_seen(self, user_id, key, index, reset=False, cursor=None):
+        with self.pool.transaction(immediate=True) as conn:
+            if conn.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone() is None:
+                return
+            seen = SeenBitmap() if reset else self._seen(conn, user_id, key)
+            seen.add(index)
+            conn.execute(
+                "INSERT INTO seen_content (user_id, content_key, bitmap) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id, content_key) DO UPDATE SET bitmap = excluded.bitmap",
+                (user_id, key, seen.to_bytes())
+            )
+            if cursor is not None:
+                conn.execute(
+                    "INSERT INTO content_cursors (user_id, cursor_key, position) VALUES (?, ?, ?) "
+                    "ON CONFLICT (user_id, cursor_key) DO UPDATE SET position = excluded.position",
+                    (user_id, *cursor)
+                )
+
+    def get_cursor(self, user_id, key):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT position FROM content_cursors WHERE user_id = ? AND cursor_key = ?", (user_id, key)
+            ).fetchone()
+            return row[0] if row else 0
+
+    def export_users(self, after=None):
+        # Session ids increase across all users, so everything above the highest
+        # id already exported is new
+        watermark = max((after or {}).values(), default=0)
+        with self.pool.transaction() as conn:
+            grouped = {}
+            for name, query in (
+                ('achievements', "SELECT user_id, achievement_id FROM achievements ORDER BY user_id, earned_at, rowid"),
+                ('languages', "SELECT user_id, language FROM user_languages ORDER BY user_id, language"),
+                ('cards', "SELECT c.user_id, c.word, c.due_day, c.interval, c.repetitions, c.ease, c.lapses "
+                          "FROM review_cards c JOIN learned_words w ON w.user_id = c.user_id AND w.word = c.word "
+                          "ORDER BY c.user_id, w.learned_at, w.rowid"),
+                ('language_stats', "SELECT user_id, language, sessions, total_score, xp FROM user_language_stats "
+                                   "ORDER BY user_id, language"),
+                ('daily_stats', "SELECT user_id, day, sessions, total_score FROM user_daily_stats "
+                                "ORDER BY user_id, day")
+            ):
+                values = grouped[name] = {}
+                for row in conn.execute(query):
+                    values.setdefault(row[0], []).append(row[1] if len(row) == 2 else tuple(row[1:]))
+            sessions = conn.execute(
+                "SELECT s.user_id, s.id, s.practiced_at, s.language, p.body, t.body, f.body, s.score, s.xp_gained "
+                "FROM practice_sessions s "
+                "JOIN texts p ON p.id = s.prompt_id "
+                "JOIN texts t ON t.id = s.transcript_id "
+                "JOIN texts f ON f.id = s.feedback_id "
+                "WHERE s.id > ? ORDER BY s.user_id, s.id",
+                (watermark,)
+            )
+            pending = sessions.fetchone()
+            users = conn.execute(f"SELECT user_id, {', '.join(STAT_FIELDS)} FROM users ORDER BY user_id").fetchall()
+            for row in users:
+                user_id = row['user_id']
+                # Both queries are ordered by user_id, so the sessions are merged in one pass
+                while pending is not None and pending[0] < user_id:
+                    pending = sessions.fetchone()
+                log = []
+                while pending is not None and pending[0] == user_id:
+                    log.append(tuple(pending[1:]))
+                    pending = sessions.fetchone()
+                exported = {field: row[field] for field in STAT_FIELDS}
+                exported.update({
+                    'user_id': user_id,
+                    'achievements': grouped['achievements'].get(user_id, []),
+                    'languages': grouped['languages'].get(user_id, []),
+                    'cards': grouped['cards'].get(user_id, []),
+                    'log': log,
+                    'last_session': log[-1][0] if log else (after or {}).get(user_id, 0),
+                    'language_stats': grouped['language_stats'].get(user_id, []),
+                    'daily_stats': grouped['daily_stats'].get(user_id, [])
+                })
+                yield exported
+
+    def import_user(self, user):
+        user_id = user['user_id']
+        now = _now()
+        with self.pool.transaction(immediate=True) as conn:
+            # Replaces the user and, through the cascades, everything recorded for them
+            conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+            conn.execute(
+                f"INSERT INTO users (user_id, created_at, {', '.join(STAT_FIELDS)}) "
+                f"VALUES (?, ?, {', '.join('?' for _ in STAT_FIELDS)})",
+                (user_id, now, *(user[field] for field in STAT_FIELDS))
+            )
+            conn.executemany(
+                "INSERT INTO achievements (user_id, achievement_id, earned_at) VALUES (?, ?, ?)",
+                [(user_id, achievement_id, now) for achievement_id in user['achievements']]
+            )
+            conn.executemany(
+                "INSERT INTO user_languages (user_id, language) VALUES (?, ?)",
+                [(user_id, language) for language in user['languages']]
+            )
+            conn.executemany(
+                "INSERT INTO learned_words (user_id, word, learned_at) VALUES (?, ?, ?)",
+                [(user_id, card[0], now) for card in user['cards']]
+            )
+            conn.executemany(
+                "INSERT INTO review_cards (user_id, word, due_day, interval, repetitions, ease, lapses) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(user_id, *card) for card in user['cards']]
+            )
+            languages = {}
+            days = {}
+            for _, practiced_at, language, prompt, transcript, feedback, score, xp_gained in user['log']:
+                conn.execute(
+                    "INSERT INTO practice_sessions "
+                    "(user_id, practiced_at, language, prompt_id, transcript_id, feedback_id, score, xp_gained) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (user_id, practiced_at, language, self._text_id(conn, prompt),
+                     self._text_id(conn, transcript), self._text_id(conn, feedback), score, xp_gained)
+                )
+                totals = languages.setdefault(language, [0, 0.0, 0])
+                totals[0] += 1
+                totals[1] += score
+                totals[2] += xp_gained
+                totals = days.setdefault(practiced_at[:10], [0, 0.0])
+                totals[0] += 1
+                totals[1] += score
+            if user.get('language_stats') is not None:
+                languages = {language: totals for language, *totals in user['language_stats']}
+                days = {day: totals for day, *totals in user['daily_stats']}
+            conn.executemany(
+                "INSERT INTO user_language_stats (user_id, language, sessions, total_score, xp) VALUES (?, ?, ?, ?, ?)",
+                [(user_id, language, *totals) for language, totals in languages.items()]
+            )
+            conn.executemany(
+                "INSERT INTO user_daily_stats (user_id, day, sessions, total_score) VALUES (?, ?, ?, ?)",
+                [(user_id, day, *totals) for day, totals in days.items()]
+            )
+
+
+def build_user_repository(backend='sqlite', path='speakeasy.sqlite3', pool_size=5, history_limit=200):
+    """Create the user store for the configured backend name"""
+    if backend == 'memory':
+        return MemoryUserRepository(history_limit=history_limit)
+    if backend != 'sqlite':
+        logger.warning(f"Unknown storage backend '{backend}', using SQLite")
+    return SQLiteUserRepository(path, pool_size=pool_size)
@@ -0,0 +1,36 @@
+import json
+
+from batch_grading import BatchGrader, completed_ids
+
+
+def grade(transcript, prompt, language):
+    return {'overall_score': len(transcript)}, 'model'
+
+
+def test_unusable_ids_are_per_record_errors():
+    grader = BatchGrader(grade, workers=2)
+    lines = [
+        json.dumps({'id': 'a', 'transcript': 'one'}),
+        json.dumps({'id': [1], 'transcript': 'two'}),
+        json.dumps({'id': {'x': 1}, 'transcript': 'three'}),
+        json.dumps({'id': 7, 'transcript': 'four'}),
+    ]
+    try:
+        results = list(grader.run(lines, skip={'z'}))
+    finally:
+        grader.shutdown()
+
+    assert [result['id'] for result in results] == ['a', 2, 3, 7]
+    assert 'error' not in results[0] and 'error' not in results[3]
+    assert 'not a string or an integer' in results[1]['error']
+    assert 'not a string or an integer' in results[2]['error']
+
+
+def test_completed_ids_ignores_unusable_ids():
+    lines = [
+        json.dumps({'id': 'a', 'feedback': {}}),
+        json.dumps({'id': [1], 'feedback': {}}),
+        json.dumps({'id': 3, 'error': 'failed'}),
+        '{"id": 4, "feedb',
+    ]
+    assert completed_ids(lines) == {'a'}
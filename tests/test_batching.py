@@ -0,0 +1,47 @@
+import threading
+import time
+
+import pytest
+
+from batching import RETRY, MicroBatcher
+
+ITEMS = 6
+DELAY = 0.2
+
+
+def test_failed_batch_items_are_retried_concurrently():
+    calls = []
+
+    def run_one(key, item):
+        time.sleep(DELAY)
+        return f'{key}:{item}'
+
+    def run_batch(key, items):
+        calls.append(len(items))
+        return [RETRY] * len(items)
+
+    batcher = MicroBatcher(run_batch, run_one=run_one, max_wait=0.5, max_batch=ITEMS)
+    results = {}
+
+    def submit(item):
+        results[item] = batcher.submit('prompt', item)
+
+    threads = [threading.Thread(target=submit, args=(item,)) for item in range(ITEMS)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [ITEMS]
+    assert results == {item: f'prompt:{item}' for item in range(ITEMS)}
+    # One retry's worth of time, not one per item
+    assert time.monotonic() - started < DELAY * 3
+    assert batcher.stats()['retries'] == ITEMS
+
+
+def test_results_and_errors_are_handed_to_each_caller():
+    batcher = MicroBatcher(lambda key, items: [ValueError('bad') if item == 'x' else item.upper() for item in items])
+    assert batcher.submit('prompt', 'a') == 'A'
+    with pytest.raises(ValueError, match='bad'):
+        batcher.submit('prompt', 'x')
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from content import PROMPT_BANK, ContentLibrary, SeenBitmap
+from storage import MemoryUserRepository, SQLiteUserRepository
+
+
+@pytest.fixture
+def library(tmp_path):
+    directory = tmp_path / PROMPT_BANK
+    directory.mkdir()
+    entries = [
+        {'text': f'Prompt {i}', 'difficulty': ('beginner', 'advanced', None)[i % 3], 'topic': ('food', None)[i % 2]}
+        for i in range(60)
+    ]
+    (directory / 'english.jsonl').write_text(''.join(json.dumps(entry) + '\n' for entry in entries))
+    return ContentLibrary(str(tmp_path))
+
+
+def test_entries_without_a_difficulty_or_topic_are_indexed_once(library):
+    bank = library.bank(PROMPT_BANK, 'english')
+    assert bank.difficulties() == ['advanced', 'beginner']
+    assert bank.topics() == ['food']
+    food = list(bank.candidates(topic='food'))
+    assert len(food) == len(set(food)) == 30
+    assert len(bank.candidates(difficulty='beginner')) == 20
+
+
+def test_walk_shows_every_entry_once_per_round(library):
+    seen = SeenBitmap()
+    cursor = 0
+    picked = []
+    for _ in range(60):
+        index, _, exhausted, cursor = library.pick(PROMPT_BANK, 'english', seen, 'user-1', cursor=cursor)
+        assert not exhausted
+        seen.add(index)
+        picked.append(index)
+    assert sorted(picked) == list(range(60))
+    assert cursor == 60
+
+    index, _, exhausted, cursor = library.pick(PROMPT_BANK, 'english', seen, 'user-1', cursor=cursor)
+    assert exhausted
+
+
+def test_walk_skips_entries_seen_through_another_filter(library):
+    seen = SeenBitmap()
+    beginner = set(library.bank(PROMPT_BANK, 'english').candidates(difficulty='beginner'))
+    for index in list(beginner)[:10]:
+        seen.add(index)
+    cursor = 0
+    picked = set()
+    for _ in range(10):
+        index, _, exhausted, cursor = library.pick(
+            PROMPT_BANK, 'english', seen, 'user-1', difficulty='beginner', cursor=cursor
+        )
+        assert not exhausted and index not in seen
+        seen.add(index)
+        picked.add(index)
+    assert picked | set(list(beginner)[:10]) == beginner
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_cursor_is_stored_with_the_seen_bit(backend, tmp_path):
+    if backend == 'memory':
+        repository = MemoryUserRepository()
+    else:
+        repository = SQLiteUserRepository(str(tmp_path / 'users.sqlite3'))
+    repository.create_user('u')
+    assert repository.get_cursor('u', 'prompts:english::') == 0
+    repository.mark_seen('u', 'prompts:english', 7, cursor=('prompts:english::', 3))
+    assert repository.get_cursor('u', 'prompts:english::') == 3
+    assert 7 in repository.get_seen('u', 'prompts:english')
+
+
+def test_only_bundled_languages_are_loaded(library, tmp_path):
+    outside = tmp_path / 'outside'
+    outside.mkdir()
+    (outside / 'evil.jsonl').write_text(json.dumps({'text': 'Not a prompt'}) + '\n')
+
+    assert library.bank(PROMPT_BANK, '../outside/evil') is None
+    assert library.bank(PROMPT_BANK, str(outside / 'evil')) is None
+    for index in range(100):
+        assert library.bank(PROMPT_BANK, f'klingon{index}') is None
+    assert library.pick(PROMPT_BANK, 'klingon', SeenBitmap(), 'seed')[0] is None
+    assert library.bank(PROMPT_BANK, 'english') is not None
+    assert list(library._banks) == [(PROMPT_BANK, 'english')]
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from feedback_jobs import FeedbackDispatcher
+
+
+def test_only_tracked_jobs_are_kept_and_they_expire():
+    dispatcher = FeedbackDispatcher(max_workers=2, max_queue=4, timeout=0.05, result_ttl=0.1)
+    try:
+        untracked = dispatcher.submit(lambda: 'sync', owner='a', track=False)
+        assert untracked.wait() == 'sync'
+        assert dispatcher.get_job(untracked.id, owner='a') is None
+
+        job = dispatcher.submit(lambda: 'async', owner='a')
+        job.wait()
+        assert dispatcher.get_job(job.id, owner='a') is job
+        assert dispatcher.get_job(job.id, owner='b') is None
+
+        # A job that never resolves is dropped too
+        release = threading.Event()
+        stuck = dispatcher.submit(release.wait, owner='a')
+        time.sleep(0.2)
+        dispatcher.submit(lambda: None, owner='a')
+        assert dispatcher.get_job(job.id, owner='a') is None
+        assert dispatcher.get_job(stuck.id, owner='a') is None
+        assert dispatcher.stats()['tracked_jobs'] == 1
+        release.set()
+    finally:
+        dispatcher.shutdown()
+
+
+def test_a_job_resolved_late_is_kept_for_the_ttl_after_it_finished():
+    dispatcher = FeedbackDispatcher(max_workers=1, max_queue=2, timeout=0.01, result_ttl=0.2)
+    try:
+        release = threading.Event()
+        job = dispatcher.submit(release.wait, fallback=lambda: 'local', owner='a')
+        time.sleep(0.15)
+        # Polling past the deadline resolves it with the fallback
+        assert job.poll() == 'done' and job.result == 'local'
+        time.sleep(0.1)
+        dispatcher.submit(lambda: None, owner='a')
+        assert dispatcher.get_job(job.id, owner='a') is job
+        release.set()
+    finally:
+        dispatcher.shutdown()
@@ -0,0 +1,69 @@
+"""
+Leaderboard rows come from aggregates kept by record_practice, so they match
+the full history however long it is, on both backends and after a restore.
+"""
+import sqlite3
+from datetime import date
+
+import pytest
+
+from leaderboards import week_start
+from snapshot import SnapshotStore
+from storage import MemoryUserRepository, SQLiteUserRepository
+
+SESSIONS = [('spanish', 7.5), ('french', 6.0), ('spanish', 8.5), ('spanish', 9.0), ('french', 5.5)]
+
+
+def open_repository(backend, path):
+    if backend == 'memory':
+        return MemoryUserRepository(history_limit=2)
+    return SQLiteUserRepository(str(path))
+
+
+def practice(repository, user_id):
+    gained = {}
+    for language, score in SESSIONS:
+        outcome = repository.record_practice(user_id, {
+            'language': language, 'prompt': 'Describe your weekend', 'transcript': f'{language} {score}',
+            'feedback': '{}', 'score': score
+        })
+        gained[language] = gained.get(language, 0) + outcome['xp_gained']
+    return gained
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_rows_cover_every_session(backend, tmp_path):
+    repository = open_repository(backend, tmp_path / 'users.sqlite3')
+    repository.create_user('learner')
+    gained = practice(repository, 'learner')
+
+    row, = repository.leaderboard_rows(week_start())
+    assert row['language_xp'] == gained
+    assert row['weekly_score'] == pytest.approx(sum(score for _, score in SESSIONS))
+    assert repository.leaderboard_rows(date.today().replace(year=date.today().year + 1))[0]['weekly_score'] == 0
+
+    store = SnapshotStore(str(tmp_path / 'snapshots'))
+    store.export(repository)
+    for target in ('memory', 'sqlite'):
+        restored = open_repository(target, tmp_path / f'restored-{target}.sqlite3')
+        store.restore(restored)
+        assert restored.leaderboard_rows(week_start()) == [row]
+
+
+def test_older_databases_get_the_aggregate_columns(tmp_path):
+    path = str(tmp_path / 'users.sqlite3')
+    repository = SQLiteUserRepository(path)
+    repository.create_user('learner')
+    gained = practice(repository, 'learner')
+    repository.pool.close()
+
+    # Drop the columns, as in a database created before they existed
+    conn = sqlite3.connect(path)
+    conn.execute("ALTER TABLE user_language_stats DROP COLUMN xp")
+    conn.execute("ALTER TABLE user_daily_stats DROP COLUMN total_score")
+    conn.commit()
+    conn.close()
+
+    row, = SQLiteUserRepository(path).leaderboard_rows(week_start())
+    assert row['language_xp'] == gained
+    assert row['weekly_score'] == pytest.approx(sum(score for _, score in SESSIONS))
@@ -0,0 +1,36 @@
+import pytest
+
+from local_analysis import DEFAULT_LANGUAGE, LocalAnalyzer
+
+
+def test_grammar_rules_do_not_match_across_sentences():
+    analysis = LocalAnalyzer().analyze("I really like it. Do you like it too? He have a dog.")
+    assert analysis['grammar_feedback']['issues'] == ["'he have'"]
+    assert analysis['grammar_feedback']['corrections'] == ['he has']
+
+
+def test_unknown_languages_use_the_default_tables():
+    analyzer = LocalAnalyzer()
+    for language in ('../../etc/passwd', 'klingon', ''):
+        assert analyzer.tables(language).language == DEFAULT_LANGUAGE
+        analyzer.analyze("Hello there, my good friend.", language=language)
+    assert list(analyzer._tables) == [DEFAULT_LANGUAGE]
+
+
+@pytest.mark.parametrize('language, transcript', [
+    ('english', "I was not at home yesterday. I wasn't tired either."),
+    ('english', "Does she have a brother? What did he do after school?"),
+    ('english', "Can it have two owners? Why doesn't he do his homework?"),
+    ('english', "If it were sunny, we would go to the beach."),
+    ('english', "It is a European city, and a one-day trip is enough."),
+    ('french', "Cet arbre est très grand et c'est joli."),
+    ('french', "J'ai vu l'ami de Marie, qu'il connaît bien."),
+])
+def test_correct_sentences_have_no_grammar_issues(language, transcript):
+    grammar = LocalAnalyzer().analyze(transcript, language=language)['grammar_feedback']
+    assert grammar['issues'] == []
+
+
+def test_ce_before_a_vowel():
+    grammar = LocalAnalyzer().analyze("Ce arbre est grand. Ce est joli.", language='french')['grammar_feedback']
+    assert grammar['corrections'] == ['cet arbre', "c'est"]
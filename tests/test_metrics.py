@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+
+from metrics import Registry
+
+
+def registry(directory):
+    metrics = Registry(directory=str(directory))
+    requests = metrics.counter('requests_total', 'Requests', ('page',))
+    latency = metrics.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    metrics.collector(lambda: [('in_flight', 'gauge', 'In flight', [({}, 2)]),
+                               ('calls_total', 'counter', 'Calls', [({}, 5)])])
+    return metrics, requests, latency
+
+
+def worker_file(directory, pid, requests, in_flight, calls):
+    with open(os.path.join(directory, f'{pid}.json'), 'w') as f:
+        json.dump({
+            'pid': pid,
+            'metrics': {'speakeasy_requests_total': [[['home'], requests]],
+                        'speakeasy_latency_seconds': [[[], [1, 0, 0, 0.05]]]},
+            'families': [['in_flight', 'gauge', 'In flight', [[{}, in_flight]]],
+                         ['calls_total', 'counter', 'Calls', [[{}, calls]]]]
+        }, f)
+
+
+def test_render_adds_up_every_worker(tmp_path):
+    metrics, requests, latency = registry(tmp_path)
+    requests.inc('home', amount=3)
+    latency.observe(0.5)
+
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    worker_file(tmp_path, os.getppid(), requests=4, in_flight=1, calls=7)
+    worker_file(tmp_path, exited.pid, requests=10, in_flight=6, calls=100)
+
+    lines = metrics.render().splitlines()
+    assert 'speakeasy_requests_total{page="home"} 17' in lines
+    assert 'speakeasy_latency_seconds_count 3' in lines
+    assert 'speakeasy_latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'speakeasy_calls_total 112' in lines
+    # The exited worker's gauge is left out
+    assert 'speakeasy_in_flight 3' in lines
+    assert os.path.exists(tmp_path / f'{os.getpid()}.json')
+
+
+def test_without_a_directory_only_this_process_is_reported():
+    metrics = Registry()
+    metrics.counter('requests_total', 'Requests').inc()
+    assert 'speakeasy_requests_total 1' in metrics.render().splitlines()
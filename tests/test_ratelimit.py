@@ -0,0 +1,27 @@
+import pytest
+
+from ratelimit import MemoryBuckets, RateLimiter, SQLiteBuckets
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        yield MemoryBuckets()
+        return
+    store = SQLiteBuckets(str(tmp_path / 'ratelimit.sqlite3'))
+    yield store
+    store.pool.close()
+
+
+def test_refused_request_spends_no_token(store):
+    limiter = RateLimiter(store, {'user': (60, 3), 'ip': (60, 1)})
+    assert limiter.check({'user': 'u', 'ip': 'a'}, now=100).allowed
+
+    # The exhausted ip bucket refuses, and the user bucket keeps its tokens
+    for _ in range(5):
+        assert not limiter.check({'user': 'u', 'ip': 'a'}, now=100).allowed
+    assert limiter.limited == 5
+
+    assert limiter.check({'user': 'u', 'ip': 'b'}, now=100).allowed
+    assert limiter.check({'user': 'u', 'ip': 'c'}, now=100).allowed
+    assert not limiter.check({'user': 'u', 'ip': 'd'}, now=100).allowed
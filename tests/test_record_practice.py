@@ -0,0 +1,86 @@
+"""
+Concurrent practice submissions for one user must all land: every session,
+score point, XP and achievement counted exactly once, on both backends.
+"""
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+from progress import ACHIEVEMENT_XP
+from storage import MemoryUserRepository, SQLiteUserRepository
+
+THREADS = 8
+SUBMISSIONS = 25
+SCORE = 7.5
+DAYS = 3
+START = date(2024, 3, 1)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def repository(request, tmp_path):
+    if request.param == 'memory':
+        yield MemoryUserRepository(history_limit=50)
+        return
+    repository = SQLiteUserRepository(str(tmp_path / 'users.sqlite3'), pool_size=THREADS)
+    yield repository
+    repository.pool.close()
+
+
+def submit_concurrently(repository, user_id, today):
+    barrier = threading.Barrier(THREADS)
+    outcomes = []
+    errors = []
+
+    def submit(thread):
+        barrier.wait()
+        for index in range(SUBMISSIONS):
+            try:
+                outcomes.append(repository.record_practice(user_id, {
+                    'language': 'spanish',
+                    'prompt': 'Describe your weekend',
+                    'transcript': f'thread {thread} answer {index}',
+                    'feedback': '{}',
+                    'score': SCORE
+                }, today=today))
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=submit, args=(thread,)) for thread in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    return outcomes
+
+
+def test_concurrent_submissions_are_all_counted(repository):
+    user_id = 'stress-user'
+    repository.create_user(user_id)
+    outcomes = []
+    # Each day's submissions race each other; the days themselves follow in order
+    for offset in range(DAYS):
+        outcomes += submit_concurrently(repository, user_id, START + timedelta(days=offset))
+
+    total = THREADS * SUBMISSIONS * DAYS
+    expected_achievements = {'first_practice', 'five_practices', 'three_day_streak'}
+    expected_xp = total * int(SCORE * 10) + ACHIEVEMENT_XP * len(expected_achievements)
+
+    assert len(outcomes) == total
+    stats = repository.get_stats(user_id)
+    assert stats['sessions'] == total
+    assert stats['total_score'] == pytest.approx(total * SCORE)
+    assert stats['xp'] == expected_xp
+    assert stats['streak'] == DAYS
+    assert stats['last_practice_date'] == (START + timedelta(days=DAYS - 1)).isoformat()
+    assert stats['level'] == expected_xp // 100 + 1
+
+    achievements = repository.get_achievements(user_id)
+    assert sorted(achievements) == sorted(expected_achievements)
+    # Each badge was reported by exactly one submission
+    awarded = [achievement for outcome in outcomes for achievement in outcome['new_achievements']]
+    assert sorted(awarded) == sorted(expected_achievements)
+
+    assert repository.get_history_stats(user_id)['sessions'] == total
+    assert repository.get_user(user_id)['stats']['languages']['spanish']['sessions'] == total
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+from response_parser import ResponseParseError, parse_analysis, parse_analysis_list, validate_analysis
+
+ANALYSIS = {
+    "grammar_score": 8, "fluency_score": 7, "pronunciation_score": 9, "vocabulary_score": 6,
+    "overall_score": 7.5,
+    "grammar_feedback": {"issues": ["Verb tense"], "corrections": ["I went"], "explanation": "Past tense"},
+    "fluency_feedback": {"issues": ["Pauses"], "improvements": ["Link ideas"]},
+    "pronunciation_feedback": {"difficult_words": ["through"], "correct_pronunciation": ["/θruː/"]},
+    "vocabulary_feedback": {"basic_words_used": ["good"], "suggested_alternatives": ["excellent"],
+                            "context": "Formal"},
+    "overall_feedback": "Clear and well organised.",
+    "suggestions": ["Read aloud", "Record yourself", "Shadow a native speaker"]
+}
+CLEAN = json.dumps(ANALYSIS, indent=2)
+
+# Messy responses that must still give the full analysis
+RECOVERABLE = [
+    ('clean', CLEAN),
+    ('fenced', "```json\n" + CLEAN + "\n```"),
+    ('fenced without language', "```\n" + CLEAN + "\n```"),
+    ('prose', "Here is the analysis you asked for:\n" + CLEAN + "\nLet me know if you need more."),
+    ('trailing commas', CLEAN.replace('"Formal"', '"Formal",').replace('"Shadow a native speaker"',
+                                                                        '"Shadow a native speaker",')),
+    ('unescaped quotes', CLEAN.replace('Clear and well organised.', 'You said "hello" clearly.')),
+    ('raw newlines', CLEAN.replace('Clear and well organised.', 'Clear.\nWell organised.')),
+    ('truncated', CLEAN[:CLEAN.index('"suggestions"') + 30]),
+    ('truncated in a key', CLEAN[:CLEAN.index('"suggestions"') + 5]),
+    ('missing nested keys', json.dumps(dict(ANALYSIS, fluency_feedback={}, vocabulary_feedback=None))),
+    ('string scores', json.dumps(dict(ANALYSIS, grammar_score="8/10", overall_score="7.5 out of 10"))),
+    ('missing overall', json.dumps({k: v for k, v in ANALYSIS.items() if k != 'overall_score'})),
+    ('wrapped in an array', json.dumps([ANALYSIS])),
+]
+
+UNRECOVERABLE = [
+    ('no json', "I'm sorry, I can't help with that."),
+    ('missing scores', json.dumps({"overall_feedback": "Good"})),
+    ('empty', ""),
+    ('boolean score', json.dumps(dict(ANALYSIS, grammar_score=True))),
+]
+
+
+@pytest.mark.parametrize('name, text', RECOVERABLE, ids=[name for name, _ in RECOVERABLE])
+def test_recoverable_responses(name, text):
+    analysis = parse_analysis(text)
+    assert analysis.overall_score == 7.5
+    assert analysis.grammar_score == 8.0
+
+
+@pytest.mark.parametrize('name, text', UNRECOVERABLE, ids=[name for name, _ in UNRECOVERABLE])
+def test_unrecoverable_responses(name, text):
+    with pytest.raises(ResponseParseError):
+        parse_analysis(text)
+
+
+def test_unescaped_quotes_are_kept_in_the_text():
+    text = CLEAN.replace('Clear and well organised.', 'You said "hello" clearly.')
+    assert parse_analysis(text).overall_feedback == 'You said "hello" clearly.'
+
+
+def test_truncated_response_keeps_the_complete_fields():
+    analysis = parse_analysis(CLEAN[:CLEAN.index('"Record yourself"') + 5])
+    assert analysis.overall_feedback == "Clear and well organised."
+    assert analysis.suggestions[0] == "Read aloud"
+
+
+def test_nested_defaults_and_score_coercion():
+    analysis = parse_analysis(json.dumps(dict(
+        ANALYSIS, fluency_feedback={}, vocabulary_feedback=None, grammar_score="12", fluency_score=-3
+    )))
+    assert analysis.fluency_feedback.issues == []
+    assert analysis.vocabulary_feedback.context == ''
+    assert analysis.grammar_score == 10.0
+    assert analysis.fluency_score == 0.0
+
+
+def test_local_fields_replace_the_models():
+    local = {
+        'pronunciation_score': 4,
+        'pronunciation_feedback': {'difficult_words': ['comfortable'], 'correct_pronunciation': ['KUMF-ter-bul']},
+    }
+    model = {k: v for k, v in ANALYSIS.items() if k not in ('pronunciation_score', 'overall_score')}
+    analysis = validate_analysis(model, local)
+    assert analysis.pronunciation_score == 4.0
+    assert analysis.pronunciation_feedback.difficult_words == ['comfortable']
+    assert analysis.overall_score == round((8 + 7 + 4 + 6) / 4, 1)
+
+
+def test_batch_uses_index_fields_and_skips_unusable_entries():
+    batch = json.dumps([dict(ANALYSIS, index=1), dict(ANALYSIS, index=0), {"index": 2}])[:-1]
+    assert sorted(parse_analysis_list(batch, 3)) == [0, 1]
+
+
+def test_batch_falls_back_to_position_without_index():
+    batch = json.dumps([ANALYSIS, dict(ANALYSIS, grammar_score=2)])
+    analyses = parse_analysis_list(batch, 2)
+    assert analyses[0].grammar_score == 8.0
+    assert analyses[1].grammar_score == 2.0
+
+
+def test_batch_rejects_bad_duplicate_and_out_of_range_indexes():
+    batch = json.dumps([
+        dict(ANALYSIS, index=0),
+        dict(ANALYSIS, index=0, grammar_score=1),
+        dict(ANALYSIS, index=5),
+        dict(ANALYSIS, index=-1),
+        dict(ANALYSIS, index="1"),
+        "not an object",
+    ])
+    analyses = parse_analysis_list(batch, 3)
+    assert list(analyses) == [0]
+    # The first entry for an index wins
+    assert analyses[0].grammar_score == 8.0
+
+
+def test_batch_local_fields_are_matched_by_index():
+    local = [{'vocabulary_score': 1}, {'vocabulary_score': 2}]
+    batch = json.dumps([dict(ANALYSIS, index=1), dict(ANALYSIS, index=0)])
+    analyses = parse_analysis_list(batch, 2, local)
+    assert analyses[0].vocabulary_score == 1.0
+    assert analyses[1].vocabulary_score == 2.0
+
+
+def test_batch_without_an_array():
+    assert parse_analysis_list(CLEAN, 1) == {}
@@ -0,0 +1,56 @@
+"""
+A snapshot restore must give back the same history aggregates, even when the
+history buffer holds fewer sessions than the user has completed.
+"""
+import pytest
+
+from snapshot import SnapshotStore
+from storage import MemoryUserRepository, SQLiteUserRepository
+
+HISTORY_LIMIT = 5
+SCORES = [7.3, 6.1, 8.7, 9.2, 5.55, 7.05, 8.15, 6.35, 9.9, 4.45, 7.75, 8.65]
+
+
+def open_repository(backend, path):
+    if backend == 'memory':
+        return MemoryUserRepository(history_limit=HISTORY_LIMIT)
+    return SQLiteUserRepository(str(path))
+
+
+def practice(repository, user_id, scores):
+    for index, score in scores:
+        repository.record_practice(user_id, {
+            'language': 'spanish' if index % 3 else 'french',
+            'prompt': 'Describe your weekend',
+            'transcript': f'answer {index}',
+            'feedback': '{}',
+            'score': score
+        })
+
+
+@pytest.mark.parametrize('source', ['memory', 'sqlite'])
+@pytest.mark.parametrize('target', ['memory', 'sqlite'])
+def test_restore_keeps_history_aggregates(source, target, tmp_path):
+    original = open_repository(source, tmp_path / 'source.sqlite3')
+    original.create_user('learner')
+    scores = list(enumerate(SCORES))
+    store = SnapshotStore(str(tmp_path / 'snapshots'))
+
+    # A full snapshot, an incremental one on top, then both merged
+    practice(original, 'learner', scores[:7])
+    store.export(original)
+    practice(original, 'learner', scores[7:])
+    store.export(original)
+    store.compact()
+
+    restored = open_repository(target, tmp_path / 'target.sqlite3')
+    assert store.restore(restored) == 1
+
+    expected = original.get_history_stats('learner')
+    assert expected['sessions'] == len(SCORES)
+    assert restored.get_history_stats('learner') == expected
+    assert restored.get_stats('learner') == original.get_stats('learner')
+
+    # Scores round-trip exactly
+    history, _ = restored.get_history('learner', limit=len(SCORES))
+    assert [item['score'] for item in reversed(history)] == SCORES[-len(history):]